@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""Measures memory held by parsed games of large synthetic corpus.
+
+Games of sample log are repeated with player names drawn from a pool of
+regular players, like a season of one club. Size of every object
+reachable from games is counted once, so objects shared between games
+(interned names, cached speeches) are not counted again. Games loaded
+through pickle, like from game cache, are measured too.
+
+Usage: bench/memory_bench.py [GAMES] [GAME_LOGS_IN_YAML_FORMAT]
+"""
+
+import copy
+import cPickle
+import gc
+import os
+import random
+import sys
+import types
+
+import util.yamlstream
+import maf
+
+DEFAULT_LOGS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            '..', 'logs', 'games.yaml')
+NAMES_POOL = 300
+SKIP_TYPES = (type, types.ModuleType, types.FunctionType,
+              types.BuiltinFunctionType)
+
+
+def deep_size(roots):
+    """:returns: total size in bytes of objects reachable from @roots."""
+    seen = set()
+    total = 0
+    stack = list(roots)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, SKIP_TYPES):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+    return total
+
+
+def synthetic_games(samples, count, seed=1):
+    rnd = random.Random(seed)
+    games = []
+    for num in xrange(count):
+        game = copy.deepcopy(samples[num % len(samples)])
+        # Every yaml load creates new name objects.
+        game['players'] = [u'{0} {1}'.format(u'Player', rnd.randrange(
+                           NAMES_POOL)) for _ in xrange(10)]
+        games.append(maf.MafGame.from_yaml(game))
+    return games
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_LOGS
+    with open(path, 'rb') as f:
+        samples = [item['game'] for item in util.yamlstream.iter_items(f)]
+
+    games = synthetic_games(samples, count)
+    size = deep_size([games])
+    print "{0:24} {1:9.0f} bytes per game".format('parsed', size / count)
+
+    blobs = [cPickle.dumps(g, 2) for g in games]
+    del games
+    print "{0:24} {1:9.0f} bytes per game".format(
+            'pickled', sum(len(b) for b in blobs) / float(count))
+    games = [cPickle.loads(b) for b in blobs]
+    size = deep_size([games])
+    print "{0:24} {1:9.0f} bytes per game".format('loaded from pickle',
+                                                  size / count)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""Measures command latency of mga_server with many concurrent tables.
+
+Server runs in background thread on local TCP port. Every table has its
+own plain socket client, all clients send next command at once and wait
+for responses, so server always has a command of every table in flight.
+Every table plays the same game: first day with voting and last
+speech, then @DAYS days of nine speeches without nominations.
+
+Usage: bench/server_bench.py [TABLES] [DAYS]
+"""
+
+import socket
+import sys
+import threading
+import time
+
+import mga_server
+
+FIRST_DAY = ['n3 +2 -4', '($ -3 +1)', '-1 +5', 'n4 +1', '-3', '+4 -7',
+             '(1 3 | -1)', '-9', '+10', '']
+NEXT_DAY = ['+2 -4', '-3', '+5 -6', '+1', '', '(4 6 7 | -1)', '-4', '+9',
+            '-7']
+
+
+def read_response(f):
+    """:returns: lines of response up to status line."""
+    lines = []
+    while True:
+        line = f.readline()
+        if not line:
+            raise EOFError("Server closed connection")
+        lines.append(line)
+        if line.startswith(('ok', 'error:', '> ')):
+            return lines
+
+
+def game_script(days):
+    """:returns: list of commands of game."""
+    script = ['speech {0};'.format(s) for s in FIRST_DAY]
+    script += ['autovoting', '1 2 3 4 5 6', '7 8 9 10', 'speech -1;',
+               'status']
+    for _ in xrange(days):
+        script += ['speech {0};'.format(s) for s in NEXT_DAY]
+        script += ['autovoting', 'status']
+    return script
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    tables = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    server = mga_server.Server(('127.0.0.1', 0))
+    thread = threading.Thread(target=server.serve)
+    thread.daemon = True
+    thread.start()
+    address = server.socket.getsockname()
+
+    clients = []
+    for num in xrange(tables):
+        sock = socket.create_connection(address)
+        f = sock.makefile('rb')
+        sock.sendall('table {0}\n'.format(num))
+        read_response(f)
+        clients.append((sock, f))
+
+    latencies = []
+    errors = 0
+    start = time.time()
+    for command in game_script(days):
+        sent = time.time()
+        for sock, _ in clients:
+            sock.sendall(command + '\n')
+        for _, f in clients:
+            if read_response(f)[-1].startswith('error:'):
+                errors += 1
+            latencies.append(time.time() - sent)
+    total = time.time() - start
+    for sock, _ in clients:
+        sock.sendall('quit\n')
+        sock.close()
+    server.stop()
+    thread.join()
+
+    print "{0} tables, {1} commands in {2:.2f} s, {3} errors".format(
+            tables, len(latencies), total, errors)
+    print "{0:24} {1:8.2f} ms".format('mean command time',
+                                      total / len(latencies) * 1e3)
+    for p in (0.5, 0.9, 0.99):
+        print "{0:24} {1:8.2f} ms".format(
+                'p{0:g} round latency'.format(p * 100),
+                percentile(latencies, p) * 1e3)
+
+
+if __name__ == '__main__':
+    main()
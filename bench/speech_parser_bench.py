@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""Measures speech parsing throughput of flat fast path and ply parser.
+
+Usage: bench/speech_parser_bench.py [GAME_LOGS_IN_YAML_FORMAT]
+"""
+
+import os
+import sys
+import time
+
+import util.yamlstream
+from speech_parser import speech_parser
+
+DEFAULT_LOGS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            '..', 'logs', 'games.yaml')
+MIN_TIME = 1.
+
+
+def load_speeches(path):
+    speeches = []
+    with open(path, 'rb') as f:
+        for item in util.yamlstream.iter_items(f):
+            for lap in item['game']['laps'][:-1]:
+                for speech in lap.get('day', []):
+                    speech = speech.values()[0]
+                    if isinstance(speech, int):
+                        speech = str(speech) if speech < 0 \
+                                 else '+' + str(speech)
+                    if isinstance(speech, basestring):
+                        speeches.append(speech)
+    return speeches
+
+
+def throughput(func, speeches):
+    """:returns: speeches per second parsed by @func."""
+    count = 0
+    start = time.time()
+    while True:
+        for speech in speeches:
+            func(speech)
+        count += len(speeches)
+        elapsed = time.time() - start
+        if elapsed >= MIN_TIME:
+            return count / elapsed
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_LOGS
+    speeches = load_speeches(path)
+    flat = [s for s in speeches if speech_parser.parse_flat(s) is not None]
+    parser = speech_parser.SpeechParser()
+
+    print "Speeches: {0}, flat: {1}".format(len(speeches), len(flat))
+    print "Flat speeches, ply parser: {0:10.0f} speeches/s".format(
+            throughput(parser.parse, flat))
+    print "Flat speeches, fast path:  {0:10.0f} speeches/s".format(
+            throughput(speech_parser.parse_flat, flat))
+    print "All speeches, ply parser:  {0:10.0f} speeches/s".format(
+            throughput(parser.parse, speeches))
+    print "All speeches, parse():     {0:10.0f} speeches/s".format(
+            throughput(speech_parser.parse, speeches))
+
+
+if __name__ == '__main__':
+    main()
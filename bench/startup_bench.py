@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""Measures cold start time of `import maf` and `mga.py` console.
+
+Every measurement starts fresh python interpreter, so nothing is cached
+in memory between runs.
+
+Usage: bench/startup_bench.py [RUNS]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CASES = [
+    ('python -c pass', ['-c', 'pass'], None),
+    ('import maf', ['-c', 'import maf'], None),
+    ('import maf; maf.MafGame', ['-c', 'import maf; maf.MafGame'], None),
+    ('first speech parse',
+     ['-c', 'import maf; maf.PlayerSpeech.from_str("+1 ($ -2)")'], None),
+    ('mga.py launch', [os.path.join(ROOT, 'mga.py')], 'quit\n'),
+]
+
+
+def run_once(args, stdin):
+    with open(os.devnull, 'w') as devnull:
+        start = time.time()
+        proc = subprocess.Popen([sys.executable] + args, cwd=ROOT,
+                                stdin=subprocess.PIPE, stdout=devnull,
+                                stderr=devnull)
+        proc.communicate(stdin)
+        elapsed = time.time() - start
+    if proc.returncode != 0:
+        return None
+    return elapsed
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for name, args, stdin in CASES:
+        times = [run_once(args, stdin) for _ in xrange(runs)]
+        if None in times:
+            print "{0:28} failed".format(name)
+            continue
+        times.sort()
+        print "{0:28} min {1:7.1f} ms, median {2:7.1f} ms".format(
+                name, times[0] * 1000, times[len(times) // 2] * 1000)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,41 +3,225 @@
 """Parse given yaml files with game logs."""
 
 import maf
+import maf.cache
+import maf.corpus
+import maf.sqlexport
+import maf.sweep
+import maf.validate
+import util.pool
+import util.yamlstream
 
-import sys
-import yaml
+import argparse
+import collections
 import logging
+import multiprocessing
+import os
+import sys
 
 def game_from_yaml(f):
-    """:returns: game.MafGame list from file @f"""
-    data = yaml.load(f)
+    """Yields game.MafGame objects from file @f one by one.
+
+    Games are loaded from yaml stream lazily, so only one game is held
+    in memory at once.
+    """
     num = 1
-    for g in data:
+    for g in util.yamlstream.iter_items(f):
         logging.info("Start loading game {0}...".format(num))
         yield maf.MafGame.from_yaml(g['game'])
         num += 1
 
 
-if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print >>sys.stderr, "Error: you must set file with games"
-        print >>sys.stderr, "Usage:", sys.argv[0], "<GAME_LOGS_IN_YAML_FORMAT>"
-        sys.exit(1)
+def analyze_game(game, pairs=3):
+    """Replays @game in one pass and scores final position.
 
-    if len(sys.argv) < 3:
-        logging.basicConfig(level=logging.INFO)
+    :returns: dict with game info, number of replay steps (initial state
+    and every speech action) and @pairs most and least distant players
+    pairs.
+    """
+    engine = maf.replay.ReplayEngine()
+    tracker = maf.metric.DistanceTracker(engine.state)
+    kinds = collections.Counter()
+    engine.subscribe(lambda event: kinds.update((event.kind,)))
+    engine.replay(game)
+    steps = kinds[maf.replay.ACTION] + 1
+    return {
+        'date': game.date,
+        'club': game.club,
+        'end': game.end,
+        'steps': steps,
+        'max_distance': tracker.max_distance(pairs),
+        'min_distance': tracker.min_distance(pairs),
+    }
+
+
+def analyze_block(block):
+    """Parses and analyzes yaml source text of one game in worker."""
+    return analyze_game(maf.cache.parse_block(block))
+
+
+def analyze_games(f, jobs=None):
+    """Yields `analyze_game` results for every game of yaml file @f in
+    file order. Games are parsed and replayed by pool of @jobs processes
+    with bounded number of games in flight."""
+    return _analyze(analyze_block, util.yamlstream.iter_blocks(f), jobs)
+
+
+def analyze_corpus(corpus, jobs=None):
+    """Yields `analyze_game` results for every game of updated
+    maf.corpus.Corpus in corpus order."""
+    return _analyze(analyze_game, corpus.games(), jobs)
+
+
+def _analyze(func, items, jobs):
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for result in util.pool.ordered_imap(pool, func, items):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def format_pairs(pairs):
+    return ' '.join('{0}-{1}:{2:.3f}'.format(p[0], p[1], d)
+                    for d, p in pairs)
+
+
+def load_games(path, jobs=None, cached=True):
+    """:returns: list of games from yaml file or corpus directory @path.
+    Games of file are taken from its cache if @cached is true, otherwise
+    they are parsed by `game_from_yaml`."""
+    if os.path.isdir(path):
+        corpus = maf.corpus.Corpus(path)
+        corpus.update(jobs)
+        return list(corpus.games())
+    with open(path, 'rb') as f:
+        if not cached:
+            return list(game_from_yaml(f))
+        return list(maf.cache.load_games(f, path + '.mafc'))
+
+
+def batch(path, jobs):
+    if os.path.isdir(path):
+        corpus = maf.corpus.Corpus(path)
+        stats = corpus.update(jobs)
+        logging.info("Corpus updated: {0}".format(stats))
+        print_results(analyze_corpus(corpus, jobs))
     else:
-        logging.basicConfig(level=logging.DEBUG)
-    logging.info("Loading games from: {0}".format(sys.argv[1]))
+        with open(path, 'rb') as f:
+            print_results(analyze_games(f, jobs))
+
 
-    games = []
-    with open(sys.argv[1], 'rb') as f:
-        games = list(game_from_yaml(f))
+def print_results(results):
+    for num, result in enumerate(results):
+        print '\t'.join([
+            str(num + 1), str(result['date']),
+            (result['club'] or '').encode('utf-8'),
+            str(result['end']), str(result['steps']),
+            format_pairs(result['max_distance']),
+            format_pairs(result['min_distance'])])
 
+
+def validate(path, jobs):
+    """Prints diagnostics of all games in @path.
+
+    :returns: number of found errors.
+    """
+    errors = games = bad_games = 0
+    for diagnostics in maf.validate.validate([path], jobs):
+        # Problem of whole file is not a game.
+        if not diagnostics or diagnostics[0].game is not None:
+            games += 1
+            if diagnostics:
+                bad_games += 1
+        for d in diagnostics:
+            errors += 1
+            print maf.validate.format_diagnostic(d)
+    print "{0} errors in {1} of {2} games".format(errors, bad_games, games)
+    return errors
+
+
+def export(path, db_path, jobs, cached=True):
+    """Exports games from @path into SQLite database @db_path."""
+    conn = maf.sqlexport.connect(db_path)
+    try:
+        stats = maf.sqlexport.export_games(
+                conn, load_games(path, jobs, cached), prune=True)
+    finally:
+        conn.close()
+    print "Added {added}, skipped {skipped}, removed {removed} games" \
+          .format(**stats)
+
+
+def sweep(path, jobs, cached=True):
+    """Fits SpeechCallback coefficient on games from @path and prints
+    accuracy of every swept coefficient."""
+    result = maf.sweep.sweep_games(load_games(path, jobs, cached),
+                                   jobs=jobs)
+    for coeff, accuracy in zip(result.coeffs, result.accuracy):
+        print '{0:.3f}\t{1:.4f}'.format(coeff, accuracy)
+    print "Best coeff {0:.3f} on {1} games".format(result.best, result.games)
+
+
+def interactive(path, cached=True):
+    games = load_games(path, cached=cached)
+
+    tracker = None
     for cur, state in maf.interp.interp_game(games[0]):
+        if tracker is None:
+            tracker = maf.metric.DistanceTracker(state)
         print cur
         print state
-        dist = maf.metric.calc_distance(state)
-        print maf.utils.str_pmatrix(dist)
-        print maf.metric.max_distance(dist)[:6]
+        print maf.utils.str_pmatrix(tracker.distances)
+        print tracker.max_distance(6)
         raw_input("Next step...")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('logs', metavar='GAME_LOGS_IN_YAML_FORMAT',
+                        help='yaml file with game logs or directory with '
+                             'such files')
+    parser.add_argument('-d', '--debug', action='store_true',
+                        help='print debug messages')
+    parser.add_argument('-b', '--batch', action='store_true',
+                        help='analyze all games without interaction and '
+                             'print one line per game')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes '
+                             '(default: number of cpus)')
+    parser.add_argument('-v', '--validate', action='store_true',
+                        help='check all games and report every error '
+                             'without analysis')
+    parser.add_argument('-e', '--export', metavar='SQLITE_DB',
+                        help='export all games into SQLite database')
+    parser.add_argument('-s', '--sweep', action='store_true',
+                        help='fit speech coefficient on known roles and '
+                             'print accuracy curve')
+    parser.add_argument('--no-cache', dest='cached', action='store_false',
+                        help='parse yaml file without game cache')
+    args = parser.parse_args()
+
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG)
+    elif args.batch or args.validate or args.export or args.sweep:
+        logging.basicConfig(level=logging.WARNING)
+    else:
+        logging.basicConfig(level=logging.INFO)
+    logging.info("Loading games from: {0}".format(args.logs))
+
+    if args.validate:
+        sys.exit(1 if validate(args.logs, args.jobs) else 0)
+    elif args.export:
+        export(args.logs, args.export, args.jobs, args.cached)
+    elif args.sweep:
+        sweep(args.logs, args.jobs, args.cached)
+    elif args.batch:
+        batch(args.logs, args.jobs)
+    else:
+        interactive(args.logs, args.cached)
+
+
+if __name__ == '__main__':
+    main()
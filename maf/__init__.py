@@ -1,7 +1,46 @@
 #!/usr/bin/env python
+"""Mafia games analysis package.
 
-import actions
-import interp
-import metric
-import utils
-from game import *
+Submodules are imported lazily on first attribute access, so `import maf`
+does not load parsers until they are needed.
+"""
+
+import importlib
+import pkgutil
+import sys
+import types
+
+# All modules of package directory, so new ones can't be missed here.
+_SUBMODULES = tuple(sorted(name for _, name, _
+                           in pkgutil.iter_modules(__path__)))
+_GAME_NAMES = ('PlayerSpeech', 'Voting', 'GameLap', 'MafGame',
+               'parse_speech', 'parse_hands', 'parse_hand_set', 'role_players')
+
+
+class _LazyModule(types.ModuleType):
+    """Package module which imports submodules on first access."""
+    def __getattr__(self, name):
+        if name in _SUBMODULES:
+            return importlib.import_module(self.__name__ + '.' + name)
+        if name in _GAME_NAMES:
+            value = getattr(importlib.import_module(self.__name__ + '.game'),
+                            name)
+            setattr(self, name, value)
+            return value
+        raise AttributeError("'module' object has no attribute '{0}'"
+                             .format(name))
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(_SUBMODULES) |
+                      set(_GAME_NAMES))
+
+
+def _install():
+    module = sys.modules[__name__]
+    lazy = _LazyModule(__name__, module.__doc__)
+    lazy.__dict__.update(module.__dict__)
+    # Keep reference to original module, otherwise its globals are cleared.
+    lazy._origin = module
+    sys.modules[__name__] = lazy
+
+_install()
@@ -13,3 +13,6 @@ DO_NOT_VOTE = 'z'
 CHECK = 'c'
 INFORMATION = 'i'
 SET = 's'
+
+ALL = (PLAY, NOT_PLAY, SHERIFF, SHOT, NOMINATE, DENOMINATE, CANCEL,
+       DO_NOT_VOTE, CHECK, INFORMATION, SET)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""On-disk cache of parsed games.
+
+Every top-level game block of yaml log is keyed by sha1 of its source
+text and parser fingerprint, so changed games and games parsed by
+changed parser are parsed again automatically.
+
+Cache file layout:
+    header: 'MAFC' magic, format version (uint32)
+    records: pickled MafGame objects one after another
+    index: (sha1 digest, offset, length) for every record
+    footer: index offset (uint64), records count (uint32)
+
+So any game can be loaded without reading other records:
+    >>> import os, tempfile
+    >>> from StringIO import StringIO
+    >>> log = '''
+    ... - game:
+    ...     roles: {don: 1, maf: 3 4, sheriff: 10}
+    ...     laps:
+    ...       - day:
+    ...         - 1: +2 -3
+    ...       - end: red
+    ... '''
+    >>> path = os.path.join(tempfile.mkdtemp(), 'games.mafc')
+    >>> games = list(load_games(StringIO(log), path))
+    >>> games[0].laps[0].speechs
+    [(1, [('+', 2), ('-', 3)])]
+    >>> cache = GameCache(path)
+    >>> len(cache)
+    1
+    >>> cache.get(block_key(log.lstrip())).end
+    'red'
+    >>> cache.close()
+
+Second loading takes games from cache:
+    >>> list(load_games(StringIO(log), path))[0].laps[0].speechs
+    [(1, [('+', 2), ('-', 3)])]
+
+Repeated game block is stored once, cache of unchanged log is not
+rewritten:
+    >>> len(list(load_games(StringIO(log + log), path)))
+    2
+    >>> inode = os.stat(path).st_ino
+    >>> stats = {}
+    >>> len(list(load_games(StringIO(log + log), path, stats)))
+    2
+    >>> stats['cached'], os.stat(path).st_ino == inode
+    (2, True)
+
+Cache is optimisation only, games are loaded if it can't be written:
+    >>> len(list(load_games(StringIO(log), '/nonexistent/games.mafc')))
+    1
+"""
+
+import cPickle
+import hashlib
+import inspect
+import logging
+import os
+import struct
+
+import actions
+import game
+import util.yamlstream
+
+MAGIC = 'MAFC'
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct('<4sI')
+_INDEX_ENTRY = struct.Struct('<20sQI')
+_FOOTER = struct.Struct('<QI')
+
+
+def _parser_fingerprint():
+    sha = hashlib.sha1(str(FORMAT_VERSION))
+    for module in (actions, game, game.CU, game.memo,
+                   inspect.getmodule(game.BitSet),
+                   inspect.getmodule(game.speech_parser.parse),
+                   inspect.getmodule(game.votes_parser.parse)):
+        sha.update(inspect.getsource(module))
+    return sha.digest()
+
+PARSER_FINGERPRINT = _parser_fingerprint()
+
+
+def block_key(block):
+    """:returns: cache key of yaml game @block source text."""
+    return hashlib.sha1(PARSER_FINGERPRINT + block).digest()
+
+
+class GameCache(object):
+    """Read access to cache file and writing of the new one."""
+    def __init__(self, path):
+        self._path = path
+        self._file = None
+        self._index = {}
+        if os.path.exists(path):
+            self._open()
+
+    def _open(self):
+        f = open(self._path, 'rb')
+        try:
+            magic, version = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError("Unknown cache format")
+            f.seek(-_FOOTER.size, os.SEEK_END)
+            offset, count = _FOOTER.unpack(f.read(_FOOTER.size))
+            f.seek(offset)
+            data = f.read(count * _INDEX_ENTRY.size)
+            for num in xrange(count):
+                key, start, length = _INDEX_ENTRY.unpack_from(
+                        data, num * _INDEX_ENTRY.size)
+                self._index[key] = (start, length)
+        except (ValueError, struct.error) as e:
+            logging.warning("Ignoring broken cache {0}: {1}"
+                            .format(self._path, e))
+            f.close()
+            self._index = {}
+            return
+        self._file = f
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def get_blob(self, key):
+        """:returns: pickled game for @key or None."""
+        if key not in self._index:
+            return None
+        start, length = self._index[key]
+        self._file.seek(start)
+        return self._file.read(length)
+
+    def get(self, key):
+        """:returns: MafGame for @key or None."""
+        blob = self.get_blob(key)
+        return cPickle.loads(blob) if blob is not None else None
+
+    def write(self, entries):
+        """Replaces cache file with @entries.
+
+        @entries is list of (key, blob) pairs. If blob is None it is
+        copied from current cache file.
+        """
+        tmp_path = self._path + '.tmp'
+        index = []
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, FORMAT_VERSION))
+            for key, blob in entries:
+                if blob is None:
+                    blob = self.get_blob(key)
+                index.append(_INDEX_ENTRY.pack(key, f.tell(), len(blob)))
+                f.write(blob)
+            offset = f.tell()
+            f.write(''.join(index))
+            f.write(_FOOTER.pack(offset, len(index)))
+        self.close()
+        os.rename(tmp_path, self._path)
+        self._open()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._index = {}
+
+
+def parse_block(block):
+    """:returns: MafGame parsed from yaml source text of one game."""
+    from StringIO import StringIO
+    item = util.yamlstream.iter_items(StringIO(block)).next()
+    return game.MafGame.from_yaml(item['game'])
+
+
+def load_games(f, path, stats=None):
+    """Yields MafGame objects from yaml file @f using cache file @path.
+
+    Only games missing in cache are parsed. Cache file is updated after
+    all games are loaded. If @stats dict is given, keys of loaded games
+    are appended to stats['keys'] and numbers of games loaded from cache
+    and parsed are added to stats['cached'] and stats['parsed'].
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault('keys', [])
+    stats.setdefault('cached', 0)
+    stats.setdefault('parsed', 0)
+    cache = GameCache(path)
+    entries = []
+    seen = set()
+    changed = False
+    try:
+        for num, block in enumerate(util.yamlstream.iter_blocks(f)):
+            key = block_key(block)
+            stats['keys'].append(key)
+            if key in cache:
+                logging.info("Loading game {0} from cache...".format(num + 1))
+                if key not in seen:
+                    entries.append((key, None))
+                stats['cached'] += 1
+                loaded = cache.get(key)
+            else:
+                logging.info("Start loading game {0}...".format(num + 1))
+                loaded = parse_block(block)
+                if key not in seen:
+                    entries.append((key, cPickle.dumps(loaded, 2)))
+                changed = True
+                stats['parsed'] += 1
+            seen.add(key)
+            yield loaded
+        if changed or len(entries) != len(cache):
+            try:
+                cache.write(entries)
+            except EnvironmentError as e:
+                logging.warning("Can't write cache {0}: {1}".format(path, e))
+                try:
+                    os.remove(path + '.tmp')
+                except OSError:
+                    pass
+    finally:
+        cache.close()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+"""Columnar store of speech actions of many games.
+
+Every action of every day, crash and dead speech becomes one row of
+struct-of-arrays table. Actions with one player target keep it in
+`target` column, other payloads (sheriff versions, information, set)
+are kept in side table:
+    >>> import maf
+    >>> lap = {
+    ...     'day': [{1: 'n4 +2'}, {4: '-1 (1 3 | -2)'}],
+    ...     'voting': [{'votes': [{4: '1-10'}], 'crash': [{4: 'n1'}]}]}
+    >>> g = maf.MafGame.from_yaml({
+    ...     'roles': {'don': 1, 'maf': '2 3', 'sheriff': 4},
+    ...     'laps': [lap, lap, {'end': 'red'}]})
+    >>> table = ActionTable.from_games([g, g])
+    >>> len(table)
+    20
+    >>> table.column('target')[:4]
+    array([4, 2, 1, 0], dtype=int8)
+    >>> table.payload(3)
+    ((1, 3), -2)
+
+Rows are filtered and grouped by vectorised operations. How many times
+sheriff was nominated at first day:
+    >>> day = table.where(lap=1, section=DAY, code=maf.actions.NOMINATE)
+    >>> int((day.target_roles() == SHERIFF).sum())
+    2
+    >>> keys, counts = table.count_by('lap', 'section')
+    >>> keys.tolist(), counts.tolist()
+    ([[1, 0], [1, 1], [2, 0], [2, 1]], [8, 2, 8, 2])
+
+Table is saved as directory of `.npy` files and can be loaded memory
+mapped:
+    >>> import tempfile
+    >>> path = tempfile.mkdtemp()
+    >>> table.save(path)
+    >>> loaded = ActionTable.load(path, mmap_mode='r')
+    >>> loaded.where(code=maf.actions.SET).payload(0)
+    ((1, 3), -2)
+"""
+
+import ast
+import os
+import numpy
+
+import actions
+import events
+import game as maf_game
+import util.collection as CU
+
+DAY, CRASH, DEAD = 0, 1, 2
+SECTIONS = {events.DAY: DAY, events.CRASH: CRASH, events.DEAD: DEAD}
+
+CIVILIAN, MAF, DON, SHERIFF = 0, 1, 2, 3
+ROLE_CODES = {'maf': MAF, 'don': DON, 'sheriff': SHERIFF}
+
+CODES = dict((action, num) for num, action in enumerate(actions.ALL))
+
+COLUMNS = (
+    ('game', numpy.int32),
+    ('lap', numpy.int16),
+    ('section', numpy.int8),
+    ('speech', numpy.int16),
+    ('speaker', numpy.int8),
+    ('code', numpy.int8),
+    ('target', numpy.int8),
+    ('payload', numpy.int32),
+)
+
+PAYLOADS_NAME = 'payloads.txt'
+ROLES_NAME = 'roles.npy'
+
+
+def _roles_row(roles, players):
+    row = numpy.zeros(players + 1, dtype=numpy.int8)
+    for role, code in ROLE_CODES.iteritems():
+        for player in maf_game.role_players(roles, role):
+            row[player] = code
+    return row
+
+
+class ActionTable(object):
+    """Columns of actions, side table of payloads and roles of games.
+
+    Column `code` is index of action in `maf.actions.ALL`, `target` is 0
+    and `payload` is index in side table for actions with compound
+    payload, otherwise `payload` is -1. Roles of game `i` are row `i` of
+    `roles` matrix indexed by player number.
+    """
+    def __init__(self, columns, payloads, roles):
+        self._columns = columns
+        self._payloads = payloads
+        self._roles = roles
+
+    @staticmethod
+    def from_games(games, players=10):
+        """:returns: ActionTable of all speech actions of @games."""
+        rows = []
+        payloads = []
+        roles = []
+        for game_num, game in enumerate(games):
+            roles.append(_roles_row(game.roles, players))
+            for speech, num, acts in events.iter_speeches(game, game_num):
+                head = (game_num, speech.lap, SECTIONS[speech.section], num,
+                        speech.actor)
+                for a in acts:
+                    if a.data is None:
+                        rows.append(head + (CODES[a.code], a.target, -1))
+                    else:
+                        rows.append(head + (CODES[a.code], 0, len(payloads)))
+                        payloads.append(CU.freeze(a.data))
+        data = numpy.array(rows, dtype=numpy.int32).reshape(-1, len(COLUMNS))
+        columns = dict((name, data[:, num].astype(dtype))
+                       for num, (name, dtype) in enumerate(COLUMNS))
+        roles = numpy.array(roles, dtype=numpy.int8).reshape(-1, players + 1)
+        return ActionTable(columns, payloads, roles)
+
+    def __len__(self):
+        return len(self._columns['game'])
+
+    @property
+    def roles(self):
+        return self._roles
+
+    def column(self, name):
+        """:returns: numpy array of column @name."""
+        return self._columns[name]
+
+    def payload(self, row):
+        """:returns: compound payload of action in @row or None."""
+        index = self._columns['payload'][row]
+        return self._payloads[index] if index >= 0 else None
+
+    def mask(self, **conditions):
+        """:returns: boolean mask of rows where every column equals value
+        from @conditions. Action codes can be given as `maf.actions`
+        constants."""
+        result = numpy.ones(len(self), dtype=bool)
+        for name, value in conditions.iteritems():
+            if name == 'code' and isinstance(value, basestring):
+                value = CODES[value]
+            result &= self._columns[name] == value
+        return result
+
+    def select(self, mask):
+        """:returns: ActionTable with rows selected by @mask or indexes.
+        Side table and roles are shared."""
+        columns = dict((name, column[mask])
+                       for name, column in self._columns.iteritems())
+        return ActionTable(columns, self._payloads, self._roles)
+
+    def where(self, **conditions):
+        """:returns: ActionTable with rows matching @conditions, see
+        `mask`."""
+        return self.select(self.mask(**conditions))
+
+    def speaker_roles(self):
+        """:returns: column of role codes of speakers."""
+        return self._roles[self._columns['game'], self._columns['speaker']]
+
+    def target_roles(self):
+        """:returns: column of role codes of targets, -1 if no target."""
+        target = self._columns['target']
+        result = self._roles[self._columns['game'], target]
+        return numpy.where(target > 0, result, -1)
+
+    def count_by(self, *names):
+        """:returns: (keys, counts) where keys is matrix of distinct
+        combinations of columns @names in sorted order."""
+        keys = numpy.column_stack([self._columns[name] for name in names])
+        if not len(keys):
+            return keys, numpy.zeros(0, dtype=int)
+        return numpy.unique(keys, axis=0, return_counts=True)
+
+    def save(self, path):
+        """Saves columns as `.npy` files and side table into directory
+        @path."""
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for name, _ in COLUMNS:
+            numpy.save(os.path.join(path, name + '.npy'), self._columns[name])
+        numpy.save(os.path.join(path, ROLES_NAME), self._roles)
+        with open(os.path.join(path, PAYLOADS_NAME), 'w') as f:
+            for payload in self._payloads:
+                print >>f, repr(payload)
+
+    @staticmethod
+    def load(path, mmap_mode=None):
+        """:returns: ActionTable saved to @path. Columns are memory mapped
+        with @mmap_mode (see `numpy.load`) if given."""
+        columns = dict(
+            (name, numpy.load(os.path.join(path, name + '.npy'),
+                              mmap_mode=mmap_mode))
+            for name, _ in COLUMNS)
+        roles = numpy.load(os.path.join(path, ROLES_NAME))
+        with open(os.path.join(path, PAYLOADS_NAME)) as f:
+            payloads = [ast.literal_eval(line) for line in f]
+        return ActionTable(columns, payloads, roles)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
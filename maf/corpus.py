@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Corpus of game logs split into many yaml files.
+
+Corpus scans directory tree for yaml files and keeps manifest with
+content hash of every file and keys of every game in it. Every file has
+its own game cache (see `maf.cache`), so on update only games which
+text changed are parsed again:
+    >>> import os, tempfile
+    >>> root = tempfile.mkdtemp()
+    >>> os.mkdir(os.path.join(root, '2014'))
+    >>> game = '''
+    ... - game:
+    ...     club: {0}
+    ...     laps:
+    ...       - day:
+    ...         - 1: +2 -3
+    ...       - end: red
+    ... '''
+    >>> def write(name, text):
+    ...     with open(os.path.join(root, name), 'w') as f:
+    ...         f.write(text)
+    >>> write('2014/feb.yaml', game.format('showtime') + game.format('Sky'))
+    >>> write('2014/mar.yaml', game.format('Consigliere'))
+    >>> corpus = Corpus(root)
+    >>> sorted(corpus.update(jobs=1).items())
+    [('changed_files', 2), ('files', 2), ('games', 3), ('parsed', 3), ('removed_files', 0)]
+    >>> [g.club for g in corpus.games()]
+    ['showtime', 'Sky', 'Consigliere']
+
+Unchanged files are not read at all, changed file reuses cached games,
+touched file with the same content is not ingested again:
+    >>> write('2014/feb.yaml', game.format('showtime') + game.format('Ra'))
+    >>> sorted(Corpus(root).update(jobs=1).items())
+    [('changed_files', 1), ('files', 2), ('games', 3), ('parsed', 1), ('removed_files', 0)]
+    >>> [g.club for g in Corpus(root).games()]
+    ['showtime', 'Ra', 'Consigliere']
+    >>> os.utime(os.path.join(root, '2014/mar.yaml'), (0, 0))
+    >>> sorted(Corpus(root).update(jobs=1).items())
+    [('changed_files', 0), ('files', 2), ('games', 3), ('parsed', 0), ('removed_files', 0)]
+
+Caches of removed or renamed files are deleted:
+    >>> os.rename(os.path.join(root, '2014/mar.yaml'),
+    ...           os.path.join(root, '2014/march.yaml'))
+    >>> sorted(Corpus(root).update(jobs=1).items())
+    [('changed_files', 1), ('files', 2), ('games', 3), ('parsed', 1), ('removed_files', 1)]
+    >>> sorted(os.listdir(os.path.join(root, CACHE_DIR_NAME, '2014')))
+    ['feb.yaml.mafc', 'march.yaml.mafc']
+"""
+
+import binascii
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+
+import cache
+import util.pool
+
+MANIFEST_NAME = '.maf-manifest.json'
+CACHE_DIR_NAME = '.mafcache'
+MANIFEST_VERSION = 1
+EXTENSIONS = ('.yaml', '.yml')
+
+
+def _file_sha1(path):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), ''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def hash_file(args):
+    """:returns: (relative path, hex sha1 of file content)."""
+    relpath, path = args
+    return relpath, _file_sha1(path)
+
+
+def ingest_file(args):
+    """Updates game cache of one log file.
+
+    :returns: (relative path, file info dict, number of parsed games).
+    """
+    relpath, path, cache_path = args
+    sha = _file_sha1(path)
+    stat = os.stat(path)
+    stats = {}
+    with open(path, 'rb') as f:
+        for _ in cache.load_games(f, cache_path, stats):
+            pass
+    info = {
+        'sha1': sha,
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'games': [binascii.hexlify(key) for key in stats['keys']],
+    }
+    return relpath, info, stats['parsed']
+
+
+class Corpus(object):
+    """Game logs in yaml files under @root directory."""
+    def __init__(self, root, cache_dir=None):
+        self._root = root
+        self._cache_dir = cache_dir or os.path.join(root, CACHE_DIR_NAME)
+        self._manifest_path = os.path.join(self._cache_dir, MANIFEST_NAME)
+        self._files = self._load_manifest()
+
+    @property
+    def root(self):
+        return self._root
+
+    @property
+    def files(self):
+        """Dict relative path -> file info (sha1, size, mtime, games)."""
+        return self._files
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path) as f:
+                manifest = json.load(f)
+        except (IOError, ValueError):
+            return {}
+        if manifest.get('version') != MANIFEST_VERSION \
+           or manifest.get('parser') != \
+              binascii.hexlify(cache.PARSER_FINGERPRINT):
+            return {}
+        return manifest.get('files', {})
+
+    def _save_manifest(self):
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'parser': binascii.hexlify(cache.PARSER_FINGERPRINT),
+            'files': self._files,
+        }
+        tmp_path = self._manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.rename(tmp_path, self._manifest_path)
+
+    def _cache_path(self, relpath):
+        return os.path.join(self._cache_dir, relpath + '.mafc')
+
+    def scan(self):
+        """:returns: sorted relative paths of all log files in corpus."""
+        result = []
+        for dirpath, dirnames, filenames in os.walk(self._root):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+            for name in filenames:
+                if os.path.splitext(name)[1] in EXTENSIONS:
+                    path = os.path.join(dirpath, name)
+                    result.append(os.path.relpath(path, self._root))
+        return sorted(result)
+
+    def _check_stat(self, relpath):
+        """:returns: True if file @relpath is changed, False if not and
+        None if only its content hash can tell."""
+        info = self._files.get(relpath)
+        if info is None or not os.path.exists(self._cache_path(relpath)):
+            return True
+        stat = os.stat(os.path.join(self._root, relpath))
+        if stat.st_size != info['size']:
+            return True
+        if stat.st_mtime == info['mtime']:
+            return False
+        return None
+
+    def _hash_touched(self, pool, touched):
+        """Hashes @touched files by @pool.
+
+        :returns: list of files which content is changed.
+        """
+        changed = []
+        tasks = [(p, os.path.join(self._root, p)) for p in touched]
+        for relpath, sha in util.pool.ordered_imap(pool, hash_file, tasks):
+            info = self._files[relpath]
+            if sha != info['sha1']:
+                changed.append(relpath)
+            else:
+                info['mtime'] = os.stat(
+                        os.path.join(self._root, relpath)).st_mtime
+        return changed
+
+    def _prune(self, paths):
+        """Removes caches of files missing in @paths.
+
+        :returns: number of removed caches.
+        """
+        keep = set(self._cache_path(p) for p in paths)
+        removed = 0
+        for dirpath, _, filenames in os.walk(self._cache_dir,
+                                             topdown=False):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if name.endswith('.mafc') and path not in keep:
+                    logging.info("Removing stale cache {0}".format(path))
+                    os.remove(path)
+                    removed += 1
+            if dirpath != self._cache_dir and not os.listdir(dirpath):
+                os.rmdir(dirpath)
+        return removed
+
+    def update(self, jobs=None):
+        """Re-ingests new and changed files with pool of @jobs processes,
+        removes caches of deleted files and saves manifest.
+
+        :returns: dict with numbers of files, games, changed files,
+        parsed games and removed caches.
+        """
+        paths = self.scan()
+        states = [(p, self._check_stat(p)) for p in paths]
+        changed = [p for p, state in states if state]
+        touched = [p for p, state in states if state is None]
+        files = dict((p, self._files[p]) for p in paths if p in self._files)
+        parsed = 0
+        if changed or touched:
+            pool = multiprocessing.Pool(jobs)
+            try:
+                changed = sorted(changed + self._hash_touched(pool, touched))
+                for relpath in changed:
+                    directory = os.path.dirname(self._cache_path(relpath))
+                    if not os.path.isdir(directory):
+                        os.makedirs(directory)
+                tasks = [(p, os.path.join(self._root, p),
+                          self._cache_path(p)) for p in changed]
+                for relpath, info, count in util.pool.ordered_imap(
+                        pool, ingest_file, tasks):
+                    logging.info("Ingested {0}: {1} games, {2} parsed"
+                                 .format(relpath, len(info['games']), count))
+                    files[relpath] = info
+                    parsed += count
+                pool.close()
+            finally:
+                pool.terminate()
+                pool.join()
+        self._files = files
+        if not os.path.isdir(self._cache_dir):
+            os.makedirs(self._cache_dir)
+        removed = self._prune(paths)
+        self._save_manifest()
+        return {
+            'files': len(paths),
+            'games': sum(len(info['games']) for info in files.values()),
+            'parsed': parsed,
+            'changed_files': len(changed),
+            'removed_files': removed,
+        }
+
+    def games(self):
+        """Yields MafGame objects of all files in path order from game
+        caches. Call `update` first to bring caches up to date."""
+        for relpath in sorted(self._files):
+            game_cache = cache.GameCache(self._cache_path(relpath))
+            try:
+                for key in self._files[relpath]['games']:
+                    yield game_cache.get(binascii.unhexlify(key))
+            finally:
+                game_cache.close()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
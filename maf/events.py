@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""Stream of game events in game order.
+
+Every game is flattened into `GameEvent` records of the same layout
+without building intermediate lists: lap start, speech start, speech
+action, vote, end of voting, night action and game end:
+    >>> import maf
+    >>> lap = maf.GameLap.from_dict({
+    ...     'day': [{1: 'n4 (1 3 | -2)'}, {4: 0}],
+    ...     'voting': [{'votes': [{4: '1-3'}], 'crash': [{4: '+1'}]}],
+    ...     'night': {'shot': 5}})
+    >>> game = maf.MafGame(laps=[lap], end='red')
+    >>> for e in iter_events(game):
+    ...     print ' '.join(str(x) for x in e)
+    0 lap 1 None None 0 None 0 None
+    0 speech 1 day 1 1 None 0 None
+    0 action 1 day 1 1 n 4 None
+    0 action 1 day 1 1 s 0 ((1, 3), -2)
+    0 speech 1 day 2 4 None 0 None
+    0 vote 1 voting 1 4 None 0 BitSet([1, 2, 3])
+    0 voting 1 voting 1 0 None 0 None
+    0 speech 1 crash 1 4 None 0 None
+    0 action 1 crash 1 4 + 1 None
+    0 night 1 night None 0 shot 5 None
+    0 end 1 None None 0 None 0 red
+
+Streams are lazy and can be chained and filtered:
+    >>> stream = iter_corpus_events([game, game])
+    >>> [(e.game, e.target) for e in select(stream, kind=ACTION, code='n')]
+    [(0, 4), (1, 4)]
+
+Speech events are grouped with their actions, speeches are numbered
+from 1 in every section of lap:
+    >>> [(s.section, num, [a.code for a in acts])
+    ...  for s, num, acts in iter_speeches(game)]
+    [('day', 1, ['n', 's']), ('day', 2, []), ('crash', 1, ['+'])]
+"""
+
+import itertools
+
+from collections import namedtuple
+
+LAP = 'lap'
+SPEECH = 'speech'
+ACTION = 'action'
+VOTE = 'vote'
+VOTING = 'voting'
+NIGHT = 'night'
+END = 'end'
+
+DAY = 'day'
+CRASH = 'crash'
+DEAD = 'dead'
+
+NIGHT_ACTIONS = ('sheriff', 'don', 'shot')
+
+# actor is speaker or nominee, code is action or night action name,
+# target is player target (0 if none), data is compound action payload,
+# vote hands or winner.
+GameEvent = namedtuple('GameEvent',
+                       'game kind lap section index actor code target data')
+
+
+def _speech_events(game_num, lap, section, index, player, speech):
+    yield GameEvent(game_num, SPEECH, lap, section, index, player,
+                    None, 0, None)
+    for action, data in speech.iter_actions():
+        if isinstance(data, int):
+            yield GameEvent(game_num, ACTION, lap, section, index, player,
+                            action, data, None)
+        else:
+            yield GameEvent(game_num, ACTION, lap, section, index, player,
+                            action, 0, data)
+
+
+def iter_events(game, game_num=0):
+    """Yields GameEvent records of @game in game order."""
+    lap_num = 0
+    for lap_num, lap in enumerate(game.laps, 1):
+        yield GameEvent(game_num, LAP, lap_num, None, None, 0, None, 0, None)
+        for num, (player, speech) in enumerate(lap.speechs, 1):
+            for event in _speech_events(game_num, lap_num, DAY, num,
+                                        player, speech):
+                yield event
+        for num, voting in enumerate(lap.votings, 1):
+            for nominee, hands in voting.iter_hand_sets():
+                yield GameEvent(game_num, VOTE, lap_num, VOTING, num,
+                                nominee, None, 0, hands)
+            yield GameEvent(game_num, VOTING, lap_num, VOTING, num, 0,
+                            None, 0, None)
+            for player, speech in voting.crash:
+                for event in _speech_events(game_num, lap_num, CRASH, num,
+                                            player, speech):
+                    yield event
+        for num, (player, speech) in enumerate(lap.dead, 1):
+            for event in _speech_events(game_num, lap_num, DEAD, num,
+                                        player, speech):
+                yield event
+        for name in NIGHT_ACTIONS:
+            target = lap.night.get(name)
+            if target:
+                yield GameEvent(game_num, NIGHT, lap_num, NIGHT, None, 0,
+                                name, target, None)
+    yield GameEvent(game_num, END, lap_num, None, None, 0, None, 0, game.end)
+
+
+def iter_speeches(game, game_num=0):
+    """Yields (speech, num, actions) for every speech of @game, where
+    speech is SPEECH event, num is number of speech in its section of lap
+    (crash speeches of all votings are numbered together) and actions is
+    list of its ACTION events."""
+    speech = None
+    for event in iter_events(game, game_num):
+        if event.kind == ACTION:
+            actions.append(event)
+            continue
+        if speech is not None:
+            yield speech, num, actions
+            speech = None
+        if event.kind == LAP:
+            numbers = {}
+        elif event.kind == SPEECH:
+            speech = event
+            num = numbers[event.section] = numbers.get(event.section, 0) + 1
+            actions = []
+
+
+def iter_corpus_events(games):
+    """Yields GameEvent records of all @games, `game` field is number of
+    game in @games."""
+    return itertools.chain.from_iterable(
+            iter_events(game, num) for num, game in enumerate(games))
+
+
+def select(events, **fields):
+    """Yields @events which fields are equal to values of @fields."""
+    items = fields.items()
+    for event in events:
+        for name, value in items:
+            if getattr(event, name) != value:
+                break
+        else:
+            yield event
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -1,14 +1,104 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import array
+import itertools
 import logging
 import actions as actions
 import util.collection as CU
+import util.memo as memo
+from util.bitset import BitSet
 import util.strings as SU
 import speech_parser
 import votes_parser
 
 
+@memo.memoize(maxsize=4096)
+def parse_speech(s):
+    """:returns: immutable tuple of actions parsed from speech string @s.
+
+    Results are cached, see `parse_speech.cache` for hits and misses:
+        >>> parse_speech('+1,2 (1 3 | -1)')
+        (('+', 1), ('+', 2), ('s', ((1, 3), -1)))
+        >>> parse_speech('+1,2 (1 3 | -1)') is parse_speech('+1,2 (1 3 | -1)')
+        True
+    """
+    return CU.freeze(speech_parser.parse(s))
+
+
+@memo.memoize(maxsize=1024)
+def parse_hands(votestr):
+    """:returns: immutable sorted tuple of players voted in @votestr.
+
+        >>> parse_hands('6-10')
+        (6, 7, 8, 9, 10)
+        >>> parse_hands(0)
+        ()
+    """
+    return tuple(hand for hand in votes_parser.parse(votestr) if hand)
+
+
+@memo.memoize(maxsize=1024)
+def parse_hand_set(votestr):
+    """:returns: BitSet of players voted in @votestr.
+
+        >>> parse_hand_set('6-10') & parse_hand_set('1 7 9')
+        BitSet([7, 9])
+    """
+    return votes_parser.parse_set(votestr)
+
+
+def role_players(roles, role):
+    """:returns: list of numbers of players with @role in @roles dict
+    of game, players are separated by spaces or commas.
+
+        >>> role_players({'maf': '2, 5', 'don': 1}, 'maf')
+        [2, 5]
+        >>> role_players({'don': 1}, 'sheriff')
+        []
+    """
+    return [int(player)
+            for player in str(roles.get(role, '')).replace(',', ' ').split()]
+
+
+def pack_hands(hands):
+    """:returns: bit mask of @hands, bit 0 is player 1.
+
+        >>> pack_hands((1, 3, 10))
+        517
+    """
+    return int(BitSet(hands))
+
+
+@memo.memoize(maxsize=1024)
+def unpack_hands(mask):
+    """:returns: immutable sorted tuple of players from bit @mask.
+
+        >>> unpack_hands(517)
+        (1, 3, 10)
+    """
+    return tuple(BitSet.from_mask(mask))
+
+
+@memo.memoize(maxsize=4096)
+def _shared_actions(actions):
+    return actions
+
+
+def _load_speech(actions):
+    ps = PlayerSpeech()
+    ps._actions = _shared_actions(actions)
+    return ps
+
+
+_NAMES = {}
+
+def intern_name(name):
+    """:returns: shared copy of player @name, so every name is stored once
+    however many games it is found in."""
+    return _NAMES.setdefault(name, name)
+
+
 class PlayerSpeech(object):
     """Player speech container.
 
@@ -18,9 +108,13 @@ class PlayerSpeech(object):
     Then you can see player speech actions:
         >>> speech.actions
         [('+', 1), ('+', 2), ('-', 4), ('z', 0), ('$', (0, 'x'))]
+
+    Actions are kept in immutable tuple shared by all equal speeches.
     """
+    __slots__ = ('_actions',)
+
     def __init__(self):
-        self._actions = []
+        self._actions = ()
 
     @staticmethod
     def from_str(s):
@@ -35,13 +129,21 @@ class PlayerSpeech(object):
             s = str(s) if s < 0 else '+' + str(s)
 
         ps = PlayerSpeech()
-        ps._actions = speech_parser.parse(s)
+        ps._actions = parse_speech(s)
         logging.debug("Parsing speech result: {0}".format(ps.actions))
         return ps
 
     @property
     def actions(self):
-        return self._actions
+        return list(self._actions)
+
+    def iter_actions(self):
+        """Iterates over actions without copying."""
+        return iter(self._actions)
+
+    def __reduce__(self):
+        # Equal speeches of unpickled games share one actions tuple too.
+        return _load_speech, (self._actions,)
 
     def __repr__(self):
         return self.actions.__repr__()
@@ -63,13 +165,14 @@ class Voting(object):
         >>> vs
         [<Voting>, <Voting>]
 
-    Now you can access to votings properties like `votes`:
+    Now you can access to votings properties like `votes`. Voted hands
+    are immutable sorted tuples:
         >>> vs[0].votes[:3]
-        [(3, [4, 5, 6]), (6, [1, 2, 7]), (7, [3, 8, 9])]
+        [(3, (4, 5, 6)), (6, (1, 2, 7)), (7, (3, 8, 9))]
         >>> vs[0].votes[3:]
-        [(1, []), (4, []), (9, [])]
+        [(1, ()), (4, ()), (9, ())]
         >>> vs[1].votes
-        [(3, [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]), (6, []), (7, [])]
+        [(3, (1, 2, 3, 4, 5, 6, 7, 8, 9, 10)), (6, ()), (7, ())]
 
 
     and `crash`:
@@ -84,20 +187,52 @@ class Voting(object):
         >>> v = [{1: '6-10'}, {6: '1-5'}, {'both': '2,4 5'}]
         >>> vs = Voting.from_list(v)[0]
         >>> vs.votes[:2]
-        [(1, [6, 7, 8, 9, 10]), (6, [1, 2, 3, 4, 5])]
-        >>> vs.votes[2] == (Voting.BOTH, [2, 4, 5])
+        [(1, (6, 7, 8, 9, 10)), (6, (1, 2, 3, 4, 5))]
+        >>> vs.votes[2] == (Voting.BOTH, (2, 4, 5))
         True
+
+    Votes are packed into arrays of nominated players and bit masks of
+    hands. Hands as `BitSet` make tallies single integer operations:
+        >>> [(p, len(hands & BitSet([2, 4, 6]))) for p, hands in vs.hand_sets]
+        [(1, 1), (6, 2), (777, 2)]
+
+    Players which do not fit into arrays are parse errors:
+        >>> Voting.from_list([{1: '1-40'}])
+        Traceback (most recent call last):
+        ...
+        SyntaxError: Hands 1-40 of player 1 are out of range 1-32
     """
 
     BOTH = 777
+    MAX_HAND = array.array('I').itemsize * 8
+    MAX_NOMINEE = (1 << array.array('H').itemsize * 8) - 1
+
+    __slots__ = ('_nominated', '_hands', '_crash')
 
     def __init__(self):
-        self._votes = []
+        self._nominated = array.array('H')
+        self._hands = array.array('I')
         self._crash = []
 
     @property
     def votes(self):
-        return self._votes
+        return [(player, unpack_hands(mask)) for player, mask
+                in itertools.izip(self._nominated, self._hands)]
+
+    @property
+    def hand_sets(self):
+        """List of (nominated player, BitSet of hands)."""
+        return list(self.iter_hand_sets())
+
+    def iter_hand_sets(self):
+        """Yields (nominated player, BitSet of hands) of every vote."""
+        for player, mask in itertools.izip(self._nominated, self._hands):
+            yield player, BitSet.from_mask(mask)
+
+    def _set_votes(self, votes):
+        self._nominated = array.array('H', (player for player, _ in votes))
+        self._hands = array.array('I', (pack_hands(hands)
+                                        for _, hands in votes))
 
     @property
     def crash(self):
@@ -110,13 +245,13 @@ class Voting(object):
         for v in l:
             if 'votes' in v:
                 current = Voting()
-                current._votes = Voting._parse_votes(v['votes'])
+                current._set_votes(Voting._parse_votes(v['votes']))
                 if 'crash' in v:
                     current._crash = Voting._parse_crash(v['crash'])
                 votings.append(current)
             else:
                 current = Voting()
-                current._votes = Voting._parse_votes(l)
+                current._set_votes(Voting._parse_votes(l))
                 return [current]
         return votings
 
@@ -132,8 +267,16 @@ class Voting(object):
                 item = (Voting.BOTH, item[1])
             players = (int(y.strip()) for x in str(item[0]).split(',') \
                        for y in x.split())
-            hands = [hand for hand in votes_parser.parse(item[1]) if hand]
-            voting.extend(((player, hands) for player in players))
+            hands = parse_hands(item[1])
+            if hands and not 0 < hands[0] <= hands[-1] <= Voting.MAX_HAND:
+                raise SyntaxError("Hands {0} of player {1} are out of range "
+                                  "1-{2}".format(item[1], item[0],
+                                                 Voting.MAX_HAND))
+            for player in players:
+                if not 0 <= player <= Voting.MAX_NOMINEE:
+                    raise SyntaxError("Nominated player {0} is out of range"
+                                      .format(player))
+                voting.append((player, hands))
         return voting
 
     @staticmethod
@@ -160,28 +303,48 @@ class GameLap(object):
 
     Now you can access to lap properties:
         >>> lap.speechs[1]
-        (6, [('-', 1), ('n', 1), ('-', 3), ('s', ([1, 3], -2)), ('-', 4)])
+        (6, [('-', 1), ('n', 1), ('-', 3), ('s', ((1, 3), -2)), ('-', 4)])
         >>> lap.speechs[2:4]
         [(7, [('-', 1), ('+', 6)]), (9, [('-', 1), ('-', 3), ('-', 4)])]
         >>> lap.votings[0].votes
-        [(1, [6, 7, 9]), (9, [1])]
+        [(1, (6, 7, 9)), (9, (1,))]
         >>> lap.night
         {}
         >>> lap.dead
         []
+
+    Lazy lap keeps lap dict and parses day speechs, votings and dead
+    speechs on first access of every property, so syntax errors are
+    raised on access too:
+        >>> lap = GameLap.from_dict({'day': [{1: '+2 (3'}]}, lazy=True)
+        >>> lap.votings
+        []
+        >>> try:
+        ...     lap.speechs
+        ... except SyntaxError as e:
+        ...     print e.text
+        +2 (3
     """
+    __slots__ = ('_speechs', '_votings', '_night_actions', '_dead',
+                 '_source')
+
     def __init__(self, **kwargs):
         self._speechs = kwargs.get('speechs', [])
         self._votings = kwargs.get('votings', [])
         self._night_actions = kwargs.get('night', {})
         self._dead = kwargs.get('dead', [])
+        self._source = None
 
     @property
     def speechs(self):
+        if self._speechs is None:
+            self._speechs = GameLap._parse_speechs(self._source.get('day', []))
         return self._speechs
 
     @property
     def votings(self):
+        if self._votings is None:
+            self._votings = Voting.from_list(self._source.get('voting', []))
         return self._votings
 
     @property
@@ -190,23 +353,37 @@ class GameLap(object):
 
     @property
     def dead(self):
+        if self._dead is None:
+            self._dead = GameLap._parse_dead(self._source.get('dead', []))
         return self._dead
 
     @staticmethod
-    def from_dict(d):
-        """Constructs GameLap from dict"""
-        logging.debug("Parsing day: {0}".format(d.keys()))
+    def from_dict(d, lazy=False):
+        """Constructs GameLap from dict. If @lazy is true, speechs are
+        parsed on first access."""
         lap = GameLap()
+        lap._night_actions = d.get('night', {})
+        if lazy:
+            lap._source = d
+            lap._speechs = lap._votings = lap._dead = None
+            return lap
+
+        logging.debug("Parsing day: {0}".format(d.keys()))
         lap._speechs = GameLap._parse_speechs(d.get('day', []))
         lap._votings = Voting.from_list(d.get('voting', []))
-        lap._night_actions = d.get('night', {})
-        lap._dead = []
-        for p_sp in d.get('dead', []):
+        lap._dead = GameLap._parse_dead(d.get('dead', []))
+
+        return lap
+
+    @staticmethod
+    def _parse_dead(dead):
+        result = []
+        for p_sp in dead:
             logging.debug("Parsing dead: {0}".format(p_sp))
             p, sp = CU.undict(p_sp)
-            lap._dead.append((p, PlayerSpeech.from_str(sp)))
+            result.append((p, PlayerSpeech.from_str(sp)))
 
-        return lap
+        return result
 
     @staticmethod
     def _parse_speechs(speechs):
@@ -219,11 +396,31 @@ class GameLap(object):
 
 
 class MafGame(object):
-    """Contains log of mafia game."""
+    """Contains log of mafia game.
+
+    Players names are interned, see `intern_name`.
+
+    Lazy game parses speechs and votings of lap on first access, so
+    metadata is available at cost of yaml loading only:
+        >>> g = MafGame.from_yaml({
+        ...     'club': 'showtime', 'roles': {'don': 1},
+        ...     'laps': [{'day': [{1: '+2 -3,4 n5'}]}, {'end': 'Red'}]},
+        ...     lazy=True)
+        >>> misses = parse_speech.cache.info().misses
+        >>> g.club, g.end, len(g.laps)
+        ('showtime', 'red', 1)
+        >>> parse_speech.cache.info().misses - misses
+        0
+        >>> g.laps[0].speechs
+        [(1, [('+', 2), ('-', 3), ('-', 4), ('n', 5)])]
+    """
+    __slots__ = ('_laps', '_players', '_roles', '_end', '_date', '_club',
+                 '_locality')
+
     def __init__(self, **kwargs):
         self._laps = kwargs.get('laps', [])
         self._players = kwargs.get('players', [])
-        self._roles = kwargs.get('roles', [])
+        self._roles = kwargs.get('roles', {})
         self._end = kwargs.get('end', None)
         self._date = kwargs.get('date', None)
         self._club = kwargs.get('club', None)
@@ -262,8 +459,12 @@ class MafGame(object):
         return self._end
 
     @staticmethod
-    def from_yaml(game):
-        """:returns: MafGame object created from parsed yaml game dict."""
+    def from_yaml(game, lazy=False):
+        """:returns: MafGame object created from parsed yaml game dict.
+
+        If @lazy is true, laps are parsed on first access, see
+        `GameLap.from_dict`.
+        """
         mg = MafGame()
         mg._locality = game.get('locality', None)
         logging.debug("Game locality: {0}".format(mg.locality))
@@ -271,7 +472,8 @@ class MafGame(object):
         logging.info("Game date: {0}".format(mg.date))
         mg._club = game.get('club')
         logging.info("Game club: {0}".format(mg.club))
-        mg._players = game.get('players', [])
+        mg._players = [intern_name(name)
+                       for name in game.get('players', [])]
         logging.debug("Game players: {0}".format(CU.strlist(mg.players)))
         mg._roles = game.get('roles', {})
         logging.debug("Game roles: {0}".format(mg.roles))
@@ -279,7 +481,7 @@ class MafGame(object):
         logging.info("Game wins: {0}".format(mg.end))
 
         logging.info("Start parsing laps...")
-        mg._laps = [GameLap.from_dict(lap) for lap in game['laps'][:-1]]
+        mg._laps = [GameLap.from_dict(lap, lazy) for lap in game['laps'][:-1]]
 
         return mg
 
@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+"""Inference of players roles from positions, sheriff claims and nights.
+
+All possible role assignments of the table (one don, two mafia and one
+sheriff among ten players) are enumerated once and packed into one
+integer per assignment, two bits per player:
+    >>> table = assignments()
+    >>> len(table), table.dtype
+    (2520, dtype('uint32'))
+    >>> unpack(table[:1])
+    array([[2, 1, 1, 3, 0, 0, 0, 0, 0, 0]], dtype=int8)
+
+`RoleInference` keeps log score of every assignment. It subscribes to
+GameState, so changed position row updates only terms of that row, and
+to ReplayEngine events for sheriff claims and night actions:
+    >>> import maf
+    >>> lap = maf.GameLap.from_dict({
+    ...     'day': [{1: '($ -4 +2)'}, {2: '+1 -4'}, {3: '-4 -5'}],
+    ...     'night': {'shot': 9, 'sheriff': 4, 'don': 1}})
+    >>> lap2 = maf.GameLap.from_dict({'day': [{1: '($ -4 +2)'}]})
+    >>> game = maf.MafGame(laps=[lap, lap2])
+    >>> engine = maf.replay.ReplayEngine()
+    >>> inference = RoleInference.attach(engine)
+    >>> engine.replay(game)
+    >>> inference.black_probability().round(2)
+    array([0.04, 0.04, 0.33, 0.92, 0.35, 0.32, 0.32, 0.32, 0.02, 0.32])
+    >>> inference.probability(columns.SHERIFF).round(2)[:3]
+    array([0.88, 0.01, 0.01])
+
+Most likely assignments with their probabilities:
+    >>> [(round(p, 3), sorted(roles.items()))
+    ...  for p, roles in inference.most_likely(1)]
+    [(0.021, [('don', 4), ('maf', [5, 6]), ('sheriff', 1)])]
+
+Information told with its source is evidence about the source, not the
+speaker, and repeated evidence is applied once:
+    >>> told = RoleInference(maf.interp.GameState())
+    >>> told.action(1, ('i', (5, ((actions.NOT_PLAY, 2),))))
+    >>> told.action(3, ('$', (0, actions.CANCEL)))
+    >>> told.action(3, ('$', (0, actions.CANCEL)))
+    >>> own = RoleInference(maf.interp.GameState())
+    >>> own.information(5, ((actions.NOT_PLAY, 2),))
+    >>> own.sheriff_claim(3, actions.CANCEL)
+    >>> numpy.allclose(told.scores, own.scores)
+    True
+"""
+
+import itertools
+import math
+import numpy
+
+import actions
+import columns
+import replay
+
+LAYOUT = (columns.DON, columns.MAF, columns.MAF, columns.SHERIFF)
+ROLE_NAMES = {columns.MAF: 'maf', columns.DON: 'don',
+              columns.SHERIFF: 'sheriff'}
+ROLE_BITS = 2
+
+# Probabilities of evidence used as likelihood of assignment.
+CLAIM_BY_SHERIFF = 0.5
+CLAIM_BY_BLACK = 0.15
+CLAIM_BY_CIVILIAN = 0.01
+REFUSAL_BY_SHERIFF = 0.2
+SHERIFF_LIES = 0.01
+INFORMATION_IS_TRUE = 0.8
+DON_CHECKS_BLACK = 0.1
+MAFIA_SHOOTS_BLACK = 0.05
+IMPOSSIBLE = 1e-4
+POSITION_WEIGHT = 0.1
+POSITION_EPS = 1e-3
+
+
+_ASSIGNMENTS = {}
+
+
+def assignments(players=10):
+    """:returns: uint32 array of all role assignments of @players, role of
+    player N is in bits 2 * (N - 1) of every item. Array is computed once
+    and shared."""
+    if players in _ASSIGNMENTS:
+        return _ASSIGNMENTS[players]
+    seats = range(players)
+    packed = []
+    for don in seats:
+        rest = [s for s in seats if s != don]
+        for mafs in itertools.combinations(rest, 2):
+            for sheriff in rest:
+                if sheriff in mafs:
+                    continue
+                code = 0
+                for seat, role in zip((don,) + mafs + (sheriff,), LAYOUT):
+                    code |= role << (ROLE_BITS * seat)
+                packed.append(code)
+    result = numpy.array(packed, dtype=numpy.uint32)
+    result.setflags(write=False)
+    _ASSIGNMENTS[players] = result
+    return result
+
+
+def unpack(packed, players=10):
+    """:returns: (assignments x @players) int8 matrix of role codes of
+    @packed assignments."""
+    shifts = numpy.arange(players, dtype=numpy.uint32) * ROLE_BITS
+    mask = (1 << ROLE_BITS) - 1
+    return ((packed[:, numpy.newaxis] >> shifts) & mask).astype(numpy.int8)
+
+
+def _log(p):
+    return math.log(p)
+
+
+class RoleInference(object):
+    """Log scores of all role assignments updated after every action."""
+    def __init__(self, state, players=10, position_weight=POSITION_WEIGHT):
+        self._state = state
+        self._players = players
+        self._init_tables()
+        self._weight = position_weight
+        self._rows = numpy.zeros((players, len(self._packed)))
+        self._scores = numpy.zeros(len(self._packed))
+        self._claimants = set()
+        self._claims = set()
+        self._refusals = set()
+        self._informed = set()
+        self._night_checks = []
+        self._probs = None
+        for row in xrange(players):
+            self._update_row(row)
+        state.subscribe(self.update_row)
+
+    def _init_tables(self):
+        self._packed = assignments(self._players)
+        self._roles = unpack(self._packed, self._players)
+        self._black = (self._roles == columns.MAF) | \
+                      (self._roles == columns.DON)
+        self._black_f = self._black.astype(float)
+        self._red_f = 1. - self._black_f
+
+    def __getstate__(self):
+        # Tables of assignments are the same for all games.
+        state = self.__dict__.copy()
+        for name in ('_packed', '_roles', '_black', '_black_f', '_red_f',
+                     '_probs'):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._probs = None
+        self._init_tables()
+
+    @classmethod
+    def attach(cls, engine, **kwargs):
+        """:returns: RoleInference following state and events of
+        ReplayEngine @engine."""
+        inference = cls(engine.state, **kwargs)
+        engine.subscribe(inference.observe)
+        return inference
+
+    def close(self):
+        self._state.unsubscribe(self.update_row)
+
+    def _is(self, player, role):
+        return self._roles[:, player - 1] == role
+
+    def _is_black(self, player):
+        return self._black[:, player - 1]
+
+    def _add(self, condition, p_true, p_false=1.):
+        """Adds log likelihood of evidence which has probability @p_true
+        for assignments with @condition and @p_false for others."""
+        self._scores += numpy.where(condition, _log(p_true), _log(p_false))
+        self._probs = None
+
+    def _update_row(self, row):
+        p = numpy.clip(self._state.position[row], POSITION_EPS,
+                       1. - POSITION_EPS)
+        same, other = numpy.log(p), numpy.log(1. - p)
+        same[row] = other[row] = 0.
+        # Red player opinion is honest guess, black one says nothing.
+        honest = self._red_f.dot(same) + self._black_f.dot(other)
+        silent = (len(p) - 1) * _log(0.5)
+        terms = self._weight * numpy.where(self._black[:, row], silent,
+                                           honest)
+        self._scores += terms - self._rows[row]
+        self._rows[row] = terms
+
+    def update_row(self, row):
+        """Recomputes terms of changed position @row."""
+        self._update_row(row)
+        self._probs = None
+
+    def _check(self, claimant, night, sign, target):
+        if target is None or (claimant, night, sign, target) in self._claims:
+            return
+        self._claims.add((claimant, night, sign, target))
+        honest = self._is_black(target) == (sign == actions.NOT_PLAY)
+        if night <= len(self._night_checks):
+            honest &= self._night_checks[night - 1] == target
+        sheriff = self._is(claimant, columns.SHERIFF)
+        self._scores += numpy.where(
+                sheriff, numpy.where(honest, 0., _log(SHERIFF_LIES)),
+                _log(0.5))
+        self._probs = None
+
+    def sheriff_claim(self, claimant, checks):
+        """Applies claim of @claimant to be sheriff with @checks payload
+        of SHERIFF action: tuple of (sign, player) by nights, None or
+        CANCEL for refusal."""
+        if checks == actions.CANCEL:
+            if claimant not in self._refusals:
+                self._refusals.add(claimant)
+                self._add(self._is(claimant, columns.SHERIFF),
+                          REFUSAL_BY_SHERIFF)
+            return
+        if claimant not in self._claimants:
+            self._claimants.add(claimant)
+            self._add(self._is(claimant, columns.SHERIFF), CLAIM_BY_SHERIFF,
+                      CLAIM_BY_CIVILIAN)
+            self._add(self._is_black(claimant),
+                      CLAIM_BY_BLACK / CLAIM_BY_CIVILIAN)
+        for night, (sign, target) in enumerate(checks or (), 1):
+            self._check(claimant, night, sign, target)
+
+    def information(self, source, checks):
+        """Applies @checks of INFORMATION action from @source player,
+        they are true if @source is red."""
+        for sign, target in checks:
+            if target is None or (source, sign, target) in self._informed:
+                continue
+            self._informed.add((source, sign, target))
+            honest = self._is_black(target) == (sign == actions.NOT_PLAY)
+            self._scores += numpy.where(
+                    self._is_black(source), _log(0.5),
+                    numpy.where(honest, _log(INFORMATION_IS_TRUE),
+                                _log(1. - INFORMATION_IS_TRUE)))
+            self._probs = None
+
+    def action(self, player, action):
+        code, data = action
+        if code == actions.SHERIFF:
+            num, checks = data
+            self.sheriff_claim(num or player, checks)
+        elif code == actions.INFORMATION:
+            source, checks = data
+            self.information(source or player, checks)
+
+    def night(self, name, target):
+        """Applies night action @name ('sheriff', 'don' or 'shot') on
+        @target known from game log."""
+        if name == 'sheriff':
+            self._night_checks.append(target)
+            self._add(self._is(target, columns.SHERIFF), IMPOSSIBLE)
+        elif name == 'don':
+            self._add(self._is(target, columns.DON), IMPOSSIBLE)
+            self._add(self._is_black(target), DON_CHECKS_BLACK)
+        elif name == 'shot':
+            self._add(self._is_black(target), MAFIA_SHOOTS_BLACK)
+
+    def observe(self, event):
+        """ReplayEngine observer."""
+        if event.kind == replay.ACTION:
+            self.action(event.player, event.data)
+        elif event.kind == replay.NIGHT:
+            self.night(event.data, event.player)
+
+    @property
+    def scores(self):
+        """Log scores of all assignments in `assignments` order."""
+        return self._scores
+
+    def posterior(self):
+        """:returns: probability of every assignment."""
+        if self._probs is None:
+            scores = self.scores
+            probs = numpy.exp(scores - scores.max())
+            self._probs = probs / probs.sum()
+        return self._probs
+
+    def black_probability(self):
+        """:returns: array of probabilities of players to be black."""
+        return self.posterior().dot(self._black_f)
+
+    def probability(self, role):
+        """:returns: array of probabilities of players to have @role code
+        of `maf.columns`."""
+        return self.posterior().dot(self._roles == role)
+
+    def most_likely(self, k=1):
+        """:returns: list of (probability, roles dict) of @k most likely
+        assignments."""
+        probs = self.posterior()
+        result = []
+        for index in numpy.argsort(-probs, kind='mergesort')[:k]:
+            roles = {}
+            for seat, role in enumerate(self._roles[index], 1):
+                if role in ROLE_NAMES:
+                    roles.setdefault(ROLE_NAMES[role], []).append(seat)
+            roles = dict((name, players if len(players) > 1 else players[0])
+                         for name, players in roles.iteritems())
+            result.append((float(probs[index]), roles))
+        return result
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
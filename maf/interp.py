@@ -5,15 +5,31 @@ import maf.game
 import maf.actions
 import maf.utils
 
+import collections
 import logging
 import math
+import numpy
 
 from StringIO import StringIO
+from util.bitset import BitSet
 
 
 class SpeechCallback(object):
-
+    """Updates positions of GameState by speech actions.
+
+    Player repeated in targets of one action is moved again for every
+    repeat:
+        >>> state = GameState()
+        >>> callback = SpeechCallback(0.6)
+        >>> _ = callback(maf.actions.SET, 1, ((2, 2), -1), state)
+        >>> round(state.position[0][1], 3)
+        0.245
+    """
     def __init__(self, coeff=0.6):
+        self._init_factory()
+        self._coeff = coeff
+
+    def _init_factory(self):
         self.factory = {
             maf.actions.PLAY: self._play,
             maf.actions.NOT_PLAY: self._not_play,
@@ -21,7 +37,16 @@ class SpeechCallback(object):
             maf.actions.NOMINATE: self._nominate,
             maf.actions.DENOMINATE: self._denominate
             }
-        self._coeff = coeff
+
+    def __getstate__(self):
+        # Bound methods are not picklable, factory is rebuilt on load.
+        state = self.__dict__.copy()
+        del state['factory']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_factory()
 
     @property
     def coeff(self):
@@ -34,27 +59,31 @@ class SpeechCallback(object):
 
     def _play(self, player_num, players, state):
         logging.debug("{1} plays with: {0}".format(players, player_num))
-        logging.debug("type {0}".format(type(players)))
-        if isinstance(players, int):
-            players = [players]
-        for p in players:
-            if p not in state.alive:
-                continue
-            cur = state.position[player_num - 1][p - 1]
-            state.position[player_num - 1][p - 1] = self._update_position(cur)
+        row = state.position[player_num - 1]
+        for targets in self._target_passes(state, players):
+            row[targets] = self._update_position(row[targets])
+        state.notify_changed(player_num - 1)
         return state
 
     def _not_play(self, player_num, players, state):
         logging.debug("{1} not plays with: {0}".format(players, player_num))
-        if isinstance(players, int):
-            players = [players]
-        for p in players:
-            if p not in state.alive:
-                continue
-            cur = 1 - state.position[player_num - 1][p - 1]
-            state.position[player_num - 1][p - 1] = 1 - self._update_position(cur)
+        row = state.position[player_num - 1]
+        for targets in self._target_passes(state, players):
+            row[targets] = 1 - self._update_position(1 - row[targets])
+        state.notify_changed(player_num - 1)
         return state
 
+    @staticmethod
+    def _target_passes(state, players):
+        """Yields arrays of unique indexes of alive @players, player
+        repeated N times is in first N arrays."""
+        targets, counts = numpy.unique(state.alive_indexes(players),
+                                       return_counts=True)
+        while len(targets):
+            yield targets
+            counts -= 1
+            repeated = counts > 0
+            targets, counts = targets[repeated], counts[repeated]
 
     def _nominate(self, player_num, who, state):
         logging.debug("{0} nominates player No: {1}".format(player_num, who))
@@ -66,17 +95,20 @@ class SpeechCallback(object):
     def _denominate(self, player_num, who, state):
         logging.debug("{0} denominates player No: {1}".format(player_num, who))
         if state._nominated and state._nominated[-1] == (player_num, who):
-            self._nominated.pop()
+            state._nominated.pop()
 
     def _set(self, player_num, data, state):
-        if data[1] > 0:
-            data[1] += -len(data[0])
+        players, blacks = data
+        if blacks > 0:
+            blacks -= len(players)
         logging.debug("{0} thinks what in {1} {2} black players" \
-                      .format(player_num, data[0], -data[1]))
+                      .format(player_num, players, -blacks))
         save_coeff = self._coeff
-        self._coeff *= -data[1] / float(len(data[0]))
-        logging.debug("Change coeff to {0}".format(self._coeff))
-        self._not_play(player_num, data[0], state)
+        # Not in place, coeff may be array of BatchSpeechCallback.
+        self._coeff = self._coeff * (-blacks / float(len(players)))
+        # Formatted lazily, coeff array is expensive to print.
+        logging.debug("Change coeff to %s", self._coeff)
+        self._not_play(player_num, players, state)
         self._coeff = save_coeff
         return state
 
@@ -97,13 +129,63 @@ def print_pmatrix(mat):
     return buf.getvalue()
 
 
+class AliveView(collections.Set):
+    """Set of alive players numbers backed by GameState alive mask."""
+    def __init__(self, mask):
+        self._mask = mask
+
+    def __contains__(self, num):
+        return isinstance(num, (int, long, numpy.integer)) \
+               and 0 < num <= len(self._mask) and bool(self._mask[num - 1])
+
+    def __iter__(self):
+        return (int(i) + 1 for i in numpy.flatnonzero(self._mask))
+
+    def __len__(self):
+        return int(numpy.count_nonzero(self._mask))
+
+    def __repr__(self):
+        return "AliveView({0})".format(list(self))
+
+
 class GameState(object):
-    """Players position and alive players container."""
-    def __init__(self):
-        self._positions = [[0.5 if i != j else 1. for i in range(10)] \
-                           for j in range(10)]
-        self._alive = set(i + 1 for i in range(10))
+    """Players position and alive players container.
+
+    Positions are stored in float64 matrix, where row is player opinion
+    about others. Alive players are stored in boolean mask:
+        >>> state = GameState()
+        >>> state.position.shape
+        (10, 10)
+        >>> state.position[0][1]
+        0.5
+        >>> state.kill(3)
+        >>> 3 in state.alive, len(state.alive), list(state.alive)[:3]
+        (False, 9, [1, 2, 4])
+        >>> state.alive_indexes([2, 3, 4, 11])
+        array([1, 3])
+
+    The same alive players are kept in `BitSet`, so majority checks are
+    integer operations:
+        >>> hands = BitSet([1, 2, 3, 4, 5, 6])
+        >>> len(hands & state.alive_set) * 2 > len(state.alive_set)
+        True
+
+    Observers subscribed to state are called with zero-based index of
+    changed position row:
+        >>> changed = []
+        >>> state.subscribe(changed.append)
+        >>> state = SpeechCallback()(maf.actions.PLAY, 2, [1, 4], state)
+        >>> changed
+        [1]
+    """
+    def __init__(self, players=10):
+        self._positions = numpy.full((players, players), 0.5)
+        numpy.fill_diagonal(self._positions, 1.)
+        self._alive_mask = numpy.ones(players, dtype=bool)
+        self._alive = AliveView(self._alive_mask)
+        self._alive_set = BitSet(xrange(1, players + 1))
         self._nominated = []
+        self._observers = []
 
     @property
     def position(self):
@@ -113,6 +195,22 @@ class GameState(object):
     def alive(self):
         return self._alive
 
+    @property
+    def alive_mask(self):
+        return self._alive_mask
+
+    @property
+    def alive_set(self):
+        """BitSet of alive players numbers."""
+        return self._alive_set
+
+    def alive_indexes(self, players):
+        """:returns: array of zero-based indexes of alive players among
+        @players numbers (number or iterable of numbers)."""
+        players = numpy.array(players, dtype=int, ndmin=1) - 1
+        players = players[(players >= 0) & (players < len(self._alive_mask))]
+        return players[self._alive_mask[players]]
+
     @property
     def nominated(self):
         return [n[1] for n in self._nominated]
@@ -121,8 +219,33 @@ class GameState(object):
     def nominated(self, value):
         self._nominated = value
 
+    @property
+    def nominated_set(self):
+        """BitSet of nominated players numbers."""
+        return BitSet(self.nominated)
+
+    def __getstate__(self):
+        # Observers are not pickled, their owners subscribe again.
+        state = self.__dict__.copy()
+        state['_observers'] = []
+        return state
+
+    def subscribe(self, observer):
+        """Calls @observer(row) after every change of position row."""
+        self._observers.append(observer)
+
+    def unsubscribe(self, observer):
+        self._observers.remove(observer)
+
+    def notify_changed(self, row):
+        for observer in self._observers:
+            observer(row)
+
     def kill(self, num):
-        self._alive.remove(num)
+        if num not in self._alive:
+            raise KeyError(num)
+        self._alive_mask[num - 1] = False
+        self._alive_set = self._alive_set - BitSet([num])
 
     def __repr__(self):
         return "<GamePosition:\n" + maf.utils.str_pmatrix(self.position) + '>'
@@ -158,18 +281,21 @@ class GameInterpretor(object):
 
 
 def interp_game(game):
-    interpretor = GameInterpretor()
+    """Yields (now, state) before the game and after every day speech
+    action. Game is replayed by `maf.replay.ReplayEngine`, so votings,
+    kills and nights are applied between days too."""
+    import maf.replay
+    engine = maf.replay.ReplayEngine()
     now = {'lap': 0, 'speech': 0} # (now lap, now speech)
-    yield (now, interpretor.state)
-    for lap in game.laps:
-        now['lap'] += 1
-        now['speech'] = 0
-        for p, speech in lap.speechs:
-            now['speech'] += 1
-            for action in speech.actions:
-                interpretor.interp(p, action)
-                yield (now, interpretor.state)
+    yield (now, engine.state)
+    for event in engine.events(game):
+        if event.kind == maf.replay.ACTION \
+           and event.section == maf.replay.DAY:
+            now['lap'] = event.lap
+            now['speech'] = event.index
+            yield (now, engine.state)
 
 
 if __name__ == '__main__':
-    logging.basicConfig(level=logging.DEBUG)
+    import doctest
+    doctest.testmod()
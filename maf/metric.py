@@ -1,4 +1,46 @@
 #!/usr/bin/env python
+"""Distances between players positions.
+
+Every player position is a row of GameState position matrix. Distances
+between all rows are computed at once, for one state or for stack of
+states (whole game trajectory):
+    >>> import numpy
+    >>> pos = numpy.array([[1., 0.25, 0.5], [0.75, 1., 0.5], [0.5, 0.5, 1.]])
+    >>> calc_distance(pos)
+    array([[0.    , 0.625 , 0.5625],
+           [0.625 , 0.    , 0.5625],
+           [0.5625, 0.5625, 0.    ]])
+    >>> calc_distance(pos, 'manhattan')[0]
+    array([0.  , 1.  , 1.25])
+    >>> calc_distance([pos, pos * 0.5]).shape
+    (2, 3, 3)
+
+Most and least distant pairs:
+    >>> max_distance(calc_distance(pos), 2)
+    [(0.625, (1, 2)), (0.5625, (2, 3))]
+    >>> min_distance(calc_distance(pos), 1)
+    [(0.5625, (1, 3))]
+    >>> max_distance(calc_distance([pos, pos * 0.5]), 1)
+    [[(0.625, (1, 2))], [(0.15625, (1, 2))]]
+
+`DistanceTracker` keeps distances and ranked pairs of GameState up to
+date after every changed position row:
+    >>> import maf.interp
+    >>> state = maf.interp.GameState(players=3)
+    >>> tracker = DistanceTracker(state)
+    >>> state.position[0] = pos[0]
+    >>> state.notify_changed(0)
+    >>> tracker.max_distance(2)
+    [(0.8125, (1, 2)), (0.5625, (1, 3))]
+    >>> tracker.max_distance(2) == max_distance(calc_distance(state), 2)
+    True
+    >>> tracker.min_distance(1)
+    [(0.5, (2, 3))]
+"""
+
+import heapq
+import numpy
+
 
 def euqlidean(x, y):
     result = list(x)
@@ -7,19 +49,226 @@ def euqlidean(x, y):
     return sum(result)
 
 
+def _diff(pos):
+    return pos[..., :, numpy.newaxis, :] - pos[..., numpy.newaxis, :, :]
+
+
+def sqeuclidean(pos):
+    return (_diff(pos) ** 2).sum(axis=-1)
+
+
+def euclidean(pos):
+    return numpy.sqrt(sqeuclidean(pos))
+
+
+def manhattan(pos):
+    return numpy.abs(_diff(pos)).sum(axis=-1)
+
+
+def cosine(pos):
+    """Cosine distance. Distance to zero row is 1."""
+    dot = numpy.einsum('...im,...jm->...ij', pos, pos)
+    norm = numpy.sqrt(numpy.einsum('...ii->...i', dot))
+    denom = norm[..., :, numpy.newaxis] * norm[..., numpy.newaxis, :]
+    similarity = numpy.divide(dot, denom, out=numpy.zeros_like(dot),
+                              where=denom > 0)
+    return numpy.maximum(1. - similarity, 0.)
+
+
+def correlation(pos):
+    """Correlation distance. Distance to constant row is 1."""
+    return cosine(pos - pos.mean(axis=-1)[..., numpy.newaxis])
+
+
+METRICS = {
+    'sqeuclidean': sqeuclidean,
+    'euclidean': euclidean,
+    'manhattan': manhattan,
+    'cosine': cosine,
+    'correlation': correlation,
+}
+
+
+def _positions(state):
+    if hasattr(state, 'position'):
+        return numpy.asarray(state.position, dtype=float)
+    if isinstance(state, (list, tuple)) and state \
+       and hasattr(state[0], 'position'):
+        return numpy.array([s.position for s in state], dtype=float)
+    return numpy.asarray(state, dtype=float)
+
+
 def calc_distance(state, metric=euqlidean):
-    distances = []
-    for pos in state.position:
-        cur = [euqlidean(pos, x) for x in state.position]
-        distances.append(cur)
+    """:returns: matrix of distances between all players positions.
+
+    @state is GameState, position matrix or stack of them. In the last
+    case stack of distance matrices is returned.
+    @metric is name from METRICS or function which takes stack of
+    position matrices (..., n, m) and returns distances (..., n, n).
+    Default `euqlidean` is squared euclidean distance.
+    """
+    return _resolve(metric)(_positions(state))
+
+
+def _top_pairs(distances, k, largest):
+    distances = numpy.asarray(distances)
+    n = distances.shape[-1]
+    first, second = numpy.triu_indices(n, 1)
+    values = distances[first, second]
+    if k is None or k >= len(values):
+        k = len(values)
+        candidates = numpy.arange(len(values))
+    else:
+        keys = -values if largest else values
+        threshold = numpy.partition(keys, k - 1)[k - 1]
+        candidates = numpy.flatnonzero(keys <= threshold)
+    if largest:
+        order = numpy.lexsort((-second[candidates], -first[candidates],
+                               -values[candidates]))
+    else:
+        order = numpy.lexsort((second[candidates], first[candidates],
+                               values[candidates]))
+    chosen = candidates[order[:k]]
+    return [(float(values[i]), (int(first[i]) + 1, int(second[i]) + 1))
+            for i in chosen]
+
+
+def max_distance(distances, k=None):
+    """:returns: list of (distance, (player, player)) for @k most distant
+    pairs of different players (all pairs if @k is None) in descending
+    order.
+
+    Pairs are selected by partial selection, so getting few pairs is
+    cheaper than full sort. For stack of distance matrices list of
+    results for every matrix is returned.
+    """
+    if numpy.ndim(distances) > 2:
+        return [max_distance(d, k) for d in distances]
+    return _top_pairs(distances, k, largest=True)
+
+
+def min_distance(distances, k=None):
+    """:returns: list of (distance, (player, player)) for @k least distant
+    pairs of different players in ascending order."""
+    if numpy.ndim(distances) > 2:
+        return [min_distance(d, k) for d in distances]
+    return _top_pairs(distances, k, largest=False)
+
+
+def _resolve(metric):
+    if metric is euqlidean:
+        return sqeuclidean
+    if not callable(metric):
+        return METRICS[metric]
+    return metric
+
+
+def _row_sqeuclidean(pos, row):
+    diff = pos - pos[row]
+    return numpy.einsum('ij,ij->i', diff, diff)
+
+
+def _row_manhattan(pos, row):
+    return numpy.abs(pos - pos[row]).sum(axis=1)
+
+
+_ROW_METRICS = {
+    sqeuclidean: _row_sqeuclidean,
+    euclidean: lambda pos, row: numpy.sqrt(_row_sqeuclidean(pos, row)),
+    manhattan: _row_manhattan,
+}
+
+
+def row_distance(pos, row, metric=euqlidean):
+    """:returns: distances from position @row to all rows of @pos."""
+    pos = numpy.asarray(pos, dtype=float)
+    metric = _resolve(metric)
+    if metric in _ROW_METRICS:
+        return _ROW_METRICS[metric](pos, row)
+    pairs = numpy.empty((len(pos), 2, pos.shape[-1]))
+    pairs[:, 0] = pos[row]
+    pairs[:, 1] = pos
+    return metric(pairs)[:, 0, 1]
+
+
+class DistanceTracker(object):
+    """Incrementally maintained distance matrix of GameState positions.
+
+    Tracker subscribes to state and on every changed row recomputes only
+    distances of that row and column. Most and least distant pairs are
+    kept in heaps with lazy removal of outdated entries.
+    """
+    def __init__(self, state, metric=euqlidean):
+        self._state = state
+        self._metric = _resolve(metric)
+        self._distances = numpy.array(calc_distance(state, self._metric))
+        n = len(self._distances)
+        self._version = [[0] * n for _ in xrange(n)]
+        self._rebuild()
+        state.subscribe(self.update_row)
+
+    @property
+    def distances(self):
+        return self._distances
+
+    def close(self):
+        self._state.unsubscribe(self.update_row)
+
+    def _rebuild(self):
+        n = len(self._distances)
+        self._max_heap = []
+        self._min_heap = []
+        for i in xrange(n):
+            for j in xrange(i + 1, n):
+                value = float(self._distances[i, j])
+                version = self._version[i][j]
+                self._max_heap.append((-value, -i, -j, version))
+                self._min_heap.append((value, i, j, version))
+        heapq.heapify(self._max_heap)
+        heapq.heapify(self._min_heap)
+
+    def update_row(self, row):
+        """Recomputes distances of changed position @row."""
+        values = row_distance(self._state.position, row, self._metric)
+        values[row] = 0.
+        self._distances[row, :] = values
+        self._distances[:, row] = values
+        n = len(values)
+        version = self._version
+        max_heap, min_heap = self._max_heap, self._min_heap
+        for other, value in enumerate(values.tolist()):
+            if other == row:
+                continue
+            i, j = (row, other) if row < other else (other, row)
+            version[i][j] += 1
+            current = version[i][j]
+            heapq.heappush(max_heap, (-value, -i, -j, current))
+            heapq.heappush(min_heap, (value, i, j, current))
+        if len(max_heap) > 4 * n * n:
+            self._rebuild()
+
+    def _top(self, heap, k, largest):
+        chosen = []
+        while heap and len(chosen) < k:
+            entry = heapq.heappop(heap)
+            i, j = (-entry[1], -entry[2]) if largest else entry[1:3]
+            if entry[3] == self._version[i][j]:
+                chosen.append(entry)
+        for entry in chosen:
+            heapq.heappush(heap, entry)
+        if largest:
+            return [(-v, (1 - i, 1 - j)) for v, i, j, _ in chosen]
+        return [(v, (i + 1, j + 1)) for v, i, j, _ in chosen]
+
+    def max_distance(self, k):
+        """:returns: @k most distant pairs, same as `max_distance`."""
+        return self._top(self._max_heap, k, largest=True)
 
-    return distances
+    def min_distance(self, k):
+        """:returns: @k least distant pairs, same as `min_distance`."""
+        return self._top(self._min_heap, k, largest=False)
 
 
-def max_distance(distances):
-    max_distance = list(set((y, tuple(sorted([p + 1, x + 1]))) \
-                            for p, row in enumerate(distances) \
-                            for x, y in enumerate(row)
-                           ))
-    max_distance.sort(reverse=True)
-    return max_distance
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
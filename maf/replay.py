@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+"""Single pass replay of the whole game.
+
+`ReplayEngine` applies every game event in game order: day speechs,
+votes with crash speechs, kills after votings, dead speechs and night
+actions. After every applied event observers are called with `Event`:
+    >>> import maf
+    >>> lap = maf.GameLap.from_dict({
+    ...     'day': [{1: 'n4 +2'}, {2: 'n5'}, {3: '-4'}],
+    ...     'voting': [{4: '1 2 3'}, {5: '4'}],
+    ...     'dead': [{4: '-1'}],
+    ...     'night': {'shot': 2, 'sheriff': 1}})
+    >>> game = maf.MafGame(laps=[lap], end='red')
+    >>> engine = ReplayEngine()
+    >>> events = []
+    >>> engine.subscribe(events.append)
+    >>> engine.replay(game)
+    >>> for e in events:
+    ...     print e.kind, e.lap, e.section, e.index, e.player, e.data
+    lap 1 None None None None
+    action 1 day 1 1 ('n', 4)
+    action 1 day 1 1 ('+', 2)
+    action 1 day 2 2 ('n', 5)
+    action 1 day 3 3 ('-', 4)
+    vote 1 voting 1 4 BitSet([1, 2, 3])
+    vote 1 voting 1 5 BitSet([4])
+    voting 1 voting 1 None VotingResult(leaders=(4,), eliminated=(4,))
+    kill 1 voting 1 4 voting
+    action 1 dead 1 4 ('-', 1)
+    night 1 night None 1 sheriff
+    night 1 night None 2 shot
+    kill 1 night None 2 shot
+    end 1 None None None red
+    >>> sorted(engine.state.alive_set)
+    [1, 3, 5, 6, 7, 8, 9, 10]
+
+Nomination withdrawn in the same speech is removed:
+    >>> engine = ReplayEngine()
+    >>> engine.start_lap()
+    >>> engine.speech(1, 'n4')
+    >>> engine.speech(2, 'n5')
+    >>> engine.state.nominated
+    [4, 5]
+    >>> engine.speech(2, 'd5')
+    >>> engine.state.nominated
+    [4]
+
+Votes are resolved by `resolve_voting` which counts alive hands of every
+nominee once. The same engine drives console application, there events
+are applied one by one with `speech`, `voting`, `kill` and `night`.
+"""
+
+import logging
+
+from collections import deque
+from collections import namedtuple
+
+import events
+import game as maf_game
+import interp
+
+LAP = events.LAP
+ACTION = events.ACTION
+VOTE = events.VOTE
+VOTING = events.VOTING
+KILL = 'kill'
+SPEECH = events.SPEECH
+NIGHT = events.NIGHT
+END = events.END
+
+DAY = events.DAY
+CRASH = events.CRASH
+DEAD = events.DEAD
+
+Event = namedtuple('Event', 'kind lap section index player data')
+VotingResult = namedtuple('VotingResult', 'leaders eliminated')
+
+
+def resolve_voting(votes, alive, both=None, single_stays=False):
+    """Resolves one voting.
+
+    @votes is list of (nominee, BitSet of hands), @alive is BitSet of
+    alive players, @both is BitSet of hands for elimination of all
+    leaders or None. If @single_stays is true, the only nominee is not
+    eliminated (first day rule).
+
+        >>> from util.bitset import BitSet
+        >>> alive = BitSet(range(1, 11))
+        >>> votes = [(4, BitSet([6, 7, 8, 9, 10])), (9, BitSet([1, 2, 3, 4, 5]))]
+        >>> resolve_voting(votes, alive)
+        VotingResult(leaders=(4, 9), eliminated=())
+        >>> resolve_voting(votes, alive, both=BitSet(range(1, 7)))
+        VotingResult(leaders=(4, 9), eliminated=(4, 9))
+        >>> resolve_voting(votes, alive - BitSet([10]))
+        VotingResult(leaders=(9,), eliminated=(9,))
+
+    :returns: VotingResult with leaders (nominees with most hands) and
+    eliminated players.
+    """
+    counts = [(nominee, len(hands & alive)) for nominee, hands in votes]
+    if not counts:
+        return VotingResult((), ())
+    most = max(count for _, count in counts)
+    leaders = tuple(nominee for nominee, count in counts if count == most)
+    if both is not None:
+        majority = len(both & alive) * 2 > len(alive)
+        return VotingResult(leaders, leaders if majority else ())
+    if len(leaders) == 1 and not (single_stays and len(counts) == 1):
+        return VotingResult(leaders, leaders)
+    return VotingResult(leaders, ())
+
+
+class ReplayEngine(object):
+    """Applies game events to GameState and notifies observers."""
+    def __init__(self, callback=None):
+        self._interpretor = interp.GameInterpretor(
+                callback or interp.SpeechCallback())
+        self._observers = []
+        self._lap = 0
+
+    @property
+    def state(self):
+        return self._interpretor.state
+
+    @property
+    def lap(self):
+        return self._lap
+
+    def __getstate__(self):
+        # Observers are not pickled, their owners subscribe again.
+        state = self.__dict__.copy()
+        state['_observers'] = []
+        return state
+
+    def subscribe(self, observer):
+        """Calls @observer(event) after every applied event."""
+        self._observers.append(observer)
+
+    def unsubscribe(self, observer):
+        self._observers.remove(observer)
+
+    def _emit(self, kind, section=None, index=None, player=None, data=None):
+        event = Event(kind, self._lap, section, index, player, data)
+        for observer in self._observers:
+            observer(event)
+
+    def start_lap(self):
+        self._lap += 1
+        self.state.nominated = []
+        self._emit(LAP)
+
+    def action(self, player, action, section=DAY, index=None):
+        self._interpretor.interp(player, action)
+        self._emit(ACTION, section, index, player, action)
+
+    def speech(self, player, speech, section=DAY, index=None):
+        """Applies all actions of @speech (PlayerSpeech or str)."""
+        if not hasattr(speech, 'actions'):
+            speech = maf_game.PlayerSpeech.from_str(speech)
+        for action in speech.actions:
+            self.action(player, action, section, index)
+
+    def kill(self, player, reason, section=None, index=None):
+        """:raises: KeyError if @player is not alive."""
+        self._interpretor.kill(player)
+        self._emit(KILL, section, index, player, reason)
+
+    def voting(self, votes, both=None, index=None):
+        """Resolves voting of (nominee, BitSet of hands) @votes and kills
+        eliminated players.
+
+        :returns: VotingResult.
+        """
+        alive = self.state.alive_set
+        for nominee, hands in votes:
+            self._emit(VOTE, VOTING, index, nominee, hands & alive)
+        result = resolve_voting(votes, alive, both,
+                                single_stays=self._lap == 1)
+        self._emit(VOTING, VOTING, index, data=result)
+        for player in result.eliminated:
+            self.kill(player, VOTING, VOTING, index)
+        if result.eliminated:
+            self.state.nominated = []
+        return result
+
+    def night(self, actions):
+        """Applies @actions dict (shot, don and sheriff targets)."""
+        for name in events.NIGHT_ACTIONS:
+            if actions.get(name):
+                self.night_action(name, actions[name])
+
+    def night_action(self, name, target):
+        self._emit(NIGHT, NIGHT, player=target, data=name)
+        if name == 'shot':
+            if target in self.state.alive:
+                self.kill(target, name, NIGHT)
+            else:
+                logging.warning("Shot player {0} is not alive"
+                                .format(target))
+
+    def end(self, winner):
+        self._emit(END, data=winner)
+
+    def steps(self, game):
+        """Applies events of @game one by one, yields after every action,
+        voting, kill after voting and night action."""
+        votes = []
+        both = None
+        for event in events.iter_events(game):
+            kind = event.kind
+            if kind == ACTION:
+                data = event.target if event.data is None else event.data
+                self.action(event.actor, (event.code, data), event.section,
+                            event.index)
+            elif kind == VOTE:
+                if event.actor == maf_game.Voting.BOTH:
+                    both = event.data
+                else:
+                    votes.append((event.actor, event.data))
+                continue
+            elif kind == VOTING:
+                self.voting(votes, both, event.index)
+                votes = []
+                both = None
+            elif kind == SPEECH:
+                if event.section != DEAD or event.actor not in self.state.alive:
+                    continue
+                # Log is the truth when votes resolution disagrees.
+                self.kill(event.actor, VOTING, DEAD, event.index)
+            elif kind == NIGHT:
+                self.night_action(event.code, event.target)
+            elif kind == LAP:
+                self.start_lap()
+                continue
+            elif kind == END:
+                self.end(event.data)
+                continue
+            yield
+
+    def replay(self, game):
+        """Applies all events of @game in one pass."""
+        for _ in self.steps(game):
+            pass
+
+    def events(self, game):
+        """Yields Event of every applied event of @game right after it
+        is applied, so `state` is the state after event."""
+        pending = deque()
+        self.subscribe(pending.append)
+        try:
+            for _ in self.steps(game):
+                while pending:
+                    yield pending.popleft()
+            while pending:
+                yield pending.popleft()
+        finally:
+            self.unsubscribe(pending.append)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Export of games into SQLite database for ad-hoc SQL queries.
+
+Games are stored in normalised schema (see `SCHEMA`), every game is
+keyed by hash of its content, so export of the same games again adds
+only new and changed games:
+    >>> import maf
+    >>> lap = {
+    ...     'day': [{1: 'n4 +2'}, {4: '-1 (1 3 | -2)'}],
+    ...     'voting': [{'votes': [{4: '1-3'}, {'both': 0}],
+    ...                 'crash': [{4: 'n1'}]}],
+    ...     'night': {'shot': 5, 'sheriff': 1}}
+    >>> g = maf.MafGame.from_yaml({
+    ...     'club': 'showtime', 'players': ['Alice', 'Bob'],
+    ...     'roles': {'don': 1, 'maf': '2 3', 'sheriff': 4},
+    ...     'laps': [lap, {'end': 'red'}]})
+    >>> conn = connect(':memory:')
+    >>> sorted(export_games(conn, [g]).items())
+    [('added', 1), ('removed', 0), ('skipped', 0)]
+    >>> sorted(export_games(conn, [g]).items())
+    [('added', 0), ('removed', 0), ('skipped', 1)]
+
+Now tables can be queried:
+    >>> conn.execute('''
+    ...     SELECT s.player, a.action, a.target, a.payload
+    ...     FROM speeches s JOIN actions a ON a.speech_id = s.id
+    ...     WHERE s.section = 'day' ORDER BY s.id, a.num''').fetchall()
+    [(1, u'n', 4, None), (1, u'+', 2, None), (4, u'-', 1, None), (4, u's', None, u'((1, 3), -2)')]
+    >>> conn.execute('''
+    ...     SELECT nominee, count(*) FROM votes GROUP BY nominee''').fetchall()
+    [(4, 3)]
+    >>> conn.execute('''
+    ...     SELECT r.role FROM roles r JOIN night n
+    ...     ON n.game_id = r.game_id AND n.target = r.player
+    ...     WHERE n.action = 'sheriff' ''').fetchall()
+    [(u'don',)]
+
+Games missing in new export are removed with @prune:
+    >>> sorted(export_games(conn, [], prune=True).items())
+    [('added', 0), ('removed', 1), ('skipped', 0)]
+    >>> conn.execute('SELECT count(*) FROM actions').fetchone()
+    (0,)
+"""
+
+import hashlib
+import logging
+import sqlite3
+
+import events
+import game as maf_game
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL UNIQUE,
+    date TEXT,
+    club TEXT,
+    locality TEXT,
+    winner TEXT
+);
+CREATE TABLE IF NOT EXISTS players (
+    game_id INTEGER NOT NULL REFERENCES games(id) ON DELETE CASCADE,
+    player INTEGER NOT NULL,
+    name TEXT
+);
+CREATE TABLE IF NOT EXISTS roles (
+    game_id INTEGER NOT NULL REFERENCES games(id) ON DELETE CASCADE,
+    player INTEGER NOT NULL,
+    role TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS laps (
+    game_id INTEGER NOT NULL REFERENCES games(id) ON DELETE CASCADE,
+    lap INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS speeches (
+    id INTEGER PRIMARY KEY,
+    game_id INTEGER NOT NULL REFERENCES games(id) ON DELETE CASCADE,
+    lap INTEGER NOT NULL,
+    section TEXT NOT NULL,
+    voting INTEGER,
+    num INTEGER NOT NULL,
+    player INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS actions (
+    speech_id INTEGER NOT NULL REFERENCES speeches(id) ON DELETE CASCADE,
+    num INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    target INTEGER,
+    payload TEXT
+);
+CREATE TABLE IF NOT EXISTS votes (
+    game_id INTEGER NOT NULL REFERENCES games(id) ON DELETE CASCADE,
+    lap INTEGER NOT NULL,
+    voting INTEGER NOT NULL,
+    nominee INTEGER NOT NULL,
+    voter INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS night (
+    game_id INTEGER NOT NULL REFERENCES games(id) ON DELETE CASCADE,
+    lap INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    target INTEGER
+);
+CREATE INDEX IF NOT EXISTS games_club ON games(club);
+CREATE INDEX IF NOT EXISTS games_date ON games(date);
+CREATE INDEX IF NOT EXISTS players_name ON players(name);
+CREATE INDEX IF NOT EXISTS players_game ON players(game_id);
+CREATE INDEX IF NOT EXISTS roles_game ON roles(game_id, player);
+CREATE INDEX IF NOT EXISTS laps_game ON laps(game_id);
+CREATE INDEX IF NOT EXISTS speeches_game ON speeches(game_id, lap);
+CREATE INDEX IF NOT EXISTS actions_speech ON actions(speech_id);
+CREATE INDEX IF NOT EXISTS actions_action ON actions(action, target);
+CREATE INDEX IF NOT EXISTS votes_game ON votes(game_id, lap);
+CREATE INDEX IF NOT EXISTS night_game ON night(game_id, lap);
+"""
+
+ROLES = ('don', 'maf', 'sheriff')
+TABLES = ('games', 'players', 'roles', 'laps', 'speeches', 'actions', 'votes',
+          'night')
+
+
+def connect(path):
+    """:returns: sqlite3 connection to database @path with schema."""
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA foreign_keys = ON')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _text(value):
+    if value is None or isinstance(value, unicode):
+        return value
+    return str(value).decode('utf-8')
+
+
+def _speeches(game):
+    """Yields (lap, section, voting, num, player, actions) of @game,
+    actions are list of (action, data)."""
+    for speech, num, acts in events.iter_speeches(game):
+        voting = speech.index if speech.section == events.CRASH else None
+        yield (speech.lap, speech.section, voting, num, speech.actor,
+               [(a.code, a.target if a.data is None else a.data)
+                for a in acts])
+
+
+def game_key(game):
+    """:returns: hex sha1 of @game content."""
+    content = (
+        str(game.date), game.club, game.locality, game.end,
+        list(game.players), sorted(game.roles.items()),
+        [(s[:-1], s[-1]) for s in _speeches(game)],
+        [[v.votes for v in lap.votings] for lap in game.laps],
+        [sorted(lap.night.items()) for lap in game.laps],
+    )
+    return hashlib.sha1(repr(content)).hexdigest()
+
+
+class _Rows(object):
+    """Rows of all tables collected for bulk insert."""
+    def __init__(self, game_id, speech_id):
+        self.game_id = game_id
+        self.speech_id = speech_id
+        self.tables = dict((name, []) for name in TABLES)
+
+    def add(self, key, game):
+        game_id = self.game_id
+        self.game_id += 1
+        t = self.tables
+        t['games'].append((game_id, key, _text(game.date), _text(game.club),
+                           _text(game.locality), _text(game.end)))
+        t['players'].extend((game_id, num + 1, _text(name))
+                            for num, name in enumerate(game.players))
+        for role in ROLES:
+            t['roles'].extend((game_id, p, role)
+                              for p in maf_game.role_players(game.roles, role))
+        for lap_num, lap in enumerate(game.laps):
+            t['laps'].append((game_id, lap_num + 1))
+            for voting_num, voting in enumerate(lap.votings):
+                t['votes'].extend(
+                    (game_id, lap_num + 1, voting_num + 1, nominee, voter)
+                    for nominee, hands in voting.votes for voter in hands)
+            t['night'].extend((game_id, lap_num + 1, action, target)
+                              for action, target in sorted(lap.night.items()))
+        for lap, section, voting, num, player, acts in _speeches(game):
+            speech_id = self.speech_id
+            self.speech_id += 1
+            t['speeches'].append((speech_id, game_id, lap, section, voting,
+                                  num, player))
+            for action_num, (action, data) in enumerate(acts):
+                if isinstance(data, int):
+                    t['actions'].append((speech_id, action_num + 1, action,
+                                         data, None))
+                else:
+                    t['actions'].append((speech_id, action_num + 1, action,
+                                         None, repr(data)))
+
+
+def export_games(conn, games, prune=False):
+    """Exports @games into database of @conn in one transaction.
+
+    Games already present in database (by `game_key`) are skipped. If
+    @prune is true, games missing in @games are removed from database.
+    :returns: dict with numbers of added, skipped and removed games.
+    """
+    existing = dict(conn.execute('SELECT hash, id FROM games'))
+    game_id, speech_id = conn.execute(
+        'SELECT (SELECT ifnull(max(id), 0) FROM games), '
+        '(SELECT ifnull(max(id), 0) FROM speeches)').fetchone()
+    rows = _Rows(game_id + 1, speech_id + 1)
+    seen = set()
+    skipped = 0
+    for g in games:
+        key = game_key(g)
+        if key in existing or key in seen:
+            skipped += 1
+        else:
+            rows.add(key, g)
+        seen.add(key)
+    removed = [(existing[key],) for key in existing if key not in seen] \
+              if prune else []
+
+    with conn:
+        conn.executemany('DELETE FROM games WHERE id = ?', removed)
+        for name in TABLES:
+            table = rows.tables[name]
+            if table:
+                conn.executemany(
+                    'INSERT INTO {0} VALUES ({1})'.format(
+                        name, ', '.join('?' * len(table[0]))),
+                    table)
+    if removed or rows.tables['games']:
+        # Statistics let planner choose selective index for joins.
+        conn.execute('ANALYZE')
+    added = len(rows.tables['games'])
+    logging.info("Exported {0} games, skipped {1}, removed {2}"
+                 .format(added, skipped, len(removed)))
+    return {'added': added, 'skipped': skipped, 'removed': len(removed)}
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+"""Fitting of SpeechCallback coefficient against known roles.
+
+`BatchSpeechCallback` keeps positions for many coefficients at once as
+(coeffs x n x n) array, so one replay of the game gives final positions
+for every coefficient. Slice of batch is equal to the replay with plain
+`SpeechCallback`:
+    >>> import maf
+    >>> lap = maf.GameLap.from_dict({
+    ...     'day': [{1: '+2 -3'}, {2: '+1 (3 4 | -1)'}, {3: '-1 -2'}],
+    ...     'voting': [{3: '1 2'}]})
+    >>> game = maf.MafGame(laps=[lap], roles={'don': 3, 'maf': '4 5'},
+    ...                    end='red')
+    >>> callback = BatchSpeechCallback([0.3, 0.6])
+    >>> maf.replay.ReplayEngine(callback).replay(game)
+    >>> engine = maf.replay.ReplayEngine(maf.interp.SpeechCallback(0.6))
+    >>> engine.replay(game)
+    >>> numpy.allclose(callback.positions[1], engine.state.position)
+    True
+
+Repeated targets are applied for every repeat like in SpeechCallback:
+    >>> state = maf.interp.GameState()
+    >>> single = BatchSpeechCallback([0.6])
+    >>> _ = single(maf.actions.NOT_PLAY, 1, [2, 2], state)
+    >>> single.positions[0, 0, 1].round(3)
+    0.08
+
+Final position row is player opinion about others: 1 is the same team
+and 0 is the other team. Every opinion is scored against teams known
+from roles of finished games by squared error, accuracy is one minus
+mean squared error (Brier score), so untouched opinions of 0.5 do not
+favour any coefficient:
+    >>> errors, total = score_positions(callback.positions, game.roles)
+    >>> errors.round(3), total
+    (array([21.724, 21.195]), 90)
+    >>> result = sweep_games([game, game], numpy.linspace(0., 1., 5))
+    >>> result.accuracy.round(3)
+    array([0.75 , 0.757, 0.763, 0.766, 0.768])
+    >>> result.best, result.games
+    (1.0, 2)
+"""
+
+import logging
+import multiprocessing
+import numpy
+
+from collections import namedtuple
+
+import game as maf_game
+import interp
+import replay
+import util.pool
+
+BLACK_ROLES = ('maf', 'don')
+DEFAULT_COEFFS = numpy.linspace(0., 1., 201)
+
+SweepResult = namedtuple('SweepResult', 'coeffs accuracy best games')
+
+
+class BatchSpeechCallback(interp.SpeechCallback):
+    """SpeechCallback applying every action for all @coeffs at once.
+
+    Positions of GameState are not changed, batch is available as
+    `positions` array. Nominations are applied to GameState as usual.
+    """
+    def __init__(self, coeffs, players=10):
+        super(BatchSpeechCallback, self).__init__(
+                numpy.array(coeffs, dtype=float)[:, numpy.newaxis])
+        self._positions = numpy.full((len(coeffs), players, players), 0.5)
+        self._positions[:, numpy.arange(players), numpy.arange(players)] = 1.
+
+    @property
+    def positions(self):
+        return self._positions
+
+    def _play(self, player_num, players, state):
+        rows = self._positions[:, player_num - 1]
+        for targets in self._target_passes(state, players):
+            rows[:, targets] = self._update_position(rows[:, targets])
+        return state
+
+    def _not_play(self, player_num, players, state):
+        rows = self._positions[:, player_num - 1]
+        for targets in self._target_passes(state, players):
+            rows[:, targets] = 1 - self._update_position(1 - rows[:, targets])
+        return state
+
+
+def team_matrix(roles, players=10):
+    """:returns: (n x n) bool matrix, true if players of row and column
+    are in the same team according to @roles dict of game."""
+    black = numpy.zeros(players, dtype=bool)
+    for role in BLACK_ROLES:
+        for player in maf_game.role_players(roles, role):
+            black[player - 1] = True
+    return black[:, numpy.newaxis] == black[numpy.newaxis, :]
+
+
+def score_positions(positions, roles):
+    """Scores (... x n x n) @positions against @roles of game.
+
+    :returns: (errors, total) where errors is array of sums of squared
+    errors of opinions for every leading index of @positions and total
+    is number of scored opinions (diagonal is skipped).
+    """
+    players = positions.shape[-1]
+    same = team_matrix(roles, players)
+    scored = ~numpy.eye(players, dtype=bool)
+    errors = numpy.where(scored, (positions - same) ** 2, 0.)
+    return errors.sum(axis=(-2, -1)), int(scored.sum())
+
+
+def sweep_game(game, coeffs=DEFAULT_COEFFS):
+    """Replays @game once for all @coeffs.
+
+    :returns: (errors, total) of `score_positions` or None if @game is
+    not finished or has no roles.
+    """
+    if game.end not in ('red', 'black') or not game.roles:
+        return None
+    callback = BatchSpeechCallback(coeffs)
+    replay.ReplayEngine(callback).replay(game)
+    return score_positions(callback.positions, game.roles)
+
+
+def _sweep_task(args):
+    return sweep_game(*args)
+
+
+def sweep_games(games, coeffs=DEFAULT_COEFFS, jobs=1):
+    """Sweeps @coeffs over all @games, games are replayed by pool of
+    @jobs processes if @jobs is not 1.
+
+    :returns: SweepResult with accuracy of every coefficient, coefficient
+    with best accuracy and number of scored games.
+    """
+    coeffs = numpy.asarray(coeffs, dtype=float)
+    tasks = ((g, coeffs) for g in games)
+    pool = None
+    if jobs == 1:
+        results = (_sweep_task(t) for t in tasks)
+    else:
+        pool = multiprocessing.Pool(jobs)
+        results = util.pool.ordered_imap(pool, _sweep_task, tasks)
+    errors = numpy.zeros(len(coeffs))
+    total = scored = 0
+    try:
+        for result in results:
+            if result is None:
+                continue
+            errors += result[0]
+            total += result[1]
+            scored += 1
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    if not total:
+        logging.warning("No finished games with roles to score")
+        accuracy = numpy.zeros(len(coeffs))
+    else:
+        accuracy = 1. - errors / total
+    best = float(coeffs[numpy.argmax(accuracy)]) if len(coeffs) else None
+    return SweepResult(coeffs, accuracy, best, scored)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
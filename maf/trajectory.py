@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+"""Recorded game trajectory with random access to any game moment.
+
+Replay of the game is recorded into preallocated arrays. Every step
+changes at most one position row, so trajectory stores full position
+matrices only at checkpoints and changed rows for other steps:
+    >>> import maf
+    >>> lap = maf.GameLap.from_dict({'day': [{1: '+2 -3'}, {2: 'n1 +1'}]})
+    >>> traj = record_game(maf.MafGame(laps=[lap]), checkpoint_every=2)
+    >>> len(traj)
+    5
+    >>> traj.index(1, 1, 2)
+    2
+    >>> traj.position(2)[0][:3]
+    array([1. , 0.8, 0.2])
+    >>> traj[1, 2, 2][1][:3]
+    array([0.8, 1. , 0.5])
+    >>> traj.moment(4)
+    (1, 2, 2)
+    >>> traj.alive(4) == traj.alive(0)
+    True
+    >>> list(traj.alive(4))[:3]
+    [1, 2, 3]
+
+Whole trajectory can be materialized as (steps x n x n) array:
+    >>> traj.positions().shape
+    (5, 10, 10)
+"""
+
+import bisect
+import numpy
+
+import events
+import interp
+from util.bitset import BitSet
+
+
+class Trajectory(object):
+    """Positions, alive players and (lap, speech, action) index of every
+    replay step."""
+    def __init__(self, steps, players, checkpoint_every=16):
+        self._size = 0
+        self._players = players
+        self._checkpoint_every = checkpoint_every
+        self._checkpoints = numpy.empty(
+                (steps // checkpoint_every + 1, players, players))
+        self._checkpoint_steps = []
+        self._delta_rows = numpy.full(steps, -1, dtype=numpy.int16)
+        self._delta_values = numpy.empty((steps, players))
+        self._alive = numpy.zeros(steps, dtype=numpy.uint64)
+        self._moments = numpy.zeros((steps, 3), dtype=numpy.int32)
+        self._index = {}
+
+    def __len__(self):
+        return self._size
+
+    def _add_checkpoint(self, position):
+        num = len(self._checkpoint_steps)
+        if num == len(self._checkpoints):
+            self._checkpoints = numpy.resize(
+                    self._checkpoints,
+                    (2 * num, self._players, self._players))
+        self._checkpoints[num] = position
+        self._checkpoint_steps.append(self._size)
+
+    def append(self, moment, state, changed_rows):
+        """Records @state at @moment (lap, speech, action). @changed_rows
+        are rows of position changed since previous step."""
+        step = self._size
+        last = self._checkpoint_steps[-1] if self._checkpoint_steps else None
+        if last is None or len(changed_rows) > 1 \
+           or step - last >= self._checkpoint_every:
+            self._add_checkpoint(state.position)
+        elif changed_rows:
+            row = changed_rows[0]
+            self._delta_rows[step] = row
+            self._delta_values[step] = state.position[row]
+        self._alive[step] = long(state.alive_set)
+        self._moments[step] = moment
+        self._index.setdefault(tuple(moment), step)
+        self._size += 1
+
+    def index(self, lap, speech, action):
+        """:returns: step number of (@lap, @speech, @action) moment."""
+        return self._index[(lap, speech, action)]
+
+    def moment(self, step):
+        """:returns: (lap, speech, action) of @step."""
+        return tuple(int(x) for x in self._moments[step])
+
+    def position(self, step):
+        """:returns: copy of position matrix at @step."""
+        if not 0 <= step < self._size:
+            raise IndexError("No step {0} in trajectory".format(step))
+        num = bisect.bisect_right(self._checkpoint_steps, step) - 1
+        result = self._checkpoints[num].copy()
+        for cur in xrange(self._checkpoint_steps[num] + 1, step + 1):
+            row = self._delta_rows[cur]
+            if row >= 0:
+                result[row] = self._delta_values[cur]
+        return result
+
+    def alive(self, step):
+        """:returns: BitSet of alive players numbers at @step."""
+        return BitSet.from_mask(long(self._alive[step]))
+
+    def __getitem__(self, moment):
+        """:returns: position matrix at (lap, speech, action) @moment."""
+        return self.position(self.index(*moment))
+
+    def positions(self):
+        """:returns: array of position matrices of all steps."""
+        result = numpy.empty((self._size, self._players, self._players))
+        for step in xrange(self._size):
+            num = bisect.bisect_right(self._checkpoint_steps, step) - 1
+            if self._checkpoint_steps[num] == step:
+                result[step] = self._checkpoints[num]
+            else:
+                result[step] = result[step - 1]
+                row = self._delta_rows[step]
+                if row >= 0:
+                    result[step, row] = self._delta_values[step]
+        return result
+
+
+def _count_steps(game):
+    day_actions = events.select(events.iter_events(game),
+                                kind=events.ACTION, section=events.DAY)
+    return 1 + sum(1 for _ in day_actions)
+
+
+def record_game(game, checkpoint_every=16):
+    """:returns: Trajectory of `interp.interp_game` replay of @game."""
+    trajectory = None
+    changed = []
+    last = None
+    for now, state in interp.interp_game(game):
+        if trajectory is None:
+            trajectory = Trajectory(_count_steps(game), len(state.position),
+                                    checkpoint_every)
+            state.subscribe(changed.append)
+        key = (now['lap'], now['speech'])
+        if key == last:
+            action += 1
+        else:
+            action = 1 if key != (0, 0) else 0
+            last = key
+        trajectory.append(key + (action,), state, sorted(set(changed)))
+        del changed[:]
+    return trajectory
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,368 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Validation of game logs which reports every error at once.
+
+Every speech, voting, role entry and end marker of every game is checked
+and all problems are collected with their location:
+    >>> log = '''
+    ... - game:
+    ...     roles: {don: 1, maf: 3 4, sheriff: 4}
+    ...     laps:
+    ...       - day:
+    ...         - 1: +2 (3
+    ...         - 2: -1
+    ...         voting:
+    ...           - votes:
+    ...             - 1: 2 x3
+    ...       - end: green
+    ... '''
+    >>> for d in validate_block(('games.yaml', 1, log)):
+    ...     print format_diagnostic(d)
+    games.yaml: game 1: roles: player 4 has several roles
+    games.yaml: game 1, lap 1, day, player 1: Error while parsing string.
+        +2 (3
+             ^
+    games.yaml: game 1, lap 1, voting 1, player 1: Can't parse next voting:
+        2 x3
+          ^
+    games.yaml: game 1: end: unknown winner 'green'
+
+Files which are not lists of games are reported as a whole:
+    >>> import tempfile
+    >>> def check_file(text):
+    ...     path = os.path.join(tempfile.mkdtemp(), 'games.yaml')
+    ...     with open(path, 'w') as f:
+    ...         f.write(text)
+    ...     for diagnostics in validate([path], jobs=1):
+    ...         for d in diagnostics:
+    ...             print format_diagnostic(d).replace(path, 'games.yaml')
+    >>> check_file('# Showtime\\ngame:\\n  laps: []\\n')
+    games.yaml, line 2: top-level yaml object must be a list
+        game:
+        ^
+    >>> check_file('# no games yet\\n')
+    games.yaml: no games found
+"""
+
+import multiprocessing
+import os
+
+from collections import namedtuple
+from StringIO import StringIO
+
+import yaml
+
+import corpus
+import events
+import game as maf_game
+import util.collection as CU
+import util.pool
+import util.strings as SU
+import util.yamlstream
+
+# Game is None for diagnostics of whole file, line is its line number.
+Diagnostic = namedtuple('Diagnostic', 'file game lap section player '
+                                      'message text offset line')
+
+ROLES = {'don': 1, 'maf': 2, 'sheriff': 1}
+LAP_SECTIONS = ('day', 'voting', 'night', 'dead')
+WINNERS = ('red', 'black')
+
+
+def format_diagnostic(d):
+    """:returns: human readable diagnostic with caret under error."""
+    location = '{0}: game {1}'.format(d.file, d.game)
+    if d.game is None:
+        location = d.file
+        if d.line is not None:
+            location += ', line {0}'.format(d.line)
+        location += ': '
+    elif d.lap is not None:
+        location += ', lap {0}'.format(d.lap)
+        if d.section is not None:
+            location += ', {0}'.format(d.section)
+        if d.player is not None:
+            location += ', player {0}'.format(d.player)
+        location += ': '
+    elif d.section is not None:
+        location += ': {0}: '.format(d.section)
+    else:
+        location += ': '
+    result = location + d.message
+    if d.text is not None:
+        result += '\n    ' + d.text
+        if d.offset is not None:
+            result += '\n    ' + ' ' * d.offset + '^'
+    return result
+
+
+class GameChecker(object):
+    """Collects diagnostics of one parsed yaml game dict."""
+    def __init__(self, filename, num, players=10):
+        self._file = filename
+        self._num = num
+        self._players = players
+        self.diagnostics = []
+
+    def error(self, message, lap=None, section=None, player=None,
+              text=None, offset=None):
+        self.diagnostics.append(Diagnostic(self._file, self._num, lap,
+                                           section, player, message,
+                                           text, offset, None))
+
+    def _syntax_error(self, e, **location):
+        self.error(str(e).splitlines()[0].replace(
+                       ' See information below.', ''),
+                   text=getattr(e, 'text', None),
+                   offset=getattr(e, 'offset', None), **location)
+
+    def _player_numbers(self, value):
+        """:returns: list of players numbers from @value or None."""
+        try:
+            numbers = [int(x) for x in str(value).replace(',', ' ').split()]
+        except ValueError:
+            return None
+        if not numbers or \
+           any(not 0 < n <= self._players for n in numbers):
+            return None
+        return numbers
+
+    def check(self, g):
+        if not isinstance(g, dict):
+            self.error("game must be a mapping")
+            return
+        self.check_roles(g.get('roles'))
+        laps = g.get('laps')
+        if not isinstance(laps, list) or not laps:
+            self.error("no laps", section='laps')
+            return
+        for num, lap in enumerate(laps[:-1]):
+            self.check_lap(num + 1, lap)
+        self.check_end(laps[-1])
+        if not self.diagnostics:
+            try:
+                maf_game.MafGame.from_yaml(g)
+            except Exception as e:
+                self.error("game can't be loaded: {0}".format(e))
+
+    def check_roles(self, roles):
+        if not isinstance(roles, dict):
+            self.error("roles are missing", section='roles')
+            return
+        seen = set()
+        for role, count in sorted(ROLES.items()):
+            if role not in roles:
+                self.error("no {0} role".format(role), section='roles')
+                continue
+            numbers = self._player_numbers(roles[role])
+            if numbers is None:
+                self.error("wrong {0} players: {1}".format(role, roles[role]),
+                           section='roles')
+                continue
+            if len(numbers) != count:
+                self.error("{0} must have {1} players, not {2}"
+                           .format(role, count, len(numbers)),
+                           section='roles')
+            for n in numbers:
+                if n in seen:
+                    self.error("player {0} has several roles".format(n),
+                               section='roles')
+                seen.add(n)
+        for role in sorted(set(roles) - set(ROLES)):
+            self.error("unknown role {0}".format(role), section='roles')
+
+    def check_end(self, lap):
+        if not isinstance(lap, dict) or 'end' not in lap:
+            self.error("last lap must be end marker", section='end')
+            return
+        winner = lap['end']
+        if not isinstance(winner, basestring) \
+           or winner.lower() not in WINNERS:
+            self.error("unknown winner {0!r}".format(winner), section='end')
+
+    def check_lap(self, lap_num, lap):
+        if not isinstance(lap, dict):
+            self.error("lap must be a mapping", lap=lap_num)
+            return
+        for section in sorted(set(lap) - set(LAP_SECTIONS)):
+            self.error("unknown lap section {0}".format(section), lap=lap_num)
+        for item in lap.get('day') or []:
+            self.check_speech(item, lap=lap_num, section='day')
+        for item in lap.get('dead') or []:
+            self.check_speech(item, lap=lap_num, section='dead')
+        self.check_votings(lap.get('voting') or [], lap_num)
+        self.check_night(lap.get('night') or {}, lap_num)
+
+    def _undict(self, item, **location):
+        try:
+            pair = CU.undict(item) if isinstance(item, dict) else None
+        except TypeError:
+            pair = None
+        if pair is None:
+            self.error("expected one 'player: value' pair, got {0!r}"
+                       .format(item), **location)
+        return pair
+
+    def check_speech(self, item, **location):
+        pair = self._undict(item, **location)
+        if pair is None:
+            return
+        player, speech = pair
+        location['player'] = player
+        if self._player_numbers(player) is None \
+           or not isinstance(player, int):
+            self.error("wrong player number", **location)
+            return
+        try:
+            maf_game.PlayerSpeech.from_str(speech)
+        except SyntaxError as e:
+            self._syntax_error(e, **location)
+        except Exception as e:
+            self.error("wrong speech {0!r}: {1}".format(speech, e),
+                       **location)
+
+    def check_votings(self, votings, lap_num):
+        if not isinstance(votings, list):
+            self.error("voting must be a list", lap=lap_num,
+                       section='voting')
+            return
+        if votings and isinstance(votings[0], dict) \
+           and 'votes' not in votings[0]:
+            votings = [{'votes': votings}]
+        for num, voting in enumerate(votings):
+            section = 'voting {0}'.format(num + 1)
+            if not isinstance(voting, dict) or 'votes' not in voting:
+                self.error("voting must contain votes", lap=lap_num,
+                           section=section)
+                continue
+            for item in voting['votes'] or []:
+                self.check_vote(item, lap=lap_num, section=section)
+            for item in voting.get('crash') or []:
+                self.check_speech(item, lap=lap_num,
+                                  section=section + ' crash')
+
+    def check_vote(self, item, **location):
+        pair = self._undict(item, **location)
+        if pair is None:
+            return
+        players, hands = pair
+        location['player'] = players
+        if not SU.ci_equals(players, 'both') \
+           and self._player_numbers(players) is None:
+            self.error("wrong nominated players", **location)
+        try:
+            maf_game.parse_hands(hands)
+        except SyntaxError as e:
+            self._syntax_error(e, **location)
+        except Exception as e:
+            self.error("wrong votes {0!r}: {1}".format(hands, e), **location)
+
+    def check_night(self, night, lap_num):
+        if not isinstance(night, dict):
+            self.error("night must be a mapping", lap=lap_num,
+                       section='night')
+            return
+        for action, player in sorted(night.items()):
+            if action not in events.NIGHT_ACTIONS:
+                self.error("unknown night action {0}".format(action),
+                           lap=lap_num, section='night')
+            elif not isinstance(player, int) \
+                 or not 0 <= player <= self._players:
+                self.error("wrong {0} target {1!r}".format(action, player),
+                           lap=lap_num, section='night')
+
+
+def validate_block(task):
+    """Validates yaml source text of one game.
+
+    @task is (file name, game number, block text) tuple, or (file name,
+    None, (message, mark, line text)) for problem of whole file.
+    :returns: list of Diagnostic.
+    """
+    filename, num, block = task
+    if num is None:
+        message, mark, text = block
+        return [Diagnostic(filename, None, None, None, None, message, text,
+                           mark.column if mark is not None else None,
+                           mark.line + 1 if mark is not None else None)]
+    checker = GameChecker(filename, num)
+    try:
+        item = util.yamlstream.iter_items(StringIO(block)).next()
+    except yaml.YAMLError as e:
+        mark = getattr(e, 'problem_mark', None)
+        checker.error("yaml error: {0}".format(
+                          getattr(e, 'problem', None) or e),
+                      text=block.splitlines()[mark.line].rstrip()
+                           if mark is not None else None,
+                      offset=mark.column if mark is not None else None)
+        return checker.diagnostics
+    if not isinstance(item, dict) or 'game' not in item:
+        checker.error("item must be 'game' mapping")
+        return checker.diagnostics
+    checker.check(item['game'])
+    return checker.diagnostics
+
+
+def log_files(paths):
+    """Yields yaml log files from list of files and corpus directories."""
+    for path in paths:
+        if os.path.isdir(path):
+            for relpath in corpus.Corpus(path).scan():
+                yield os.path.join(path, relpath)
+        else:
+            yield path
+
+
+def _file_problem(filename, message, mark=None):
+    text = None
+    if mark is not None:
+        with open(filename, 'rb') as f:
+            for num, line in enumerate(f):
+                if num == mark.line:
+                    text = line.rstrip()
+                    break
+    return filename, None, (message, mark, text)
+
+
+def _tasks(paths):
+    for filename in log_files(paths):
+        count = 0
+        with open(filename, 'rb') as f:
+            try:
+                for block in util.yamlstream.iter_blocks(f):
+                    count += 1
+                    yield filename, count, block
+            except util.yamlstream.StructureError as e:
+                message = str(e).rstrip('.')
+                yield _file_problem(filename, message[:1].lower() + message[1:],
+                                    e.mark)
+                continue
+            except yaml.YAMLError as e:
+                yield _file_problem(filename, "yaml error: {0}".format(
+                                        getattr(e, 'problem', None) or e),
+                                    getattr(e, 'problem_mark', None))
+                continue
+        if not count:
+            yield _file_problem(filename, "no games found")
+
+
+def validate(paths, jobs=None):
+    """Validates every game of files and corpus directories @paths with
+    pool of @jobs processes.
+
+    Yields lists of diagnostics of every game in corpus order.
+    """
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for diagnostics in util.pool.ordered_imap(pool, validate_block,
+                                                  _tasks(paths)):
+            yield diagnostics
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
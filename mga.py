@@ -2,84 +2,148 @@
 """Console application for logging and analizing maf game."""
 
 import argparse
+import datetime
 import textwrap
 import logging
 import cmd2 as cmd
 import sys
+import time
+import yaml
 
 from collections import deque
+from StringIO import StringIO
 
 import maf
+import maf.inference
+import maf.metric
+import maf.validate
+import util.journal
 
 VERSION = 0.1
-
-class MafGameAnalizerApp(cmd.Cmd):
-    multilineCommands = ['sp', 'spe', 'spee', 'speec', 'speech']
-    prompt = '[mga]>>> '
-    continuation_prompt = '... '
-    intro = textwrap.dedent('''
-        MGA -- maf game analizer console application for
-        logging and analize maf games.
-
-        Version: {0}
-
-        All questions you may send to mga.app@ya.ru
-        Copyright 2014 Aman Orazaev.
-
-    ''').format(VERSION)
-
-    def __init__(self):
-        cmd.Cmd.__init__(self)
-        self._interpretor = maf.interp.GameInterpretor()
-        self._players_on_table = deque(self._interpretor.state.alive)
+# Time in seconds to refresh status after one command at real table.
+STATUS_BUDGET = 0.05
+STATUS_PAIRS = 3
+# Journal records between session snapshots.
+SNAPSHOT_EVERY = 50
+
+
+def format_pairs(pairs):
+    return ' '.join('{0}-{1}:{2:.3f}'.format(p[0], p[1], d)
+                    for d, p in pairs)
+
+
+class TableSession(object):
+    """Game of one table: order of speeches, votings and analysis.
+
+    Messages are printed to @out (sys.stdout if None). Voting needs
+    hands of every nominee, so `autovoting` is generator which yields
+    prompts and receives hands (see `drive`).
+    """
+    def __init__(self, out=None):
+        self.out = out
+        self._engine = maf.replay.ReplayEngine()
+        self._engine.subscribe(self._on_event)
+        self._players_on_table = deque(self._engine.state.alive)
         self._lap = 0
         self._next_speech = 0
         self._next_crash = 0
         self._dead_speech = deque()
         self._first_voting = True
+        self._tracker = maf.metric.DistanceTracker(self._engine.state)
+        self._inference = maf.inference.RoleInference.attach(self._engine)
+        self._status = None
+        self._refresh_status(time.time())
+
+    def __getstate__(self):
+        # Engine and state drop their observers, they are bound methods
+        # of this session, tracker and inference.
+        state = self.__dict__.copy()
+        state['out'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._subscribe()
+
+    def _subscribe(self):
+        self._engine.subscribe(self._on_event)
+        self._engine.subscribe(self._inference.observe)
+        self._engine.state.subscribe(self._tracker.update_row)
+        self._engine.state.subscribe(self._inference.update_row)
+
+    @property
+    def engine(self):
+        return self._engine
+
+    @property
+    def next_speaker(self):
+        """(player, is last speech) of the next speech."""
+        return self._cur_player(), bool(self._dead_speech)
 
     def _cur_player(self):
         return self._dead_speech[0] if self._dead_speech \
                else self._players_on_table[self._next_speech]
 
-    def _kill(self, num):
+    def _on_event(self, event):
+        if event.kind == maf.replay.KILL:
+            self._players_on_table.remove(event.player)
+
+    def _kill(self, num, reason=maf.replay.DEAD):
         try:
             num = int(num)
             if num not in self._players_on_table:
                 raise LookupError("No player {0} on table, can't kill".format(num))
         except ValueError:
                 raise LookupError("No player {0} on table, can't kill".format(num))
-        self._interpretor.kill(num)
-        self._players_on_table.remove(num)
-
-    def help_quit(self):
-        print textwrap.dedent('''
-            q[uit]
-            ex[it]
-                    quit from maf-game-analizer
-            ''')
-    help_exit = help_q = help_quit
+        self._engine.kill(num, reason)
+        return num
+
+    def _refresh_status(self, start):
+        """Takes snapshot of analysis after command. Distances and role
+        scores are updated incrementally by state observers during engine
+        call of command, so only top pairs and posterior are computed here.
+        Time since @start taken before engine call is checked against
+        STATUS_BUDGET, so it includes observers work."""
+        alive = self._engine.state.alive
+        black = self._inference.black_probability()
+        self._status = {
+            'most_aligned': self._tracker.min_distance(STATUS_PAIRS),
+            'least_aligned': self._tracker.max_distance(STATUS_PAIRS),
+            'suspects': sorted(((float(black[n - 1]), n) for n in alive),
+                               reverse=True),
+        }
+        self._status['time'] = time.time() - start
+        if self._status['time'] > STATUS_BUDGET:
+            logging.warning("Command analysis took {0:.1f} ms, budget is "
+                            "{1:.1f} ms".format(self._status['time'] * 1e3,
+                                                STATUS_BUDGET * 1e3))
 
     def _is_next_lap(self):
         return self._next_speech == 0
 
     def _check_is_speech_now(self):
-        if self._interpretor.state.nominated \
+        if self._engine.state.nominated \
            and self._is_next_lap():
                raise RuntimeError("Error: Can't accept next speech, becouse"
                        " there must be voting now!\n")
 
     def _interp_speech(self, current_player, speech):
         logging.debug("Start accepting speech No {0}\n".format(current_player))
-        self._interpretor.interp_speech(current_player, speech)
-        print "Speech No {0} accepted\n".format(current_player)
-
+        if self._dead_speech:
+            self._engine.speech(current_player, speech, maf.replay.DEAD)
+        else:
+            if self._engine.lap <= self._lap:
+                self._engine.start_lap()
+            self._engine.speech(current_player, speech)
+        print >>self.out, "Speech No {0} accepted\n".format(current_player)
 
-    def do_speech(self, speech):
+    def speech(self, speech):
         self._check_is_speech_now()
         self._first_voting = True
         current_player = self._cur_player()
+        start = time.time()
         self._interp_speech(current_player, speech)
+        self._refresh_status(start)
 
         if not self._dead_speech:
             self._next_speech += 1
@@ -90,59 +154,45 @@ class MafGameAnalizerApp(cmd.Cmd):
         else:
             self._dead_speech.popleft()
 
-
-    def help_speech(self):
-        print textwrap.dedent('''
-            sp[eech] <ACTIONS>
-                    Writes next player speech.
-            ''')
-
-    def do_now(self, line):
-        if self._is_next_lap() and self._interpretor.state.nominated:
-            print "Lap #{0}".format(self._lap - 1)
-            print "Now is voting."
+    def now(self):
+        if self._is_next_lap() and self._engine.state.nominated:
+            print >>self.out, "Lap #{0}".format(self._lap - 1)
+            print >>self.out, "Now is voting."
         else:
-            print "Lap #{0}".format(self._lap)
+            print >>self.out, "Lap #{0}".format(self._lap)
             if not self._dead_speech:
-                print "Now is speech No {0}".format(self._cur_player())
+                print >>self.out, "Now is speech No {0}".format(
+                        self._cur_player())
             else:
-                print "Now is last speech of No {0}".format(self._dead_speech)
-        print "There are {0} players on table".format(
+                print >>self.out, "Now is last speech of No {0}".format(
+                        self._dead_speech)
+        print >>self.out, "There are {0} players on table".format(
                 list(self._players_on_table))
-        print "Nominated: {0}\n".format(self._interpretor.state.nominated)
-
-    def help_now(self):
-        print textwrap.dedent('''
-            now
-                    print current game situation.
-            ''')
+        print >>self.out, "Nominated: {0}\n".format(
+                self._engine.state.nominated)
 
-    def do_dead(self, players):
-        for player in players.split():
-            try:
-                self._kill(player)
-                self._dead_speech.append(player)
-            except LookupError as le:
-                print le
-                return
-
-    def help_dead(self):
-        print textwrap.dedent('''
-            dead <P_0> <P_1> ...
-                    kill players No P_0, P_1, etc.
-        ''')
+    def dead(self, players):
+        """:raises: LookupError if one of @players is not on table,
+        players before it are killed."""
+        start = time.time()
+        try:
+            for player in players.split():
+                self._dead_speech.append(self._kill(player))
+        finally:
+            self._refresh_status(start)
 
     def _nominated_just_one_player(self, nominated):
         if len(nominated) != 1:
             return False
 
-        print "There was just on nominated player No {0}".format(nominated[0])
+        print >>self.out, "There was just on nominated player No {0}".format(
+                nominated[0])
         if self._lap == 1:
-            print "But it is first day. No dead players."
+            print >>self.out, "But it is first day. No dead players."
         else:
-            print "Dead No {0}".format(nominated[0])
-            self._dead_speech.append(nominated[0])
-            self._kill(nominated[0])
+            print >>self.out, "Dead No {0}".format(nominated[0])
+            self._dead_speech.append(self._kill(nominated[0],
+                                                maf.replay.VOTING))
         return True
 
     def _check_is_time_for_voting(self):
@@ -150,70 +200,332 @@ class MafGameAnalizerApp(cmd.Cmd):
             raise RuntimeError("Error: Can't do voting now.\n"
                     "There are players who are not talking in this lap.\n")
 
-    def _vote_for_both(self):
-        votes = raw_input('... both: ')
-        votes = maf.Voting._parse_votes([{maf.Voting.BOTH: votes}])[0][1]
-        votes = [v for v in votes if v in self._players_on_table]
-        logging.debug("Votes for both: {0}".format(votes))
-
-        return len(votes) * 2 > len(self._players_on_table)
-
-    def _update_nominated(self, voting):
-        def cmp_votes(x, y):
-            if len(x[1]) == len(y[1]):
-                return 0
-            return 1 if len(x[1]) > len(y[1]) else -1
-        voting.sort(cmp=cmp_votes, reverse=True)
-        new_nominated = [p for p, h in voting if len(h) == len(voting[0][1])]
-        logging.debug("Max hands for players No {0}".format(new_nominated))
-
-        if new_nominated == self._interpretor.state.nominated \
-           and not self._first_voting:
-            if self._vote_for_both():
-                for p in self._interpretor.state.nominated:
-                    self._kill(p)
-                    self._dead_speech.append(p)
-            self._interpretor.state.nominated = []
-            return
-
-        if len(new_nominated) == 1:
-            self._kill(new_nominated[0][1])
-            self._dead_speech.append(p)
-            self._interpretor.state.nominated = []
+    def _update_nominated(self, voting, both):
+        result = self._engine.voting(voting, both)
+        self._dead_speech.extend(result.eliminated)
+        if result.eliminated or both is not None:
+            self._engine.state.nominated = []
             return
 
         logging.debug("Crash, update nominated")
         self._first_voting = False
-        self._interpretor.state.nominated = [
-                n for n in self._interpretor.state._nominated
-                if n[1] in new_nominated]
+        self._engine.state.nominated = [
+                n for n in self._engine.state._nominated
+                if n[1] in result.leaders]
 
-    def do_autovoting(self, line):
+    def autovoting(self):
+        """Yields prompt for hands of every nominee (and for both if
+        needed) and receives hands string for it."""
         self._check_is_time_for_voting()
-        nominated = self._interpretor.state.nominated
+        nominated = self._engine.state.nominated
         if not nominated:
             return
 
-        print 'Start voting!'
+        print >>self.out, 'Start voting!'
+        start = time.time()
         if self._nominated_just_one_player(nominated):
-            self._interpretor.state.nominated = []
+            self._engine.state.nominated = []
+        else:
+            voting = []
+            for n in nominated:
+                hands = yield '... {0}: '.format(n)
+                voting.append((n, maf.parse_hand_set(hands)))
+            logging.debug("Parsed voting {0}".format(voting))
+
+            leaders = maf.replay.resolve_voting(
+                    voting, self._engine.state.alive_set).leaders
+            logging.debug("Max hands for players No {0}".format(leaders))
+            both = None
+            if len(leaders) > 1 \
+               and list(leaders) == self._engine.state.nominated \
+               and not self._first_voting:
+                both = maf.parse_hand_set((yield '... both: '))
+                logging.debug("Votes for both: {0}".format(both))
+            # Waiting for hands is not analysis time.
+            start = time.time()
+            self._update_nominated(voting, both)
+        self._refresh_status(start)
+
+    def status(self):
+        status = self._status
+        print >>self.out, "Most aligned: {0}".format(
+                format_pairs(status['most_aligned']))
+        print >>self.out, "Least aligned: {0}".format(
+                format_pairs(status['least_aligned']))
+        print >>self.out, "Black probability: {0}".format(' '.join(
+                '{0}:{1:.2f}'.format(n, p) for p, n in status['suspects']))
+        print >>self.out, "Analysed in {0:.1f} ms (budget {1:.1f} ms)\n" \
+                          .format(status['time'] * 1e3, STATUS_BUDGET * 1e3)
+
+
+    def apply(self, record):
+        """Applies journal @record (command, argument) of accepted
+        command, voting argument is tuple of answers.
+
+        :raises: ValueError if voting @record has other number of answers
+        than voting asks for:
+            >>> session = TableSession(out=StringIO())
+            >>> for speech in ['n3', 'n4'] + [''] * 8:
+            ...     session.apply(('speech', speech))
+            >>> session.apply(('autovoting', ('1 2',)))
+            Traceback (most recent call last):
+            ...
+            ValueError: Journal record ('autovoting', ('1 2',)) has no answer for '... 4:'
+        """
+        command, arg = record
+        if command == 'speech':
+            self.speech(arg)
+        elif command == 'dead':
+            self.dead(arg)
+        elif command == 'autovoting':
+            answers = iter(arg)
+
+            def read(prompt):
+                for answer in answers:
+                    return answer
+                raise ValueError("Journal record {0!r} has no answer for "
+                                 "'{1}'".format(record, prompt.strip()))
+            drive(self.autovoting(), read)
+            if next(answers, None) is not None:
+                raise ValueError("Journal record {0!r} has extra answers"
+                                 .format(record))
+        else:
+            raise ValueError("Unknown journal record: {0!r}".format(record))
+
+
+def journal_to_game(records, end=None, **info):
+    """Converts journal @records into game dict of logs/games.yaml
+    format. @info are other game fields (date, club, players, roles).
+
+    The first player killed by `dead` command in a lap is shot at night
+    of that lap and his last speech opens the next day. Other players
+    killed in the same lap are written with their last speeches to dead
+    speeches of the lap, so exported game kills the same players:
+        >>> records = [('speech', 'n3')] + [('speech', '')] * 9 + [
+        ...     ('autovoting', ()), ('dead', '7'), ('dead', '8'),
+        ...     ('speech', '-1')]
+        >>> laps = journal_to_game(records, 'red')['laps']
+        >>> laps[0]['night'], laps[0]['dead'], laps[1]['day']
+        ({'shot': 7}, [{8: 0}], [{7: '-1'}])
+
+    :raises: ValueError if player is killed before the first speech.
+    """
+    session = TableSession(out=StringIO())
+    laps = []
+    shot = set()
+    # Extra killed player -> dead speech of his lap, filled by last speech.
+    extra = {}
+
+    def lap(num):
+        while len(laps) < num:
+            laps.append({})
+        return laps[num - 1]
+
+    for record in records:
+        command, arg = record
+        num = session.engine.lap
+        if command == 'speech':
+            player, last = session.next_speaker
+            speech = arg.strip() or 0
+            if last and player in shot:
+                shot.discard(player)
+                lap(num + 1).setdefault('day', []).append({player: speech})
+            elif last and player in extra:
+                extra.pop(player)[player] = speech
+            elif last:
+                lap(num).setdefault('dead', []).append({player: speech})
+        elif command == 'dead':
+            if not num:
+                raise ValueError("Player {0} is killed before the first "
+                                 "speech, it can't be exported".format(arg))
+            player = int(arg)
+            if 'night' not in lap(num):
+                lap(num)['night'] = {'shot': player}
+                shot.add(player)
+            else:
+                extra[player] = {player: 0}
+                lap(num).setdefault('dead', []).append(extra[player])
+        elif command == 'autovoting':
+            nominated = session.engine.state.nominated
+            if nominated:
+                votes = [{n: hands} for n, hands in zip(nominated, arg)]
+                if not arg:
+                    votes = [{nominated[0]: 0}]
+                if len(arg) > len(nominated):
+                    votes.append({'both': arg[-1]})
+                lap(num).setdefault('voting', []).append({'votes': votes})
+        session.apply(record)
+        if command == 'speech' and not last:
+            lap(session.engine.lap).setdefault('day', []).append(
+                    {player: speech})
+    game = dict(info)
+    game['laps'] = laps + [{'end': end}]
+    return game
+
+
+def export_journal(path, out, end=None, **info):
+    """Writes game of journal @path to yaml file @out.
+
+    Journal has only commands of the table, so @info gives other game
+    fields (date, club, players, roles). Game without roles is not valid
+    log, it is written with warning and must be completed by hand.
+    """
+    game = journal_to_game(
+            [record for _, record in util.journal.read_records(path)], end,
+            **info)
+    if not game.get('roles'):
+        logging.warning("Exported game {0} has no roles, add them before "
+                        "using it as game log".format(out))
+    with open(out, 'w') as f:
+        yaml.safe_dump([{'game': game}], f, default_flow_style=False,
+                       allow_unicode=True)
+
+
+def parse_date(value):
+    """:returns: datetime.date of YYYY-MM-DD @value.
+
+        >>> parse_date('2014-02-05')
+        datetime.date(2014, 2, 5)
+    """
+    return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def drive(dialog, read):
+    """Runs @dialog generator (like `TableSession.autovoting`) answering
+    its prompts with read(prompt). Exceptions of @read are passed to
+    caller, dialog is closed."""
+    try:
+        try:
+            prompt = next(dialog)
+        except StopIteration:
             return
+        while True:
+            # StopIteration of @read is not the end of dialog.
+            answer = read(prompt)
+            try:
+                prompt = dialog.send(answer)
+            except StopIteration:
+                return
+    finally:
+        dialog.close()
+
+
+class MafGameAnalizerApp(cmd.Cmd):
+    allow_cli_args = False
+    multilineCommands = ['sp', 'spe', 'spee', 'speec', 'speech']
+    prompt = '[mga]>>> '
+    continuation_prompt = '... '
+    intro = textwrap.dedent('''
+        MGA -- maf game analizer console application for
+        logging and analize maf games.
+
+        Version: {0}
+
+        All questions you may send to mga.app@ya.ru
+        Copyright 2014 Aman Orazaev.
 
-        votes = []
-        for n in self._interpretor.state.nominated:
-            hands = raw_input('... {0}: '.format(n))
-            votes.append({n: hands})
-        logging.debug("Accepted voting: {0}".format(votes))
-        voting = maf.Voting._parse_votes(votes)
-        voting = [(p, [h for h in hands if h in self._players_on_table]) \
-                  for p, hands in voting]
-        logging.debug("Parsed and alive voting {0}".format(voting))
-        self._update_nominated(voting)
+    ''').format(VERSION)
+
+    def __init__(self, journal=None):
+        cmd.Cmd.__init__(self)
+        self._session = TableSession()
+        self._journal = None
+        if journal is not None:
+            self._open_journal(journal)
+
+    def _open_journal(self, path):
+        """Restores session from journal @path and appends next commands
+        to it."""
+        session, records = util.journal.recover(path)
+        if session is not None:
+            self._session = session
+        self._session.out = StringIO()
+        for record in records:
+            self._session.apply(record)
+        self._session.out = None
+        self._journal = util.journal.Journal(path)
+        if self._journal.seq:
+            print "Game restored from journal {0}: {1} commands, {2} " \
+                  "replayed after snapshot".format(path, self._journal.seq,
+                                                   len(records))
+
+    def _record(self, command, arg):
+        if self._journal is None:
+            return
+        if self._journal.append((command, arg)) % SNAPSHOT_EVERY == 0:
+            self._journal.snapshot(self._session)
+
+    def postloop(self):
+        if self._journal is not None:
+            self._journal.close()
+
+    def help_quit(self):
+        print textwrap.dedent('''
+            q[uit]
+            ex[it]
+                    quit from maf-game-analizer
+            ''')
+    help_exit = help_q = help_quit
+
+    def do_speech(self, speech):
+        self._session.speech(speech)
+        self._record('speech', str(speech))
+
+    def help_speech(self):
+        print textwrap.dedent('''
+            sp[eech] <ACTIONS>
+                    Writes next player speech.
+            ''')
+
+    def do_now(self, line):
+        self._session.now()
+
+    def help_now(self):
+        print textwrap.dedent('''
+            now
+                    print current game situation.
+            ''')
+
+    def do_dead(self, players):
+        for player in players.split():
+            try:
+                self._session.dead(player)
+            except LookupError as le:
+                print le
+                break
+            self._record('dead', player)
+
+    def help_dead(self):
+        print textwrap.dedent('''
+            dead <P_0> <P_1> ...
+                    kill players No P_0, P_1, etc.
+        ''')
+
+    def do_autovoting(self, line):
+        answers = []
+        def read(prompt):
+            answers.append(raw_input(prompt))
+            return answers[-1]
+        drive(self._session.autovoting(), read)
+        self._record('autovoting', tuple(answers))
 
     def help_autovoting(self):
         print 'autovo[ting]'
         print '        Start voting on this lap'
 
+    def do_status(self, line):
+        self._session.status()
+    do_suspects = do_status
+
+    def help_status(self):
+        print textwrap.dedent('''
+            status
+            suspects
+                    print most and least aligned pairs and players
+                    sorted by probability to be black.
+            ''')
+    help_suspects = help_status
+
     def do_debug(self, line):
         if line.strip() == 'off':
             logging.getLogger().setLevel(logging.ERROR)
@@ -229,7 +541,42 @@ class MafGameAnalizerApp(cmd.Cmd):
 
 
 def main():
-    MafGameAnalizerApp().cmdloop()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-j', '--journal', metavar='JOURNAL',
+                        help='append commands to JOURNAL and restore game '
+                             'from it on start')
+    parser.add_argument('--export-yaml', metavar='YAML',
+                        help='convert JOURNAL into game log YAML and exit')
+    parser.add_argument('--end', choices=('red', 'black'),
+                        help='winner for exported game')
+    parser.add_argument('--date', type=parse_date,
+                        help='date of exported game, YYYY-MM-DD')
+    parser.add_argument('--club', help='club of exported game')
+    parser.add_argument('--players', metavar='NAMES',
+                        type=lambda names: [n.strip()
+                                            for n in names.split(',')],
+                        help='comma separated player names in seat order')
+    for role, count in sorted(maf.validate.ROLES.items()):
+        parser.add_argument('--' + role, metavar='P' if count == 1 else 'P,P',
+                            help='{0} of exported game'.format(role))
+    args = parser.parse_args()
+    if args.export_yaml:
+        if not args.journal or not args.end:
+            parser.error('--export-yaml requires --journal and --end')
+        info = dict((name, getattr(args, name))
+                    for name in ('date', 'club', 'players')
+                    if getattr(args, name) is not None)
+        roles = dict((role, ' '.join(str(p) for p in maf.role_players(
+                                 {role: getattr(args, role)}, role)))
+                     for role in maf.validate.ROLES
+                     if getattr(args, role) is not None)
+        roles = dict((role, int(p) if p.isdigit() else p)
+                     for role, p in roles.iteritems())
+        if roles:
+            info['roles'] = roles
+        export_journal(args.journal, args.export_yaml, args.end, **info)
+        return
+    MafGameAnalizerApp(args.journal).cmdloop()
 
 
 if __name__ == '__main__':
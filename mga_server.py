@@ -0,0 +1,373 @@
+#!/usr/bin/env python
+"""Server for logging games of many tables in one process.
+
+Server speaks line protocol over TCP or Unix socket. Every table is
+independent `mga.TableSession`, command of connection is applied to its
+current table:
+    table NAME          select table, new table is created on first use
+    sp[eech] ACTIONS    next player speech
+    dead P_0 P_1 ...    kill players
+    autovo[ting]        start voting, hands are asked line by line
+    now, status         print game situation and analysis
+    tables              list tables
+    quit                close connection
+
+Response is output of command followed by one of lines `ok`,
+`error: MESSAGE` or `> PROMPT` if next line of table is the answer:
+    >>> table = Table('1')
+    >>> print table.execute('speech n3 +2;'),
+    Speech No 1 accepted
+    <BLANKLINE>
+    ok
+    >>> for _ in xrange(9):
+    ...     _ = table.execute('sp')
+    >>> print table.execute('autovoting'),
+    Start voting!
+    There was just on nominated player No 3
+    But it is first day. No dead players.
+    ok
+    >>> print table.execute('dead 11'),
+    error: No player 11 on table, can't kill
+
+Accepted commands are collected in table journal which replays in mga
+console. Journals are appended to files in batches by `Server.flush`:
+    >>> table.take_journal()[:2]
+    ['speech n3 +2;', 'speech ;']
+    >>> table.take_journal()
+    []
+
+While table waits for an answer every line of its connection goes to
+the dialog, even empty one or command name:
+    >>> server = Server(('127.0.0.1', 0))
+    >>> channel = Channel(socket.socketpair()[0], server)
+    >>> channel.push = lambda data: sys.stdout.write(data)
+    >>> channel.collect_incoming_data('table 2')
+    >>> channel.found_terminator()
+    ok
+
+Table name is used as journal file name, so it may have only letters,
+digits, '_', '-' and '.':
+    >>> channel.collect_incoming_data('table ../../x')
+    >>> channel.found_terminator()
+    error: Wrong table name: ../../x
+    >>> for line in ['sp n1;', 'sp n2;'] + ['sp'] * 8 + ['autovoting']:
+    ...     channel.collect_incoming_data(line)
+    ...     channel.found_terminator()
+    ... # doctest: +ELLIPSIS
+    Speech No 1 accepted
+    ...
+    Start voting!
+    > ... 1:
+    >>> channel.found_terminator()
+    > ... 2:
+    >>> channel.collect_incoming_data('quit')
+    >>> channel.found_terminator() # doctest: +ELLIPSIS
+    error: Can't parse next voting:
+
+Dialog left by connection is dropped:
+    >>> table = server.table('2')
+    >>> print table.execute('autovoting'),
+    Start voting!
+    > ... 1:
+    >>> channel.handle_close()
+    >>> table.in_dialog
+    False
+    >>> server.close()
+
+Server is single threaded: Python 2 has no asyncio, so connections are
+asynchat channels of one asyncore loop. Usage:
+    mga_server.py [--host HOST] [--port PORT] [--unix PATH] [--logs DIR]
+"""
+
+import argparse
+import asynchat
+import asyncore
+import logging
+import os
+import re
+import socket
+import sys
+import time
+
+from StringIO import StringIO
+
+import mga
+
+COMMANDS = ('speech', 'dead', 'autovoting', 'now', 'status', 'suspects',
+            'table', 'tables', 'quit')
+FLUSH_INTERVAL = 1.
+FLUSH_LINES = 256
+DEFAULT_PORT = 7340
+TABLE_NAME = re.compile(r'^[\w.-]+$')
+
+
+def resolve_command(name):
+    """:returns: full command name by its unique prefix @name.
+    :raises: LookupError if @name is unknown or ambiguous.
+
+        >>> resolve_command('autovo'), resolve_command('sp')
+        ('autovoting', 'speech')
+    """
+    if name in COMMANDS:
+        return name
+    matches = [c for c in COMMANDS if c.startswith(name)] if name else []
+    if len(matches) != 1:
+        raise LookupError("Unknown command: {0}".format(name))
+    return matches[0]
+
+
+def check_table_name(name):
+    """:returns: @name if it is safe journal file name.
+    :raises: ValueError otherwise.
+
+        >>> check_table_name('hall-1.a')
+        'hall-1.a'
+        >>> check_table_name('/tmp')
+        Traceback (most recent call last):
+        ...
+        ValueError: Wrong table name: /tmp
+    """
+    if not TABLE_NAME.match(name) or '..' in name or os.sep in name:
+        raise ValueError("Wrong table name: {0}".format(name))
+    return name
+
+
+def _error(e):
+    lines = str(e).strip().splitlines()
+    return 'error: {0}\n'.format(lines[0] if lines else type(e).__name__)
+
+
+class Table(object):
+    """Game session of one table with pending dialog and journal."""
+    def __init__(self, name):
+        self._name = name
+        self._session = mga.TableSession()
+        self._dialog = None
+        self._dialog_lines = []
+        self._journal = []
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def in_dialog(self):
+        """True if next line of table is the answer to dialog."""
+        return self._dialog is not None
+
+    def cancel_dialog(self):
+        """Drops pending dialog, its lines are not journaled."""
+        if self._dialog is not None:
+            self._dialog.close()
+        self._dialog = None
+        self._dialog_lines = []
+
+    def take_journal(self):
+        """:returns: list of journal lines collected since last call."""
+        journal, self._journal = self._journal, []
+        return journal
+
+    def _step(self, out, answer=None):
+        try:
+            if answer is None:
+                prompt = next(self._dialog)
+            else:
+                prompt = self._dialog.send(answer)
+        except StopIteration:
+            self._journal.extend(self._dialog_lines)
+            self._dialog = None
+            return out.getvalue() + 'ok\n'
+        return out.getvalue() + '> {0}\n'.format(prompt.strip())
+
+    def execute(self, line):
+        """Applies one protocol @line.
+
+        :returns: response text.
+        """
+        out = StringIO()
+        self._session.out = out
+        try:
+            if self._dialog is not None:
+                self._dialog_lines.append(line)
+                return self._step(out, line)
+            name, _, arg = line.strip().partition(' ')
+            command = resolve_command(name)
+            if command == 'speech':
+                arg = arg.strip().rstrip(';').strip()
+                self._session.speech(arg)
+            elif command == 'dead':
+                # Killed players are journaled even if next one fails.
+                for player in arg.split():
+                    self._session.dead(player)
+                    self._journal.append('dead {0}'.format(player))
+            elif command == 'autovoting':
+                self._dialog = self._session.autovoting()
+                self._dialog_lines = [command]
+                return self._step(out)
+            elif command == 'now':
+                self._session.now()
+            elif command in ('status', 'suspects'):
+                self._session.status()
+            else:
+                raise LookupError("{0} is not table command".format(command))
+            if command == 'speech':
+                self._journal.append('speech {0};'.format(arg))
+            return out.getvalue() + 'ok\n'
+        except (LookupError, RuntimeError, SyntaxError, ValueError) as e:
+            self._dialog = None
+            return out.getvalue() + _error(e)
+        finally:
+            self._session.out = None
+
+
+class Channel(asynchat.async_chat):
+    """Connection reading protocol lines."""
+    def __init__(self, sock, server):
+        asynchat.async_chat.__init__(self, sock)
+        self.set_terminator('\n')
+        self._server = server
+        self._buffer = []
+        self._table = None
+
+    def collect_incoming_data(self, data):
+        self._buffer.append(data)
+
+    def _leave_table(self):
+        if self._table is not None:
+            self._table.cancel_dialog()
+        self._table = None
+
+    def handle_close(self):
+        self._leave_table()
+        asynchat.async_chat.handle_close(self)
+
+    def found_terminator(self):
+        line = ''.join(self._buffer).rstrip('\r')
+        self._buffer = []
+        name, _, arg = line.strip().partition(' ')
+        if self._table is not None and self._table.in_dialog:
+            self.push(self._table.execute(line))
+            self._server.journal_changed()
+        elif not name:
+            self.push('ok\n')
+        elif name == 'quit':
+            self._leave_table()
+            self.close_when_done()
+        elif name == 'table':
+            try:
+                if not arg.strip():
+                    raise ValueError("Table name is required")
+                name = check_table_name(arg.strip())
+            except ValueError as e:
+                self.push(_error(e))
+            else:
+                self._leave_table()
+                self._table = self._server.table(name)
+                self.push('ok\n')
+        elif name == 'tables':
+            self.push(''.join('{0}\n'.format(n)
+                              for n in self._server.table_names()) + 'ok\n')
+        elif self._table is None:
+            self.push(_error("Select table first: table NAME"))
+        else:
+            self.push(self._table.execute(line))
+            self._server.journal_changed()
+
+
+class Server(asyncore.dispatcher):
+    """Listening socket, tables and batched writer of table journals.
+
+    Journal of table NAME is appended to @logs/NAME.log, if @logs is
+    None journals are dropped.
+    """
+    def __init__(self, address, logs=None):
+        asyncore.dispatcher.__init__(self)
+        if isinstance(address, str):
+            if os.path.exists(address):
+                os.unlink(address)
+            self.create_socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.set_reuse_addr()
+        self.bind(address)
+        self.listen(64)
+        self._logs = logs
+        self._tables = {}
+        self._pending = 0
+        self._flushed = time.time()
+        self._running = True
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            Channel(pair[0], self)
+
+    def table(self, name):
+        """:returns: Table @name, see `check_table_name`."""
+        if name not in self._tables:
+            check_table_name(name)
+            logging.info("New table {0}".format(name))
+            self._tables[name] = Table(name)
+        return self._tables[name]
+
+    def table_names(self):
+        return sorted(self._tables)
+
+    def journal_changed(self):
+        self._pending += 1
+        if self._pending >= FLUSH_LINES:
+            self.flush()
+
+    def flush(self):
+        """Appends collected journal lines of all tables to files."""
+        self._pending = 0
+        self._flushed = time.time()
+        for table in self._tables.itervalues():
+            lines = table.take_journal()
+            if not lines or self._logs is None:
+                continue
+            path = os.path.join(self._logs, '{0}.log'.format(table.name))
+            with open(path, 'a') as f:
+                f.write(''.join(line + '\n' for line in lines))
+
+    def serve(self, timeout=FLUSH_INTERVAL):
+        """Runs loop until `stop`, flushes journals every @timeout
+        seconds."""
+        try:
+            while self._running:
+                asyncore.loop(timeout=timeout, count=1)
+                if time.time() - self._flushed >= timeout:
+                    self.flush()
+        finally:
+            self.flush()
+            asyncore.close_all()
+
+    def stop(self):
+        """Stops `serve` loop (from other thread too) within its
+        timeout."""
+        self._running = False
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            description="Server for logging games of many tables.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', metavar='PATH',
+                        help='listen Unix socket PATH instead of TCP')
+    parser.add_argument('--logs', metavar='DIR',
+                        help='directory for table journals')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    address = args.unix or (args.host, args.port)
+    server = Server(address, args.logs)
+    logging.info("Listening on {0}".format(address))
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+
+# parsetab.py
+# This file is automatically generated. Do not edit.
+# pylint: disable=W,C,R
+_tabversion = '3.10'
+
+_lr_method = 'LALR'
+
+_lr_signature = 'CANCEL CHECK CLOSE_BRACE COMMA DDOT DENOMINATE DIGIT DOLLAR DO_NOT_VOTE LINE MINUS NOMINATE OPEN_BRACE PLUS QUESTION SHOT\n        speech :\n        speech : action speech\n        \n        action : position\n        action : sheriff\n        action : CHECK player_comma_list\n        action : NOMINATE player_comma_list\n        action : CANCEL player_comma_list\n        action : CANCEL DOLLAR\n        action : DENOMINATE DIGIT\n        action : SHOT DIGIT\n        action : DO_NOT_VOTE player_comma_list\n        action : OPEN_BRACE brace_action CLOSE_BRACE\n        \n        sheriff : DOLLAR\n        \n        position : PLUS player_comma_list\n        position : MINUS player_comma_list\n        \n        position_list : position\n        position_list : position position_list\n        \n        sign_list : MINUS\n        sign_list : MINUS sign_list\n        sign_list : PLUS\n        sign_list : PLUS sign_list\n        \n        player_comma_list : DIGIT\n        player_comma_list : DIGIT COMMA player_comma_list\n        \n        player_list : player_range\n        player_list : player_range player_list\n        player_list : player_comma_list\n        player_list : player_comma_list player_list\n        \n        player_range : DIGIT MINUS DIGIT\n        \n        brace_action : DOLLAR sign_list\n        brace_action : DOLLAR position_list\n        brace_action : DOLLAR CANCEL\n        brace_action : DOLLAR DOLLAR position_list\n        brace_action : DOLLAR DOLLAR position_list LINE DIGIT\n        brace_action : DOLLAR QUESTION sheriff_list\n        brace_action : DO_NOT_VOTE DIGIT player_list\n        brace_action : DO_NOT_VOTE QUESTION DIGIT\n        brace_action : player_list LINE MINUS DIGIT\n        brace_action : player_list LINE PLUS DIGIT\n        \n        sheriff_list : sheriff_in_list_position\n        sheriff_list : sheriff_in_list_position sheriff_list\n        \n        sheriff_in_list_position : OPEN_BRACE DIGIT DDOT position_list CLOSE_BRACE\n        sheriff_in_list_position : OPEN_BRACE DIGIT DDOT CANCEL CLOSE_BRACE\n        sheriff_in_list_position : DIGIT DDOT OPEN_BRACE position_list CLOSE_BRACE\n        sheriff_in_list_position : DIGIT DDOT OPEN_BRACE CANCEL CLOSE_BRACE\n        '
+    
+_lr_action_items = {'QUESTION':([24,25,],[36,45,]),'DIGIT':([1,2,4,6,7,8,10,13,14,17,22,25,26,28,33,34,36,39,43,44,45,49,50,51,52,55,56,70,78,79,80,81,],[15,16,17,17,17,22,17,17,17,-22,-22,44,22,22,17,50,53,17,17,22,64,-23,-28,65,66,53,69,73,-44,-43,-42,-41,]),'SHOT':([0,3,5,11,12,15,16,17,18,19,20,21,29,31,32,47,49,],[1,-4,-13,1,-3,-10,-9,-22,-6,-14,-8,-7,-11,-15,-5,-12,-23,]),'DENOMINATE':([0,3,5,11,12,15,16,17,18,19,20,21,29,31,32,47,49,],[2,-4,-13,2,-3,-10,-9,-22,-6,-14,-8,-7,-11,-15,-5,-12,-23,]),'NOMINATE':([0,3,5,11,12,15,16,17,18,19,20,21,29,31,32,47,49,],[4,-4,-13,4,-3,-10,-9,-22,-6,-14,-8,-7,-11,-15,-5,-12,-23,]),'CLOSE_BRACE':([17,19,22,26,27,28,31,37,39,40,41,42,43,46,48,49,50,54,55,57,58,59,60,61,62,63,64,65,66,68,73,74,75,76,77,78,79,80,81,],[-22,-14,-22,-24,47,-26,-15,-29,-20,-16,-31,-30,-18,-25,-27,-23,-28,-34,-39,-32,-21,-20,-18,-17,-19,-35,-36,-38,-37,-40,-33,78,79,80,81,-44,-43,-42,-41,]),'DOLLAR':([0,3,5,7,8,11,12,15,16,17,18,19,20,21,24,29,31,32,47,49,],[5,-4,-13,20,24,5,-3,-10,-9,-22,-6,-14,-8,-7,38,-11,-15,-5,-12,-23,]),'CHECK':([0,3,5,11,12,15,16,17,18,19,20,21,29,31,32,47,49,],[14,-4,-13,14,-3,-10,-9,-22,-6,-14,-8,-7,-11,-15,-5,-12,-23,]),'OPEN_BRACE':([0,3,5,11,12,15,16,17,18,19,20,21,29,31,32,36,47,49,55,67,78,79,80,81,],[8,-4,-13,8,-3,-10,-9,-22,-6,-14,-8,-7,-11,-15,-5,56,-12,-23,56,71,-44,-43,-42,-41,]),'PLUS':([0,3,5,11,12,15,16,17,18,19,20,21,24,29,31,32,35,38,39,40,43,47,49,59,60,71,72,],[6,-4,-13,6,-3,-10,-9,-22,-6,-14,-8,-7,39,-11,-15,-5,51,6,59,6,59,-12,-23,59,59,6,6,]),'DDOT':([53,69,],[67,72,]),'DO_NOT_VOTE':([0,3,5,8,11,12,15,16,17,18,19,20,21,29,31,32,47,49,],[10,-4,-13,25,10,-3,-10,-9,-22,-6,-14,-8,-7,-11,-15,-5,-12,-23,]),'CANCEL':([0,3,5,11,12,15,16,17,18,19,20,21,24,29,31,32,47,49,71,72,],[7,-4,-13,7,-3,-10,-9,-22,-6,-14,-8,-7,41,-11,-15,-5,-12,-23,74,76,]),'COMMA':([17,22,],[33,33,]),'LINE':([17,19,22,23,26,28,31,40,46,48,49,50,57,61,],[-22,-14,-22,35,-24,-26,-15,-16,-25,-27,-23,-28,70,-17,]),'MINUS':([0,3,5,11,12,15,16,17,18,19,20,21,22,24,29,31,32,35,38,39,40,43,47,49,59,60,71,72,],[13,-4,-13,13,-3,-10,-9,-22,-6,-14,-8,-7,34,43,-11,-15,-5,52,13,60,13,60,-12,-23,60,60,13,13,]),'$end':([0,3,5,9,11,12,15,16,17,18,19,20,21,29,30,31,32,47,49,],[-1,-4,-13,0,-1,-3,-10,-9,-22,-6,-14,-8,-7,-11,-2,-15,-5,-12,-23,]),}
+
+_lr_action = {}
+for _k, _v in _lr_action_items.items():
+   for _x,_y in zip(_v[0],_v[1]):
+      if not _x in _lr_action:  _lr_action[_x] = {}
+      _lr_action[_x][_k] = _y
+del _lr_action_items
+
+_lr_goto_items = {'player_list':([8,26,28,44,],[23,46,48,63,]),'sheriff':([0,11,],[3,3,]),'sheriff_list':([36,55,],[54,68,]),'sheriff_in_list_position':([36,55,],[55,55,]),'sign_list':([24,39,43,59,60,],[37,58,62,58,62,]),'speech':([0,11,],[9,30,]),'player_range':([8,26,28,44,],[26,26,26,26,]),'brace_action':([8,],[27,]),'position_list':([24,38,40,71,72,],[42,57,61,75,77,]),'action':([0,11,],[11,11,]),'position':([0,11,24,38,40,71,72,],[12,12,40,40,40,40,40,]),'player_comma_list':([4,6,7,8,10,13,14,26,28,33,39,43,44,],[18,19,21,28,29,31,32,28,28,49,19,31,28,]),}
+
+_lr_goto = {}
+for _k, _v in _lr_goto_items.items():
+   for _x, _y in zip(_v[0], _v[1]):
+       if not _x in _lr_goto: _lr_goto[_x] = {}
+       _lr_goto[_x][_k] = _y
+del _lr_goto_items
+_lr_productions = [
+  ("S' -> speech","S'",1,None,None,None),
+  ('speech -> <empty>','speech',0,'p_speech','speech_parser.py',103),
+  ('speech -> action speech','speech',2,'p_speech','speech_parser.py',104),
+  ('action -> position','action',1,'p_action','speech_parser.py',114),
+  ('action -> sheriff','action',1,'p_action','speech_parser.py',115),
+  ('action -> CHECK player_comma_list','action',2,'p_action','speech_parser.py',116),
+  ('action -> NOMINATE player_comma_list','action',2,'p_action','speech_parser.py',117),
+  ('action -> CANCEL player_comma_list','action',2,'p_action','speech_parser.py',118),
+  ('action -> CANCEL DOLLAR','action',2,'p_action','speech_parser.py',119),
+  ('action -> DENOMINATE DIGIT','action',2,'p_action','speech_parser.py',120),
+  ('action -> SHOT DIGIT','action',2,'p_action','speech_parser.py',121),
+  ('action -> DO_NOT_VOTE player_comma_list','action',2,'p_action','speech_parser.py',122),
+  ('action -> OPEN_BRACE brace_action CLOSE_BRACE','action',3,'p_action','speech_parser.py',123),
+  ('sheriff -> DOLLAR','sheriff',1,'p_sheriff','speech_parser.py',141),
+  ('position -> PLUS player_comma_list','position',2,'p_position','speech_parser.py',147),
+  ('position -> MINUS player_comma_list','position',2,'p_position','speech_parser.py',148),
+  ('position_list -> position','position_list',1,'p_position_list','speech_parser.py',156),
+  ('position_list -> position position_list','position_list',2,'p_position_list','speech_parser.py',157),
+  ('sign_list -> MINUS','sign_list',1,'p_sign_list','speech_parser.py',165),
+  ('sign_list -> MINUS sign_list','sign_list',2,'p_sign_list','speech_parser.py',166),
+  ('sign_list -> PLUS','sign_list',1,'p_sign_list','speech_parser.py',167),
+  ('sign_list -> PLUS sign_list','sign_list',2,'p_sign_list','speech_parser.py',168),
+  ('player_comma_list -> DIGIT','player_comma_list',1,'p_player_comma_list','speech_parser.py',176),
+  ('player_comma_list -> DIGIT COMMA player_comma_list','player_comma_list',3,'p_player_comma_list','speech_parser.py',177),
+  ('player_list -> player_range','player_list',1,'p_player_list','speech_parser.py',187),
+  ('player_list -> player_range player_list','player_list',2,'p_player_list','speech_parser.py',188),
+  ('player_list -> player_comma_list','player_list',1,'p_player_list','speech_parser.py',189),
+  ('player_list -> player_comma_list player_list','player_list',2,'p_player_list','speech_parser.py',190),
+  ('player_range -> DIGIT MINUS DIGIT','player_range',3,'p_player_range','speech_parser.py',198),
+  ('brace_action -> DOLLAR sign_list','brace_action',2,'p_brace_action','speech_parser.py',204),
+  ('brace_action -> DOLLAR position_list','brace_action',2,'p_brace_action','speech_parser.py',205),
+  ('brace_action -> DOLLAR CANCEL','brace_action',2,'p_brace_action','speech_parser.py',206),
+  ('brace_action -> DOLLAR DOLLAR position_list','brace_action',3,'p_brace_action','speech_parser.py',207),
+  ('brace_action -> DOLLAR DOLLAR position_list LINE DIGIT','brace_action',5,'p_brace_action','speech_parser.py',208),
+  ('brace_action -> DOLLAR QUESTION sheriff_list','brace_action',3,'p_brace_action','speech_parser.py',209),
+  ('brace_action -> DO_NOT_VOTE DIGIT player_list','brace_action',3,'p_brace_action','speech_parser.py',210),
+  ('brace_action -> DO_NOT_VOTE QUESTION DIGIT','brace_action',3,'p_brace_action','speech_parser.py',211),
+  ('brace_action -> player_list LINE MINUS DIGIT','brace_action',4,'p_brace_action','speech_parser.py',212),
+  ('brace_action -> player_list LINE PLUS DIGIT','brace_action',4,'p_brace_action','speech_parser.py',213),
+  ('sheriff_list -> sheriff_in_list_position','sheriff_list',1,'p_sheriff_list','speech_parser.py',239),
+  ('sheriff_list -> sheriff_in_list_position sheriff_list','sheriff_list',2,'p_sheriff_list','speech_parser.py',240),
+  ('sheriff_in_list_position -> OPEN_BRACE DIGIT DDOT position_list CLOSE_BRACE','sheriff_in_list_position',5,'p_sheriff_in_list_position','speech_parser.py',248),
+  ('sheriff_in_list_position -> OPEN_BRACE DIGIT DDOT CANCEL CLOSE_BRACE','sheriff_in_list_position',5,'p_sheriff_in_list_position','speech_parser.py',249),
+  ('sheriff_in_list_position -> DIGIT DDOT OPEN_BRACE position_list CLOSE_BRACE','sheriff_in_list_position',5,'p_sheriff_in_list_position','speech_parser.py',250),
+  ('sheriff_in_list_position -> DIGIT DDOT OPEN_BRACE CANCEL CLOSE_BRACE','sheriff_in_list_position',5,'p_sheriff_in_list_position','speech_parser.py',251),
+]
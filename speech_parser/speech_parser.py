@@ -5,238 +5,336 @@ from maf import actions
 from ply import lex
 from ply import yacc
 import re
+import threading
 
-tokens = (
-    'PLUS',
-    'MINUS',
-    'OPEN_BRACE',
-    'CLOSE_BRACE',
-    'LINE',
-    'SHOT',
-    'CANCEL',
-    'NOMINATE',
-    'DENOMINATE',
-    'DO_NOT_VOTE',
-    'CHECK',
-    'DIGIT',
-    'COMMA',
-    'DOLLAR',
-    'QUESTION',
-    'DDOT'
-)
-
-t_PLUS = r'\+'
-t_MINUS = r'-'
-t_OPEN_BRACE = r'\('
-t_CLOSE_BRACE = r'\)'
-t_LINE = r'\|'
-t_SHOT = r'>'
-t_CANCEL = r'[xX]'
-t_NOMINATE = r'[nN]'
-t_DENOMINATE = r'[dD]'
-t_DO_NOT_VOTE = r'[zZ]'
-t_CHECK = r'[cC]'
-t_COMMA = r','
-t_DOLLAR = r'\$'
-t_QUESTION = r'\?'
-t_DDOT = r':'
-
-t_ignore = r' '
-
-def t_DIGIT(t):
-    r"\d+"
-    t.value = int(t.value)
-    return t
-
-def t_error(t):
-    from StringIO import StringIO
-    buf = StringIO()
-    print >> buf, "Unkonwn token. See information below.\n"
-    print >> buf, ' '*7, "PREPROCESSED INPUT:", yacc.current_parsed_string
-    print >> buf, ' '*7, "ERROR HERE:", '-'*(8 + t.lexpos) + '^'
-    raise SyntaxError(buf.getvalue())
-
-lex.lex()
-
-def p_speech(p):
-    """
-    speech :
-    speech : action speech
+_SHERIFF_DONT_SAY_CHECKS = re.compile(r'(?:^|(?<= ))\$([-+]+)(?=$| )')
+_SHERIFF_CANCEL = re.compile(r'(^| )\$x($| )')
+_DO_NOT_VOTE_ALONE = re.compile(r'(^| )z($| )')
+
+# Speech without braces, sheriff and questions is a flat sequence of
+# actions, which is parsed without ply.
+_FLAT_ACTION = re.compile(r' *(?:([-+cCnNxXzZ]) *(\d+(?: *, *\d+)*)'
+                          r'|([dD>]) *(\d+)) *')
+_FLAT_COMMA = re.compile(r' *, *')
+_NOT_FLAT = re.compile(r'[($?]')
+
+class SpeechParser(object):
+    """Speech parser with its own lexer, parser and error context.
+
+    Parser object is not thread safe, but different objects may be used
+    from different threads simultaneously. Module level `parse` function
+    uses separate parser object for every thread.
+
+        >>> SpeechParser().parse('+1,2 n3')
+        [('+', 1), ('+', 2), ('n', 3)]
     """
-    if len(p) == 1:
+
+    def __init__(self, write_tables=False):
+        """Builds lexer and parser. Parser tables are loaded from shipped
+        `parsetab` module and are written back only if @write_tables is
+        set, see `make parsetab`.
+        """
+        self._processed = None
+        self._lexer = lex.lex(module=self)
+        self._parser = yacc.yacc(module=self, debug=False,
+                                 write_tables=write_tables)
+
+    tokens = (
+        'PLUS',
+        'MINUS',
+        'OPEN_BRACE',
+        'CLOSE_BRACE',
+        'LINE',
+        'SHOT',
+        'CANCEL',
+        'NOMINATE',
+        'DENOMINATE',
+        'DO_NOT_VOTE',
+        'CHECK',
+        'DIGIT',
+        'COMMA',
+        'DOLLAR',
+        'QUESTION',
+        'DDOT'
+    )
+
+    t_PLUS = r'\+'
+    t_MINUS = r'-'
+    t_OPEN_BRACE = r'\('
+    t_CLOSE_BRACE = r'\)'
+    t_LINE = r'\|'
+    t_SHOT = r'>'
+    t_CANCEL = r'[xX]'
+    t_NOMINATE = r'[nN]'
+    t_DENOMINATE = r'[dD]'
+    t_DO_NOT_VOTE = r'[zZ]'
+    t_CHECK = r'[cC]'
+    t_COMMA = r','
+    t_DOLLAR = r'\$'
+    t_QUESTION = r'\?'
+    t_DDOT = r':'
+
+    t_ignore = r' '
+
+    def t_DIGIT(self, t):
+        r"\d+"
+        t.value = int(t.value)
+        return t
+
+    def _syntax_error(self, title, lexpos):
+        """:returns: SyntaxError with preprocessed input in `text` and
+        error position in `offset` attributes."""
+        from StringIO import StringIO
+        buf = StringIO()
+        print >> buf, title, "See information below.\n"
+        print >> buf, ' '*7, "PREPROCESSED INPUT:", self._processed
+        print >> buf, ' '*7, "ERROR HERE:", '-'*(8 + lexpos) + '^'
+        error = SyntaxError(buf.getvalue())
+        error.text = self._processed
+        error.offset = lexpos
+        return error
+
+    def t_error(self, t):
+        raise self._syntax_error("Unkonwn token.", t.lexpos)
+
+
+    def p_speech(self, p):
+        """
+        speech :
+        speech : action speech
+        """
+        if len(p) == 1:
+            p[0] = []
+        else:
+            p[0] = p[1] if isinstance(p[1], list) else [p[1]]
+            p[0].extend(p[2])
+
+    def p_action(self, p):
+        """
+        action : position
+        action : sheriff
+        action : CHECK player_comma_list
+        action : NOMINATE player_comma_list
+        action : CANCEL player_comma_list
+        action : CANCEL DOLLAR
+        action : DENOMINATE DIGIT
+        action : SHOT DIGIT
+        action : DO_NOT_VOTE player_comma_list
+        action : OPEN_BRACE brace_action CLOSE_BRACE
+        """
+        if len(p) == 2:
+            p[0] = p[1]
+        elif len(p) == 3:
+            if p[1].lower() in (actions.CHECK, actions.CANCEL,
+                    actions.NOMINATE, actions.DO_NOT_VOTE):
+                if p[2] == actions.SHERIFF:
+                    p[0] = [(actions.SHERIFF, (0, actions.CANCEL))]
+                else:
+                    p[0] = [(p[1].lower(), num) for num in p[2]]
+            else:
+                p[0] = (p[1].lower(), p[2])
+        else:
+            p[0] = p[2]
+
+    def p_sheriff(self, p):
+        """
+        sheriff : DOLLAR
+        """
+        p[0] = [('$', (0, None))]
+
+    def p_position(self, p):
+        """
+        position : PLUS player_comma_list
+        position : MINUS player_comma_list
+        """
         p[0] = []
-    else:
-        p[0] = p[1] if isinstance(p[1], list) else [p[1]]
-        p[0].extend(p[2])
+        for player in p[2]:
+            p[0].append((p[1], player))
 
-def p_action(p):
-    """
-    action : position
-    action : sheriff
-    action : CHECK player_comma_list
-    action : NOMINATE player_comma_list
-    action : CANCEL player_comma_list
-    action : CANCEL DOLLAR
-    action : DENOMINATE DIGIT
-    action : SHOT DIGIT
-    action : DO_NOT_VOTE player_comma_list
-    action : OPEN_BRACE brace_action CLOSE_BRACE
-    """
-    if len(p) == 2:
+    def p_position_list(self, p):
+        """
+        position_list : position
+        position_list : position position_list
+        """
         p[0] = p[1]
-    elif len(p) == 3:
-        if p[1].lower() in (actions.CHECK, actions.CANCEL,
-                actions.NOMINATE, actions.DO_NOT_VOTE):
-            if p[2] == actions.SHERIFF:
+        if len(p) > 2:
+            p[0].extend(p[2])
+
+    def p_sign_list(self, p):
+        """
+        sign_list : MINUS
+        sign_list : MINUS sign_list
+        sign_list : PLUS
+        sign_list : PLUS sign_list
+        """
+        p[0] = [(p[1], None)]
+        if len(p) > 2:
+            p[0].extend(p[2])
+
+    def p_player_comma_list(self, p):
+        """
+        player_comma_list : DIGIT
+        player_comma_list : DIGIT COMMA player_comma_list
+        """
+        if len(p) == 2:
+            p[0] = [p[1]]
+        else:
+            p[0] = [p[1]]
+            p[0].extend(p[3])
+
+    def p_player_list(self, p):
+        """
+        player_list : player_range
+        player_list : player_range player_list
+        player_list : player_comma_list
+        player_list : player_comma_list player_list
+        """
+        p[0] = p[1]
+        if len(p) > 2:
+            p[0].extend(p[2])
+
+    def p_player_range(self, p):
+        """
+        player_range : DIGIT MINUS DIGIT
+        """
+        p[0] = range(p[1], p[3] + 1)
+
+    def p_brace_action(self, p):
+        """
+        brace_action : DOLLAR sign_list
+        brace_action : DOLLAR position_list
+        brace_action : DOLLAR CANCEL
+        brace_action : DOLLAR DOLLAR position_list
+        brace_action : DOLLAR DOLLAR position_list LINE DIGIT
+        brace_action : DOLLAR QUESTION sheriff_list
+        brace_action : DO_NOT_VOTE DIGIT player_list
+        brace_action : DO_NOT_VOTE QUESTION DIGIT
+        brace_action : player_list LINE MINUS DIGIT
+        brace_action : player_list LINE PLUS DIGIT
+        """
+        if len(p) == 3:
+            if isinstance(p[2], list):
+                p[0] = [(actions.SHERIFF, (0, p[2]))]
+            else:
                 p[0] = [(actions.SHERIFF, (0, actions.CANCEL))]
+        elif len(p) == 4:
+            if p[1] == actions.SHERIFF and p[2] == '?':
+                p[0] = p[3]
+            elif p[2] == actions.SHERIFF:
+                p[0] = [(actions.INFORMATION, (None, p[3]))]
+            elif p[1] == actions.DO_NOT_VOTE and p[2] == '?':
+                p[0] = [] # Do not record questions about voting
             else:
-                p[0] = [(p[1].lower(), num) for num in p[2]]
+                p[0] = [(actions.DO_NOT_VOTE, (p[2], p[3]))]
         else:
-            p[0] = (p[1].lower(), p[2])
-    else:
-        p[0] = p[2]
+            if p[4] == '|':
+                p[0] = [(actions.INFORMATION, (p[5], p[3]))]
+            else:
+                decision = int("{0}{1}".format(p[3],p[4]))
+                p[0] = [(actions.SET, (p[1], decision))]
 
-def p_sheriff(p):
-    """
-    sheriff : DOLLAR
-    """
-    p[0] = [('$', (0, None))]
 
-def p_position(p):
-    """
-    position : PLUS player_comma_list
-    position : MINUS player_comma_list
-    """
-    p[0] = []
-    for player in p[2]:
-        p[0].append((p[1], player))
+    def p_sheriff_list(self, p):
+        """
+        sheriff_list : sheriff_in_list_position
+        sheriff_list : sheriff_in_list_position sheriff_list
+        """
+        p[0] = [(actions.SHERIFF, p[1])]
+        if len(p) > 2:
+            p[0].extend(p[2])
 
-def p_position_list(p):
-    """
-    position_list : position
-    position_list : position position_list
-    """
-    p[0] = p[1]
-    if len(p) > 2:
-        p[0].extend(p[2])
+    def p_sheriff_in_list_position(self, p):
+        """
+        sheriff_in_list_position : OPEN_BRACE DIGIT DDOT position_list CLOSE_BRACE
+        sheriff_in_list_position : OPEN_BRACE DIGIT DDOT CANCEL CLOSE_BRACE
+        sheriff_in_list_position : DIGIT DDOT OPEN_BRACE position_list CLOSE_BRACE
+        sheriff_in_list_position : DIGIT DDOT OPEN_BRACE CANCEL CLOSE_BRACE
+        """
+        if p[1] == '(':
+            p[0] = (p[2], p[4].lower() if isinstance(p[4], str) else p[4])
+        else:
+            p[0] = (p[1], p[4].lower() if isinstance(p[4], str) else p[4])
 
-def p_sign_list(p):
-    """
-    sign_list : MINUS
-    sign_list : MINUS sign_list
-    sign_list : PLUS
-    sign_list : PLUS sign_list
-    """
-    p[0] = [(p[1], None)]
-    if len(p) > 2:
-        p[0].extend(p[2])
+    def p_error(self, p):
+        lexpos = p.lexpos if p is not None else len(self._processed)
+        raise self._syntax_error("Error while parsing string.", lexpos)
 
-def p_player_comma_list(p):
-    """
-    player_comma_list : DIGIT
-    player_comma_list : DIGIT COMMA player_comma_list
-    """
-    if len(p) == 2:
-        p[0] = [p[1]]
-    else:
-        p[0] = [p[1]]
-        p[0].extend(p[3])
+    @staticmethod
+    def preprocess(speech):
+        """:returns: @speech rewritten into grammar accepted by parser."""
+        processed = _SHERIFF_DONT_SAY_CHECKS.sub(r'($\1)', speech)
+        processed = _SHERIFF_CANCEL.sub(r'\g<1>($x)\g<2>', processed)
+        processed = _DO_NOT_VOTE_ALONE.sub(r'\g<1>z0\g<2>', processed)
+        return processed
 
-def p_player_list(p):
-    """
-    player_list : player_range
-    player_list : player_range player_list
-    player_list : player_comma_list
-    player_list : player_comma_list player_list
-    """
-    p[0] = p[1]
-    if len(p) > 2:
-        p[0].extend(p[2])
+    def parse(self, speech):
+        """:returns: list of actions parsed from @speech string.
 
-def p_player_range(p):
-    """
-    player_range : DIGIT MINUS DIGIT
-    """
-    p[0] = range(p[1], p[3] + 1)
+        :raises: SyntaxError with error position in preprocessed input.
+        """
+        self._processed = self.preprocess(speech)
+        return self._parser.parse(self._processed, lexer=self._lexer,
+                                  tracking=True)
 
-def p_brace_action(p):
-    """
-    brace_action : DOLLAR sign_list
-    brace_action : DOLLAR position_list
-    brace_action : DOLLAR CANCEL
-    brace_action : DOLLAR DOLLAR position_list
-    brace_action : DOLLAR DOLLAR position_list LINE DIGIT
-    brace_action : DOLLAR QUESTION sheriff_list
-    brace_action : DO_NOT_VOTE DIGIT player_list
-    brace_action : DO_NOT_VOTE QUESTION DIGIT
-    brace_action : player_list LINE MINUS DIGIT
-    brace_action : player_list LINE PLUS DIGIT
-    """
-    if len(p) == 3:
-        if isinstance(p[2], list):
-            p[0] = [(actions.SHERIFF, (0, p[2]))]
-        else:
-            p[0] = [(actions.SHERIFF, (0, actions.CANCEL))]
-    elif len(p) == 4:
-        if p[1] == actions.SHERIFF and p[2] == '?':
-            p[0] = p[3]
-        elif p[2] == actions.SHERIFF:
-            p[0] = [(actions.INFORMATION, (None, p[3]))]
-        elif p[1] == actions.DO_NOT_VOTE and p[2] == '?':
-            p[0] = [] # Do not record questions about voting
-        else:
-            p[0] = [(actions.DO_NOT_VOTE, (p[2], p[3]))]
-    else:
-        if p[4] == '|':
-            p[0] = [(actions.INFORMATION, (p[5], p[3]))]
-        else:
-            decision = int("{0}{1}".format(p[3],p[4]))
-            p[0] = [(actions.SET, (p[1], decision))]
 
+_local = threading.local()
 
-def p_sheriff_list(p):
-    """
-    sheriff_list : sheriff_in_list_position
-    sheriff_list : sheriff_in_list_position sheriff_list
-    """
-    p[0] = [(actions.SHERIFF, p[1])]
-    if len(p) > 2:
-        p[0].extend(p[2])
+def default_parser():
+    """:returns: SpeechParser object of current thread."""
+    parser = getattr(_local, 'parser', None)
+    if parser is None:
+        parser = _local.parser = SpeechParser()
+    return parser
 
-def p_sheriff_in_list_position(p):
-    """
-    sheriff_in_list_position : OPEN_BRACE DIGIT DDOT position_list CLOSE_BRACE
-    sheriff_in_list_position : OPEN_BRACE DIGIT DDOT CANCEL CLOSE_BRACE
-    sheriff_in_list_position : DIGIT DDOT OPEN_BRACE position_list CLOSE_BRACE
-    sheriff_in_list_position : DIGIT DDOT OPEN_BRACE CANCEL CLOSE_BRACE
-    """
-    if p[1] == '(':
-        p[0] = (p[2], p[4].lower() if isinstance(p[4], str) else p[4])
-    else:
-        p[0] = (p[1], p[4].lower() if isinstance(p[4], str) else p[4])
 
-def p_error(p):
-    from StringIO import StringIO
-    buf = StringIO()
-    print >> buf, "Error while parsing string. See information below.\n"
-    print >> buf, ' '*7, "PREPROCESSED INPUT:", yacc.current_parsed_string
-    print >> buf, ' '*7, "ERROR HERE:", '-'*(8 + p.lexpos) + '^'
-    raise SyntaxError(buf.getvalue())
+def parse_flat(speech):
+    """Parses speech without braces, sheriff and questions without ply.
 
-yacc.yacc()
+    :returns: list of actions same as `parse` or None if @speech is not
+    a flat one or contains errors.
+
+        >>> parse_flat('+1,2 -3 z')
+        [('+', 1), ('+', 2), ('-', 3), ('z', 0)]
+        >>> parse_flat('n4x4 C5 >6')
+        [('n', 4), ('x', 4), ('c', 5), ('>', 6)]
+        >>> parse_flat('n9 ($ +6)') is None
+        True
+    """
+    if _NOT_FLAT.search(speech):
+        return None
+    processed = _DO_NOT_VOTE_ALONE.sub(r'\g<1>z0\g<2>', speech)
+    result = []
+    pos = 0
+    end = len(processed.rstrip(' '))
+    match = _FLAT_ACTION.match
+    while pos < end:
+        m = match(processed, pos)
+        if m is None:
+            return None
+        action, players, single, player = m.groups()
+        if action is not None:
+            if action not in '+-':
+                action = action.lower()
+            result.extend((action, int(p))
+                          for p in _FLAT_COMMA.split(players))
+        else:
+            result.append((single.lower(), int(player)))
+        pos = m.end()
+    return result
 
 
 def parse(speech):
-    sheriff_dont_say_checks = re.compile('(^| )\$([-\+]+)($| )')
-    processed = speech
-    while sheriff_dont_say_checks.search(processed):
-        processed = sheriff_dont_say_checks.sub('\g<1>($\g<2>)\g<3>',
-                                                processed)
-    processed = re.sub(r'(^| )\$x($| )', '\g<1>($x)\g<2>', processed)
-    processed = re.sub(r'(^| )\z($| )', '\g<1>z0\g<2>', processed)
+    """:returns: list of actions parsed from @speech string.
 
-    # FIXME: hack for human error handeling
-    yacc.current_parsed_string = processed
+    Flat speeches are parsed by `parse_flat`, other ones by ply parser
+    of current thread.
+    """
+    result = parse_flat(speech)
+    if result is None:
+        result = default_parser().parse(speech)
+    return result
 
-    return yacc.parse(processed, tracking=True)
 
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -1,8 +1,13 @@
 #!/usr/bin/env python
 
+import os
+import threading
 import unittest
 import maf.actions as actions
+import util.yamlstream
 from speech_parser import parse
+from speech_parser import parse_flat
+from speech_parser import SpeechParser
 
 class SpeechParserTest(unittest.TestCase):
     def test_position_parsing(self):
@@ -128,5 +133,92 @@ class SpeechParserTest(unittest.TestCase):
         )
 
 
+class FlatSpeechParserTest(unittest.TestCase):
+    SPEECHES = [
+        "", " ", "+1,9,10 -1,3,5 +3,4", "+ 1 , 2 -3", "c5,9 c10",
+        "n10,8,4 x8 x10,4 d4 n1", "N1 X1 D1 C2 Z3", ">7 >4", "z1,2 z z3",
+        "z", "+1-5", "n7x7", "+1 z -2",
+    ]
+    WRONG = ["+", "+1,", "d4,5", "1 2", "zz", "z z", "+1 &", "n"]
+
+    def _yacc_parse(self, speech):
+        return SpeechParser().parse(speech)
+
+    def _assert_same(self, speech):
+        try:
+            expected = self._yacc_parse(speech)
+        except SyntaxError:
+            self.assertIsNone(parse_flat(speech), speech)
+            return
+        flat = parse_flat(speech)
+        if flat is not None:
+            self.assertEqual(flat, expected, speech)
+        self.assertEqual(parse(speech), expected, speech)
+
+    def test_same_as_yacc_parser(self):
+        for speech in self.SPEECHES:
+            self._assert_same(speech)
+            self.assertIsNotNone(parse_flat(speech), speech)
+
+    def test_wrong_speeches_fall_back(self):
+        for speech in self.WRONG:
+            self.assertIsNone(parse_flat(speech), speech)
+            self.assertRaises(SyntaxError, parse, speech)
+
+    def test_not_flat_speeches_fall_back(self):
+        for speech in ["n9 ($ +6)", "$x", "x$", "(z?7)", "$++"]:
+            self.assertIsNone(parse_flat(speech), speech)
+
+    def test_same_as_yacc_parser_on_logs(self):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            '..', 'logs', 'games.yaml')
+        with open(path) as f:
+            for item in util.yamlstream.iter_items(f):
+                for lap in item['game']['laps'][:-1]:
+                    for speech in lap.get('day', []):
+                        speech = speech.values()[0]
+                        if isinstance(speech, str):
+                            self._assert_same(speech)
+
+
+class SpeechParserReentrancyTest(unittest.TestCase):
+    def test_error_context_is_per_parser(self):
+        first, second = SpeechParser(), SpeechParser()
+        self.assertEqual(first.parse('+1'), [(actions.PLAY, 1)])
+        second._processed = '-2 -3'
+        with self.assertRaises(SyntaxError) as cm:
+            first.parse('+1 (2')
+        self.assertIn('+1 (2', str(cm.exception))
+        self.assertNotIn('-2 -3', str(cm.exception))
+
+    def test_parallel_parsing(self):
+        errors = []
+        def worker(num):
+            good = '+{0} -{1} n{0}'.format(num, num + 1)
+            bad = '+{0} ({1}'.format(num, num + 1)
+            try:
+                for _ in range(200):
+                    if parse(good) != [(actions.PLAY, num),
+                                       (actions.NOT_PLAY, num + 1),
+                                       (actions.NOMINATE, num)]:
+                        errors.append(good)
+                    try:
+                        parse(bad)
+                        errors.append(bad)
+                    except SyntaxError as e:
+                        if bad not in str(e):
+                            errors.append(str(e))
+            except Exception as e:
+                errors.append(repr(e))
+
+        threads = [threading.Thread(target=worker, args=(num,))
+                   for num in range(1, 9)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""Sets of player numbers packed into integer bits.
+
+`BitSet` -- immutable set of positive numbers, number N is bit N - 1:
+    >>> table = BitSet([1, 2, 4, 7])
+    >>> table
+    BitSet([1, 2, 4, 7])
+    >>> int(table)
+    75
+    >>> 4 in table, 3 in table, len(table), list(table)
+    (True, False, 4, [1, 2, 4, 7])
+
+Set operations are single integer operations and return BitSet:
+    >>> hands = BitSet([2, 3, 4])
+    >>> hands & table
+    BitSet([2, 4])
+    >>> table - hands, hands | BitSet([9])
+    (BitSet([1, 7]), BitSet([2, 3, 4, 9]))
+    >>> (hands & table).issubset(table)
+    True
+
+Comparisons are set inclusion, integer arithmetic is not supported:
+    >>> BitSet([2, 4]) <= table, BitSet([3]) <= table, table < table
+    (True, False, False)
+    >>> table + 1
+    Traceback (most recent call last):
+    ...
+    TypeError: BitSet does not support __add__
+    >>> table - 1
+    Traceback (most recent call last):
+    ...
+    TypeError: Set operation needs BitSet, not int
+
+Mask can be used directly:
+    >>> BitSet.from_mask(5)
+    BitSet([1, 3])
+    >>> BitSet.from_mask(0)
+    BitSet([])
+"""
+
+
+def _mask(other):
+    if not isinstance(other, BitSet):
+        raise TypeError("Set operation needs BitSet, not {0}"
+                        .format(type(other).__name__))
+    return long(other)
+
+
+class BitSet(long):
+    """Immutable set of positive integers stored as bits of long."""
+    __slots__ = ()
+
+    def __new__(cls, items=()):
+        mask = 0
+        for item in items:
+            if item <= 0:
+                raise ValueError(
+                        "BitSet item must be positive: {0}".format(item))
+            mask |= 1 << (item - 1)
+        return long.__new__(cls, mask)
+
+    @classmethod
+    def from_mask(cls, mask):
+        """:returns: BitSet with bits of integer @mask."""
+        return long.__new__(cls, mask)
+
+    def __iter__(self):
+        mask = long(self)
+        num = 1
+        while mask:
+            if mask & 1:
+                yield num
+            mask >>= 1
+            num += 1
+
+    def __len__(self):
+        return bin(self).count('1')
+
+    def __contains__(self, num):
+        return isinstance(num, (int, long)) and num > 0 \
+               and bool(long(self) >> (num - 1) & 1)
+
+    def __and__(self, other):
+        return BitSet.from_mask(long(self) & _mask(other))
+    __rand__ = __and__
+
+    def __or__(self, other):
+        return BitSet.from_mask(long(self) | _mask(other))
+    __ror__ = __or__
+
+    def __xor__(self, other):
+        return BitSet.from_mask(long(self) ^ _mask(other))
+    __rxor__ = __xor__
+
+    def __sub__(self, other):
+        """Set difference."""
+        return BitSet.from_mask(long(self) & ~_mask(other))
+
+    def issubset(self, other):
+        return long(self) & ~_mask(other) == 0
+    __le__ = issubset
+
+    def issuperset(self, other):
+        return _mask(other) & ~long(self) == 0
+    __ge__ = issuperset
+
+    def __lt__(self, other):
+        return self <= other and long(self) != long(other)
+
+    def __gt__(self, other):
+        return self >= other and long(self) != long(other)
+
+    def __reduce__(self):
+        return BitSet, (list(self),)
+
+    def __repr__(self):
+        return 'BitSet({0})'.format(list(self))
+
+    __str__ = __repr__
+
+
+def _unsupported(name):
+    def method(self, *args):
+        raise TypeError("BitSet does not support {0}".format(name))
+    method.__name__ = name
+    return method
+
+# Integer arithmetic of long would silently give wrong sets.
+for _name in ('add', 'radd', 'rsub', 'mul', 'rmul', 'div', 'rdiv',
+              'truediv', 'rtruediv', 'floordiv', 'rfloordiv', 'mod', 'rmod',
+              'divmod', 'rdivmod', 'pow', 'rpow', 'lshift', 'rlshift',
+              'rshift', 'rrshift', 'neg', 'pos', 'abs', 'invert'):
+    setattr(BitSet, '__{0}__'.format(_name),
+            _unsupported('__{0}__'.format(_name)))
+del _name
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
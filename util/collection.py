@@ -39,6 +39,10 @@ Utils:
 `join` -- join list of iterable to list.
     >>> join([[1, 2], "Sasha", xrange(4)])
     [1, 2, 'S', 'a', 's', 'h', 'a', 0, 1, 2, 3]
+
+`freeze` -- recursively convert lists to tuples.
+    >>> freeze([('s', ([1, 3], -2)), ('+', 4)])
+    (('s', ((1, 3), -2)), ('+', 4))
 """
 
 
@@ -96,6 +100,15 @@ def join(li):
     return result
 
 
+def freeze(obj):
+    """:returns: immutable copy of @obj where all lists and tuples are
+    replaced by tuples recursively.
+    """
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(elem) for elem in obj)
+    return obj
+
+
 if __name__ == '__main__':
     import sys
     reload(sys)
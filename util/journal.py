@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""Append-only journal of records with group commit and snapshots.
+
+Record is a python literal (tuple, string, number) written as one line
+with checksum and sequence number. Every record is passed to OS at once,
+so nothing is lost if process dies, but fsync is done once per group of
+records: when @group_size records are appended or by background timer
+@interval seconds after the first unsynced record:
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'game.journal')
+    >>> journal = Journal(path, group_size=2)
+    >>> journal.append(('speech', '+1 -2'))
+    1
+    >>> journal.append(('dead', '3'))
+    2
+    >>> journal.synced
+    2
+    >>> journal = Journal(path, interval=0.05)
+    >>> journal.append(('dead', '4'))
+    3
+    >>> journal.synced
+    2
+    >>> time.sleep(0.2)
+    >>> journal.synced
+    3
+    >>> journal.close()
+    >>> journal = Journal(path, group_size=2)
+
+Snapshot of state is saved atomically next to journal, recovery returns
+the last snapshot and records appended after it:
+    >>> journal.snapshot({'speeches': 1})
+    >>> journal.append(('speech', ''))
+    4
+    >>> journal.close()
+    >>> recover(path)
+    ({'speeches': 1}, [('speech', '')])
+
+Torn last line of crashed write is dropped and journal continues after
+the last whole record:
+    >>> with open(path, 'a') as f:
+    ...     f.write('1f2e 5 (')
+    >>> journal = Journal(path)
+    >>> journal.seq
+    4
+    >>> [seq for seq, _ in read_records(path)]
+    [1, 2, 3, 4]
+    >>> journal.close()
+"""
+
+import ast
+import cPickle
+import logging
+import os
+import threading
+import time
+import zlib
+
+GROUP_SIZE = 32
+SYNC_INTERVAL = 1.
+SNAPSHOT_SUFFIX = '.snap'
+
+
+def _checksum(body):
+    return '{0:08x}'.format(zlib.crc32(body) & 0xffffffff)
+
+
+def _scan(path):
+    """:returns: list of (seq, record) and length of valid prefix of
+    journal @path."""
+    records = []
+    valid = 0
+    if not os.path.exists(path):
+        return records, valid
+    with open(path, 'rb') as f:
+        for line in f:
+            crc, _, body = line.rstrip('\n').partition(' ')
+            if not line.endswith('\n') or crc != _checksum(body):
+                logging.warning("Journal {0} is torn at byte {1}"
+                                .format(path, valid))
+                break
+            seq, _, record = body.partition(' ')
+            records.append((int(seq), ast.literal_eval(record)))
+            valid += len(line)
+    return records, valid
+
+
+def read_records(path):
+    """:returns: list of (seq, record) of whole records of journal @path."""
+    return _scan(path)[0]
+
+
+def load_snapshot(path):
+    """:returns: (seq, state) of the last snapshot of journal @path or
+    (0, None)."""
+    try:
+        with open(path + SNAPSHOT_SUFFIX, 'rb') as f:
+            return cPickle.load(f)
+    except IOError:
+        return 0, None
+
+
+def recover(path):
+    """:returns: (state, records) where state is the last snapshot of
+    journal @path or None and records are appended after snapshot."""
+    seq, state = load_snapshot(path)
+    return state, [record for num, record in read_records(path) if num > seq]
+
+
+class Journal(object):
+    """Journal file opened for append after its last whole record."""
+    def __init__(self, path, group_size=GROUP_SIZE, interval=SYNC_INTERVAL):
+        records, valid = _scan(path)
+        self._path = path
+        self._seq = records[-1][0] if records else 0
+        self._synced = self._seq
+        self._group_size = group_size
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._timer = None
+        self._file = open(path, 'ab')
+        self._file.truncate(valid)
+
+    @property
+    def seq(self):
+        """Sequence number of the last record."""
+        return self._seq
+
+    @property
+    def synced(self):
+        """Sequence number of the last record synced to disk."""
+        return self._synced
+
+    def append(self, record):
+        """Appends literal @record, commits group if it is full, else
+        starts timer to commit it in @interval seconds.
+
+        :returns: sequence number of @record.
+        """
+        with self._lock:
+            self._seq += 1
+            body = '{0} {1!r}'.format(self._seq, record)
+            self._file.write('{0} {1}\n'.format(_checksum(body), body))
+            self._file.flush()
+            if self._seq - self._synced >= self._group_size:
+                self._commit()
+            elif self._timer is None:
+                self._timer = threading.Timer(self._interval, self.commit)
+                self._timer.daemon = True
+                self._timer.start()
+            return self._seq
+
+    def _commit(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._synced == self._seq or self._file.closed:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._synced = self._seq
+
+    def commit(self):
+        """Syncs all appended records to disk."""
+        with self._lock:
+            self._commit()
+
+    def snapshot(self, state):
+        """Saves picklable @state after the last record."""
+        self.commit()
+        tmp = self._path + SNAPSHOT_SUFFIX + '.tmp'
+        with open(tmp, 'wb') as f:
+            cPickle.dump((self._seq, state), f, 2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp, self._path + SNAPSHOT_SUFFIX)
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            self._file.close()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
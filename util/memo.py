@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""Memoization helpers.
+
+`LRUCache` -- bounded mapping which evicts least recently used items:
+    >>> cache = LRUCache(maxsize=2)
+    >>> cache.put('a', 1)
+    >>> cache.put('b', 2)
+    >>> cache.get('a')
+    1
+    >>> cache.put('c', 3)
+    >>> cache.get('b') is None
+    True
+    >>> sorted(cache.keys())
+    ['a', 'c']
+    >>> cache.info()
+    CacheInfo(hits=1, misses=1, maxsize=2, currsize=2)
+
+`memoize` -- decorator which caches function results in LRUCache:
+    >>> @memoize(maxsize=16)
+    ... def square(x):
+    ...     return x * x
+    >>> square(3), square(3), square(4)
+    (9, 9, 16)
+    >>> square.cache.info()
+    CacheInfo(hits=1, misses=2, maxsize=16, currsize=2)
+"""
+
+import functools
+import threading
+
+from collections import OrderedDict
+from collections import namedtuple
+
+CacheInfo = namedtuple('CacheInfo', 'hits misses maxsize currsize')
+
+_MISSING = object()
+
+
+class LRUCache(object):
+    """Bounded cache with least recently used eviction and hit/miss
+    counters. Safe for use from several threads."""
+    def __init__(self, maxsize=1024):
+        self._lock = threading.Lock()
+        self._maxsize = maxsize
+        self._data = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def keys(self):
+        return self._data.keys()
+
+    def get(self, key, default=None):
+        """:returns: value for @key or @default. Counts hits and misses."""
+        with self._lock:
+            value = self._data.pop(key, _MISSING)
+            if value is _MISSING:
+                self._misses += 1
+                return default
+            self._hits += 1
+            self._data[key] = value
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            if len(self._data) > self._maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def info(self):
+        return CacheInfo(self._hits, self._misses,
+                         self._maxsize, len(self._data))
+
+
+def memoize(maxsize=1024):
+    """Decorator for caching results of one hashable argument function.
+
+    Cache is available as `cache` attribute of decorated function.
+    """
+    def decorator(func):
+        cache = LRUCache(maxsize)
+
+        @functools.wraps(func)
+        def wrapper(arg):
+            result = cache.get(arg, _MISSING)
+            if result is _MISSING:
+                result = func(arg)
+                cache.put(arg, result)
+            return result
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
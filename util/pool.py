@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+"""Helpers for process pools.
+
+`ordered_imap` -- like `Pool.imap`, but keeps at most @window tasks in
+flight, so input iterator is consumed lazily:
+    >>> import multiprocessing
+    >>> pool = multiprocessing.Pool(2)
+    >>> list(ordered_imap(pool, abs, (-x for x in xrange(6)), window=3))
+    [0, 1, 2, 3, 4, 5]
+    >>> pool.terminate()
+"""
+
+import itertools
+
+from collections import deque
+
+
+def ordered_imap(pool, func, iterable, window=None):
+    """Yields func(x) for x in @iterable computed by @pool in input order.
+
+    Not more than @window tasks (twice number of pool processes by
+    default) are submitted to pool at once.
+    """
+    if window is None:
+        window = 2 * len(pool._pool)
+    iterator = iter(iterable)
+    pending = deque(pool.apply_async(func, (arg,))
+                    for arg in itertools.islice(iterator, window))
+    while pending:
+        head = pending.popleft()
+        for arg in itertools.islice(iterator, 1):
+            pending.append(pool.apply_async(func, (arg,)))
+        yield head.get()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
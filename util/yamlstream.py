@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+r"""Streaming loader for yaml files with top-level list of items.
+
+`iter_items` -- yields items of top-level yaml list one by one, so only
+one item is held in memory at once:
+    >>> from StringIO import StringIO
+    >>> stream = StringIO('''
+    ... - game: {club: showtime, date: 2014-02-05}
+    ... - game: {club: Consigliere}
+    ... ''')
+    >>> items = iter_items(stream)
+    >>> items.next()['game']['date']
+    datetime.date(2014, 2, 5)
+    >>> list(items)
+    [{'game': {'club': 'Consigliere'}}]
+
+    Empty stream has no items:
+    >>> list(iter_items(StringIO('')))
+    []
+
+    Top-level object must be a list:
+    >>> list(iter_items(StringIO('game: 1')))
+    Traceback (most recent call last):
+    ...
+    StructureError: Top-level yaml object must be a list.
+
+`iter_blocks` -- yields source text of top-level list items one by one
+without parsing them:
+    >>> stream = StringIO('''---
+    ... - game:
+    ...     club: showtime
+    ... - game: {club: Consigliere}
+    ... ''')
+    >>> list(iter_blocks(stream))
+    ['- game:\n    club: showtime\n', '- game: {club: Consigliere}\n']
+
+Items are found by yaml parser events, so list may be indented. Other
+top-level objects are errors with position in @mark:
+    >>> list(iter_blocks(StringIO('# log\n  - game: 1\n  - game: 2')))
+    ['  - game: 1\n', '  - game: 2']
+    >>> try:
+    ...     list(iter_blocks(StringIO('# log\ngame: 1\n')))
+    ... except StructureError as e:
+    ...     print e, e.mark.line
+    Top-level yaml object must be a list. 1
+
+If yaml syntax error stops the parser, the rest of stream is split by
+lines started with '-', so error stays inside its own item:
+    >>> list(iter_blocks(StringIO('- game: 1\n- game: [\n- game: 3\n')))
+    ['- game: 1\n', '- game: [\n', '- game: 3\n']
+"""
+
+import logging
+
+import yaml
+from yaml.composer import Composer
+from yaml.constructor import SafeConstructor
+from yaml.resolver import Resolver
+
+try:
+    from yaml.cyaml import CParser
+
+    class _StreamParser(CParser):
+        """libyaml based event parser."""
+    WITH_LIBYAML = True
+except ImportError:
+    from yaml.reader import Reader
+    from yaml.scanner import Scanner
+    from yaml.parser import Parser
+
+    class _StreamParser(Reader, Scanner, Parser):
+        """Pure python event parser."""
+        def __init__(self, stream):
+            Reader.__init__(self, stream)
+            Scanner.__init__(self)
+            Parser.__init__(self)
+    WITH_LIBYAML = False
+
+
+class StructureError(TypeError):
+    """Yaml stream is not a list of items, @mark is yaml Mark of wrong
+    object or None."""
+    def __init__(self, message, mark=None):
+        TypeError.__init__(self, message)
+        self.mark = mark
+
+
+class StreamLoader(_StreamParser, Composer, SafeConstructor, Resolver):
+    """Safe yaml loader which can compose and construct nodes one by one.
+
+    Uses libyaml parser if it is available and pure python one otherwise.
+    """
+    def __init__(self, stream):
+        _StreamParser.__init__(self, stream)
+        Composer.__init__(self)
+        SafeConstructor.__init__(self)
+        Resolver.__init__(self)
+
+    def next_item(self):
+        """:returns: next constructed item of current sequence."""
+        node = self.compose_node(None, None)
+        return self.construct_document(node)
+
+
+def iter_items(stream):
+    """Yields items of top-level yaml list from @stream one by one.
+
+    :raises: StructureError if top-level object is not a list.
+    """
+    loader = StreamLoader(stream)
+    try:
+        loader.get_event()  # StreamStartEvent
+        if loader.check_event(yaml.StreamEndEvent):
+            return
+        loader.get_event()  # DocumentStartEvent
+        if not loader.check_event(yaml.SequenceStartEvent):
+            raise StructureError("Top-level yaml object must be a list.",
+                                 loader.peek_event().start_mark)
+        loader.get_event()
+        while not loader.check_event(yaml.SequenceEndEvent):
+            yield loader.next_item()
+    finally:
+        loader.dispose()
+
+
+def _skip_node(parser):
+    depth = 0
+    while True:
+        event = parser.get_event()
+        if isinstance(event, (yaml.SequenceStartEvent,
+                              yaml.MappingStartEvent)):
+            depth += 1
+        elif isinstance(event, (yaml.SequenceEndEvent, yaml.MappingEndEvent)):
+            depth -= 1
+        if depth == 0:
+            return
+
+
+def _item_spans(lines):
+    """Yields (first line, end line) of every top-level list item of
+    yaml document(s) @lines. Item starts at the line of its '-' and
+    ends where the next item starts."""
+    parser = _StreamParser(''.join(lines))
+    try:
+        parser.get_event()
+        while not parser.check_event(yaml.StreamEndEvent):
+            parser.get_event()
+            event = parser.peek_event()
+            if not isinstance(event, yaml.SequenceStartEvent):
+                raise StructureError("Top-level yaml object must be a list.",
+                                     event.start_mark)
+            if event.flow_style:
+                raise StructureError("Top-level list must be block style.",
+                                     event.start_mark)
+            start = event.start_mark.line
+            parser.get_event()
+            first = True
+            while not parser.check_event(yaml.SequenceEndEvent):
+                line = parser.peek_event().start_mark.line
+                while line > start and not lines[line].lstrip() \
+                                                .startswith('-'):
+                    line -= 1
+                if not first:
+                    yield start, line
+                    start = line
+                first = False
+                _skip_node(parser)
+            end = parser.get_event().start_mark
+            if not first:
+                yield start, end.line + (1 if end.column else 0)
+            parser.get_event()
+    finally:
+        parser.dispose()
+
+
+def _split_lines(lines):
+    """Yields blocks of @lines, every line started with '-' in the
+    first column begins a new one."""
+    block = None
+    for line in lines:
+        if line.startswith('-') and not line.startswith('---'):
+            if block:
+                yield ''.join(block)
+            block = [line]
+        elif block is not None:
+            block.append(line)
+    if block:
+        yield ''.join(block)
+
+
+def iter_blocks(stream):
+    """Yields source text of top-level yaml list items from @stream.
+
+    Comments before the first item are skipped, lines between items
+    belong to the previous one. Empty stream is logged as warning.
+    :raises: StructureError if top-level object is not a block list.
+    """
+    lines = stream.readlines()
+    done = 0
+    count = 0
+    try:
+        for start, end in _item_spans(lines):
+            done = end
+            count += 1
+            yield ''.join(lines[start:end])
+    except yaml.YAMLError as e:
+        blocks = list(_split_lines(lines[done:]))
+        if not blocks:
+            raise
+        logging.warning("Yaml items are split by lines after error: {0}"
+                        .format(e))
+        for block in blocks:
+            count += 1
+            yield block
+    if not count:
+        logging.warning("No items in yaml stream {0}"
+                        .format(getattr(stream, 'name', '')).rstrip())
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
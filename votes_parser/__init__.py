@@ -1,2 +1,3 @@
 from votes_parser import parse
+from votes_parser import parse_set
 from votes_parser import __doc__
@@ -10,10 +10,28 @@ Example of parsing:
     []
     >>> parse("1,2 4;  ")
     [1, 2, 4]
+
+Voted hands can be parsed into bit set of players:
+    >>> parse_set("1,2 7-10 4")
+    BitSet([1, 2, 4, 7, 8, 9, 10])
+    >>> parse_set(0)
+    BitSet([])
+
+Errors contain voting string and position of wrong vote:
+    >>> try:
+    ...     parse("1,2 4 x7")
+    ... except SyntaxError as e:
+    ...     print e.text, e.offset
+    1,2 4 x7 6
 """
 
 import re
 
+from util.bitset import BitSet
+
+_DASH_VOTE = re.compile(r'^(\d+)-(\d+)$')
+_VOTE_TOKEN = re.compile(r'[^\s,]+')
+
 def parse(votestr):
     if isinstance(votestr, int) and votestr != 0:
         votestr = str(votestr)
@@ -22,15 +40,14 @@ def parse(votestr):
         return []
 
     votestr = votestr.strip()
-    if votestr[-1] == ';':
+    if votestr.endswith(';'):
         votestr = votestr[:-1]
 
     votes = (v.split(',') for v in (v for v in votestr.split()))
 
-    dash_vote = re.compile(r'^(\d+)-(\d+)$')
-    votes = (range(int(dash_vote.match(v[0]).groups()[0]),
-                   int(dash_vote.match(v[0]).groups()[1]) + 1) \
-             if dash_vote.match(v[0]) else v for v in votes)
+    votes = (range(int(_DASH_VOTE.match(v[0]).groups()[0]),
+                   int(_DASH_VOTE.match(v[0]).groups()[1]) + 1) \
+             if _DASH_VOTE.match(v[0]) else v for v in votes)
     try:
         votes = (int(v) for sub in votes for v in sub if v)
         votes = [v for v in set(votes)]
@@ -40,10 +57,25 @@ def parse(votestr):
         print >> buf, "Can't parse next voting:"
         print >> buf, ' '*8 + votestr
         print >> buf, "Parser error:", ve
-        raise SyntaxError(buf.getvalue())
+        error = SyntaxError(buf.getvalue())
+        error.text = votestr
+        error.offset = _error_offset(votestr)
+        raise error
     votes.sort()
     return votes
 
+def parse_set(votestr):
+    """:returns: BitSet of players voted in @votestr, zero votes are
+    skipped."""
+    return BitSet(v for v in parse(votestr) if v > 0)
+
+def _error_offset(votestr):
+    """:returns: position of the first wrong token in @votestr."""
+    for token in _VOTE_TOKEN.finditer(votestr):
+        if not token.group().isdigit() and not _DASH_VOTE.match(token.group()):
+            return token.start()
+    return None
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod()